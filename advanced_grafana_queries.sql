@@ -1,5 +1,6 @@
 -- 🚀 ADVANCED GRAFANA QUERIES FOR PARQUET-BASED ANALYTICS
 -- Use these after running parquet_to_sql.py to sync data
+-- Or skip the SQL copy: python3 rankings_history.py export computes the same four panels from the Parquet files
 
 -- 🎯 Daily Race Winners (Table Panel 1)
 -- Shows the winning boat each day with enhanced formatting
@@ -57,3 +58,27 @@ ORDER BY date, boat_id;
 
 
 
+-- 🧮 Exact leaderboards from hourly partials (run partial_aggregates.py update first)
+-- Averages are SUM(sum_speed) / SUM(records) over every hour in the range, not an average of daily averages
+
+-- 🏆 7-Day Leaderboard (exact)
+SELECT 
+    CAST(ROW_NUMBER() OVER (ORDER BY SUM(sum_speed) / SUM(records) DESC) AS INT) as "Rank",
+    CONCAT('Boat ', boat_id) as "Boat",
+    ROUND(SUM(sum_speed) / SUM(records), 2) as "Avg Speed (km/h)",
+    ROUND(MAX(max_speed), 2) as "Peak Speed",
+    SUM(records) as "Data Points"
+FROM boat_hourly_partials
+WHERE hour_start >= DATEADD(day, -7, GETDATE())
+GROUP BY boat_id
+ORDER BY SUM(sum_speed) / SUM(records) DESC;
+
+-- 📈 30-Day Daily Average Speed (exact, Time Series)
+SELECT 
+    CAST(hour_start AS DATE) as "time",
+    CONCAT('Boat ', boat_id) as metric,
+    SUM(sum_speed) / SUM(records) as "Average Speed"
+FROM boat_hourly_partials
+WHERE hour_start >= DATEADD(day, -30, GETDATE())
+GROUP BY CAST(hour_start AS DATE), boat_id
+ORDER BY "time", boat_id;
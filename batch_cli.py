@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Command line of the daily rankings batch (simple_parquet_batch.py)
+Only argparse is imported here, so `sail batch --help` answers without loading pandas, pyarrow or
+the Azure SDK; the batch module is imported once the arguments are known.
+Usage: python3 sail.py batch --date 2025-01-31
+       python3 sail.py batch --incremental --every 300
+"""
+
+import argparse
+from datetime import date
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Daily boat rankings from the SQL Database, stored as Parquet in Azure Blob")
+    parser.add_argument('--date', type=date.fromisoformat, help="day to process (default: today)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only extract the rows added since the last run and republish the day's rankings")
+    parser.add_argument('--every', type=int, metavar='SECONDS', help="with --incremental: repeat for today every N seconds")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="recompute the day's rankings from its micro-batch parts")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    import simple_parquet_batch
+    return simple_parquet_batch.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1096 @@
+#!/usr/bin/env python3
+"""
+Offline performance benchmarks for the sailing race pipeline
+Runs without Azure: SQLite stands in for SQL Server, a local folder for Blob Storage and an
+in-process fake for Event Hub. Every run is stored as JSON under benchmark-data/results/ so a
+change can be compared with the previous run (or any stored one).
+Usage: python3 benchmarks.py [fleet] [encoding] [validator] [extract] [aggregate] [parquet] [sql_insert]
+                             [rankings] [upload] [fleet_state] [race] [shards] [history] [backfill] [micro_batch] [window] [cli]
+                             [--scale quick|default|full]
+       python3 benchmarks.py --scale quick --compare          (flag regressions against the last run)
+       python3 benchmarks.py fleet --compare benchmark-data/results/20250901T120000Z.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+# Scratch files (local SQLite databases, Parquet files) created by the benchmarks
+BENCH_DATA = 'benchmark-data'
+
+
+def bench_fleet(sizes=(10, 10_000, 1_000_000), seconds=2.0):
+    """Ticks per second of the vectorized fleet engine at several fleet sizes"""
+    from fleet_engine import FleetArrays
+
+    print("⛵ Fleet engine tick rate")
+    print(f"{'Boats':>10} {'Ticks/sec':>12} {'Boat-updates/sec':>18}")
+    print("-" * 42)
+
+    results = []
+    for size in sizes:
+        fleet = FleetArrays(size, seed=42)
+        fleet.update(60)  # warm-up
+
+        ticks = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            fleet.update(60)
+            ticks += 1
+        elapsed = time.perf_counter() - start
+
+        ticks_per_sec = ticks / elapsed
+        results.append({'boats': size, 'ticks_per_sec': ticks_per_sec})
+        print(f"{size:>10} {ticks_per_sec:>12.1f} {ticks_per_sec * size:>18,.0f}")
+
+    return results
+
+
+def fleet_columns(size, seed=42):
+    """One tick of telemetry columns for a fleet of the given size"""
+    from fleet_engine import FleetArrays
+    fleet = FleetArrays(size, seed=seed)
+    return {
+        "boat": fleet.boat,
+        "latitude": fleet.latitude,
+        "longitude": fleet.longitude,
+        "heading": fleet.heading,
+        "speed": fleet.speed,
+    }
+
+
+def bench_encoding(size=100_000, partitions=4):
+    """Bytes per boat and events/sec for the json and packed wire formats (fake Event Hub)"""
+    from telemetry_sinks import FakeEventHubSink
+    from wire_format import decode_events
+
+    columns = fleet_columns(size)
+
+    print(f"📦 Wire formats, {size:,} boats through a fake Event Hub")
+    print(f"{'Encoding':<10} {'Bytes/boat':>11} {'Send ev/sec':>14} {'Decode ev/sec':>14} {'Batches':>8}")
+    print("-" * 62)
+
+    results = []
+    for encoding in ('json', 'packed'):
+        sink = FakeEventHubSink(partitions=partitions, retain=None, encoding=encoding)
+        start = time.perf_counter()
+        sink.send(columns)
+        send_elapsed = time.perf_counter() - start
+
+        events = sink.drain()
+        start = time.perf_counter()
+        decoded = decode_events(events)
+        decode_elapsed = time.perf_counter() - start
+        assert len(decoded['boat']) == size
+
+        result = {
+            'encoding': encoding,
+            'bytes_per_boat': sink.bytes_sent / size,
+            'events_per_sec': size / send_elapsed,
+            'decode_events_per_sec': size / decode_elapsed,
+            'batches': sink.batches_sent,
+        }
+        results.append(result)
+        print(f"{encoding:<10} {result['bytes_per_boat']:>11.1f} {result['events_per_sec']:>14,.0f} "
+              f"{result['decode_events_per_sec']:>14,.0f} {result['batches']:>8}")
+
+    return results
+
+
+def bench_validator(size=1_000_000, chunk_size=100_000):
+    """Events/sec of the local Stream Analytics filter, plus its parity check against the SQL rules"""
+    import numpy as np
+    from datetime import datetime, timezone
+    from stream_validator import validate, TumblingWindows, check_parity
+
+    columns = fleet_columns(chunk_size)
+    corrupted = np.random.default_rng(1).integers(0, 100, chunk_size) == 0
+    columns['latitude'] = np.where(corrupted, -10000, columns['latitude'])
+    columns['longitude'] = np.where(corrupted, -10000, columns['longitude'])
+    columns['EventEnqueuedUtcTime'] = np.full(chunk_size, np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), 'us'))
+
+    print(f"🧹 Stream validation, {size:,} events in chunks of {chunk_size:,}")
+    windows = TumblingWindows()
+    start = time.perf_counter()
+    for _ in range(size // chunk_size):
+        clean, _ = validate(columns)
+        windows.add(clean)
+        windows.emit()
+    elapsed = time.perf_counter() - start
+    events_per_sec = size / elapsed
+    print(f"✅ {events_per_sec:,.0f} events/sec (validate + tumbling windows)")
+
+    return {'events_per_sec': events_per_sec, 'parity': check_parity()}
+
+
+BENCH_DATE = (2025, 1, 1)
+
+
+def make_telemetry_db(path, rows, boats=1000):
+    """Local SQLite boat_telemetry table with `rows` clean rows spread over BENCH_DATE"""
+    import numpy as np
+    import local_db
+    from datetime import datetime
+    from fleet_engine import FleetArrays
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if os.path.exists(path):
+        conn = local_db.connect(path)
+        existing = conn.execute("SELECT COUNT(*) FROM boat_telemetry").fetchone()[0]
+        if existing == rows:
+            return conn
+        conn.close()
+        os.remove(path)
+
+    conn = local_db.connect(path)
+    fleet = FleetArrays(boats, seed=42)
+    ticks = -(-rows // boats)
+    start = np.datetime64(datetime(*BENCH_DATE), 'us')
+    step = np.timedelta64(86_400_000_000 // ticks, 'us')
+    written = 0
+    for tick in range(ticks):
+        count = min(boats, rows - written)
+        stamp = np.full(count, start + tick * step)
+        local_db.insert_telemetry(conn, {
+            'boat_id': fleet.boat[:count], 'latitude': fleet.latitude[:count], 'longitude': fleet.longitude[:count],
+            'heading': fleet.heading[:count], 'speed': fleet.speed[:count],
+            'event_time': stamp, 'enqueued_time': stamp, 'created_at': stamp,
+        })
+        fleet.update(60)
+        written += count
+    return conn
+
+
+def _extract_worker(mode, database, queue):
+    """Run one extraction mode in a fresh process so its peak RSS can be measured"""
+    import io
+    import os
+    import resource
+    import contextlib
+    from datetime import date
+
+    os.environ['SQLITE_DATABASE'] = database
+    import simple_parquet_batch as batch
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'pandas':
+            rankings = batch.compute_boat_rankings(batch.extract_daily_data(date(*BENCH_DATE)))
+        else:
+            rankings = batch.compute_boat_rankings_streaming(batch.iter_daily_batches(date(*BENCH_DATE)))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        'mode': mode,
+        'rows': int(rankings['records'].sum()),
+        'seconds': elapsed,
+        'peak_rss_mb': peak / 1024,
+        'extra_rss_mb': (peak - baseline) / 1024,
+    })
+
+
+def bench_extract(sizes=(1_000_000, 4_000_000), database=os.path.join(BENCH_DATA, 'telemetry.db')):
+    """Rows/sec and peak RSS of whole-day (pandas) vs chunked (stream) extraction from local SQLite"""
+    import multiprocessing
+
+    print("📊 Daily extraction + rankings from local SQLite")
+    print(f"{'Rows':>10} {'Mode':<8} {'Rows/sec':>12} {'Peak RSS MB':>12} {'Extra RSS MB':>13}")
+    print("-" * 59)
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for size in sizes:
+        make_telemetry_db(database, size).close()
+        for mode in ('pandas', 'stream'):
+            queue = context.Queue()
+            worker = context.Process(target=_extract_worker, args=(mode, database, queue))
+            worker.start()
+            result = queue.get()
+            worker.join()
+            result['size'] = size
+            results.append(result)
+            print(f"{size:>10} {mode:<8} {result['rows'] / result['seconds']:>12,.0f} "
+                  f"{result['peak_rss_mb']:>12.0f} {result['extra_rss_mb']:>13.0f}")
+
+    return results
+
+
+def ranking_frames(rows, boats=1000, seed=42):
+    """Daily ranking frames (compute_boat_rankings layout) totalling `rows` rows"""
+    import numpy as np
+    import pandas as pd
+    from datetime import date, timedelta
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for day in range(rows // boats):
+        avg_speed = rng.uniform(0, 25, boats)
+        frames.append((date(*BENCH_DATE) + timedelta(days=day), pd.DataFrame({
+            'boat_id': np.arange(boats),
+            'avg_speed': avg_speed.round(2),
+            'max_speed': (avg_speed + rng.uniform(0, 5, boats)).round(2),
+            'records': rng.integers(1, 8640, boats),
+            'avg_lat': rng.uniform(-33.3, -32.9, boats).round(6),
+            'avg_lng': rng.uniform(-71.7, -71.5, boats).round(6),
+            'rank': np.argsort(np.argsort(-avg_speed)) + 1,
+        })))
+    return frames
+
+
+def _legacy_load(conn, frames):
+    """The previous load path: DELETE the date, iterrows() into tuples, plain executemany"""
+    for target_date, df in frames:
+        day = target_date.isoformat()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM boat_historical_rankings WHERE date = ?", (day,))
+        insert_data = []
+        for _, row in df.iterrows():
+            insert_data.append((
+                day, int(row['boat_id']), row['avg_speed'], row['max_speed'],
+                int(row['records']), int(row['rank']), row['avg_lat'], row['avg_lng']
+            ))
+        cursor.executemany("""
+            INSERT INTO boat_historical_rankings
+            (date, boat_id, avg_speed, max_speed, records, rank, avg_lat, avg_lng)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, insert_data)
+        conn.commit()
+    return sum(len(df) for _, df in frames)
+
+
+def bench_rankings(sizes=(10_000, 100_000, 1_000_000), database=os.path.join(BENCH_DATA, 'rankings.db')):
+    """Rows/sec loading boat_historical_rankings into SQLite: legacy path vs bulk upsert
+    (first load into an empty table, then a reload of the same dates hitting every key)"""
+    import local_db
+    from parquet_to_sql import upsert_rankings
+
+    print("🏆 boat_historical_rankings load (SQLite)")
+    print(f"{'Rows':>10} {'Path':<8} {'Insert rows/sec':>16} {'Reload rows/sec':>16}")
+    print("-" * 54)
+
+    os.makedirs(BENCH_DATA, exist_ok=True)
+    results = []
+    for size in sizes:
+        frames = ranking_frames(size)
+        for path, load in (('legacy', _legacy_load), ('bulk', upsert_rankings)):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(database + suffix):
+                    os.remove(database + suffix)
+            conn = local_db.connect(database)
+            timings = []
+            for _ in range(2):
+                start = time.perf_counter()
+                load(conn, frames)
+                timings.append(time.perf_counter() - start)
+            conn.close()
+
+            results.append({'rows': size, 'path': path, 'insert_seconds': timings[0], 'reload_seconds': timings[1]})
+            print(f"{size:>10} {path:<8} {size / timings[0]:>16,.0f} {size / timings[1]:>16,.0f}")
+
+    return results
+
+
+def telemetry_frame(rows, boats=1000, seed=42, first_row=0):
+    """Raw telemetry rows (telemetry_dataset layout) as a DataFrame; first_row continues the
+    ticks of an earlier frame, so consecutive frames form one stream"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed + first_row)
+    row = np.arange(first_row, first_row + rows)
+    ticks = row // boats
+    start = np.datetime64('2025-01-01T00:00:00', 'us')
+    return pd.DataFrame({
+        'boat_id': (row % boats).astype('int32'),
+        'event_time': start + ticks * np.timedelta64(10, 's') + rng.integers(0, 2_000_000, rows).astype('timedelta64[us]'),
+        'latitude': rng.uniform(-33.3, -32.9, rows),
+        'longitude': rng.uniform(-71.7, -71.5, rows),
+        'heading': rng.integers(0, 360, rows).astype('float64'),
+        'speed': rng.uniform(0, 25, rows),
+        'enqueued_time': start + ticks * np.timedelta64(10, 's'),
+    })
+
+
+def reset_peak_rss():
+    """Restart peak-RSS tracking for this process (Linux); False when unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size since start-up or the last reset_peak_rss()"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _upload_worker(mode, rows, root, queue):
+    """Encode and upload one frame in a fresh process so its peak RSS can be measured"""
+    from io import BytesIO
+    from local_blob import LocalBlobServiceClient
+    from blob_stream import write_parquet_blob
+
+    df = telemetry_frame(rows)
+    blob = LocalBlobServiceClient(root).get_blob_client('parquet-data', f"bench/{mode}-{rows}.parquet")
+    # building the frame peaks higher than holding it: measure encoding + upload on their own
+    reset_peak_rss()
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == 'buffered':
+        # the previous save_to_azure_blob path: whole file in a BytesIO, copied by getvalue()
+        parquet_buffer = BytesIO()
+        df.to_parquet(parquet_buffer, compression='snappy')
+        parquet_buffer.seek(0)
+        blob.upload_blob(parquet_buffer.getvalue(), overwrite=True)
+        nbytes = parquet_buffer.getbuffer().nbytes
+    else:
+        _, nbytes = write_parquet_blob(df, blob)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_mb()
+    queue.put({
+        'mode': mode,
+        'bytes': nbytes,
+        'seconds': elapsed,
+        'peak_rss_mb': peak,
+        'extra_rss_mb': peak - baseline,
+    })
+
+
+def bench_upload(sizes=(1_000_000, 5_000_000), root=os.path.join(BENCH_DATA, 'blobs')):
+    """MB/s and peak RSS of writing a Parquet blob: in-memory buffer vs streamed staged blocks"""
+    import multiprocessing
+
+    print("☁️  Parquet blob upload (local blob stand-in)")
+    print(f"{'Rows':>10} {'Mode':<9} {'MB':>8} {'MB/sec':>8} {'Peak RSS MB':>12} {'Extra RSS MB':>13}")
+    print("-" * 65)
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for size in sizes:
+        for mode in ('buffered', 'stream'):
+            queue = context.Queue()
+            worker = context.Process(target=_upload_worker, args=(mode, size, root, queue))
+            worker.start()
+            result = queue.get()
+            worker.join()
+            result['rows'] = size
+            results.append(result)
+            megabytes = result['bytes'] / 1e6
+            print(f"{size:>10} {mode:<9} {megabytes:>8.1f} {megabytes / result['seconds']:>8.1f} "
+                  f"{result['peak_rss_mb']:>12.0f} {result['extra_rss_mb']:>13.0f}")
+
+    return results
+
+
+def bench_race(sizes=(10_000, 1_000_000), ticks=20):
+    """Race progress: incremental RaceTracker updates per tick vs recomputing from the whole track"""
+    import numpy as np
+    from fleet_engine import FleetArrays
+    from race_course import RaceTracker, haversine_km
+
+    print("🧭 Race leaderboard (distance sailed / distance to finish)")
+    print(f"{'Boats':>10} {'Events/sec':>14} {'ms/tick':>9} {'Rescan ms':>10} {'Leaderboard ms':>15}")
+    print("-" * 62)
+
+    results = []
+    for size in sizes:
+        fleet = FleetArrays(size, seed=42)
+        tracker = RaceTracker(size)
+        start_time = np.datetime64('2025-09-01T00:00:00', 'us')
+        track = []
+        elapsed = 0.0
+        for tick in range(ticks):
+            fleet.update(60)
+            event_time = np.full(size, start_time + np.timedelta64(tick * 60, 's'))
+            track.append((fleet.latitude.copy(), fleet.longitude.copy()))
+            start = time.perf_counter()
+            tracker.update(fleet.boat, fleet.latitude, fleet.longitude, event_time)
+            elapsed += time.perf_counter() - start
+
+        # the alternative: sum every boat's segments again from its full track on each refresh
+        start = time.perf_counter()
+        latitude = np.stack([lat for lat, _ in track])
+        longitude = np.stack([lng for _, lng in track])
+        rescanned = haversine_km(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:]).sum(axis=0)
+        rescan = time.perf_counter() - start
+        assert np.allclose(rescanned, tracker.distance_km[:size])
+
+        start = time.perf_counter()
+        tracker.leaderboard(10)
+        leaderboard = time.perf_counter() - start
+
+        result = {'boats': size, 'events_per_sec': size * ticks / elapsed, 'tick_ms': elapsed / ticks * 1000,
+                  'rescan_ms': rescan * 1000, 'leaderboard_ms': leaderboard * 1000}
+        results.append(result)
+        print(f"{size:>10} {result['events_per_sec']:>14,.0f} {result['tick_ms']:>9.1f} "
+              f"{result['rescan_ms']:>10.1f} {result['leaderboard_ms']:>15.1f}")
+
+    return results
+
+
+def _latencies(connection, paths, requests):
+    """Median and 99th percentile milliseconds of GET requests over one keep-alive connection"""
+    import numpy as np
+    timings = []
+    for i in range(requests):
+        start = time.perf_counter()
+        connection.request('GET', paths[i % len(paths)])
+        response = connection.getresponse()
+        response.read()
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def bench_fleet_state(size=1_000_000, ticks=3, requests=2000):
+    """Load test of fleet_state_service.py: HTTP ingest of full fleet ticks and GET latencies"""
+    from http.client import HTTPConnection
+    from fleet_engine import FleetArrays
+    from fleet_state_service import FleetStateService
+    from telemetry_sinks import HttpSink
+
+    service = FleetStateService()
+    server = service.serve(0)
+    port = server.server_port
+    fleet = FleetArrays(size, seed=42)
+    sink = HttpSink(f"http://127.0.0.1:{port}/ingest")
+
+    print(f"🛰️  Live fleet state service ({size:,} boats)")
+    start = time.perf_counter()
+    for _ in range(ticks):
+        sink.send({"boat": fleet.boat, "latitude": fleet.latitude, "longitude": fleet.longitude,
+                   "heading": fleet.heading, "speed": fleet.speed})
+        fleet.update(60)
+    elapsed = time.perf_counter() - start
+    print(f"Ingest (packed POSTs): {ticks * size / elapsed:,.0f} events/sec, {elapsed / ticks:.2f} s per fleet tick")
+
+    connection = HTTPConnection('127.0.0.1', port)
+    results = {'boats': size, 'ingest_events_per_sec': ticks * size / elapsed}
+    print(f"{'Request':<24} {'p50 ms':>8} {'p99 ms':>8}")
+    print("-" * 42)
+    for name, paths in (('/boats/<id>', [f"/boats/{boat}" for boat in range(0, size, max(size // 1000, 1))]),
+                        ('/leaderboard?top=10', ['/leaderboard?top=10']),
+                        ('/boats?limit=100', ['/boats?limit=100']),
+                        ('/summary', ['/summary'])):
+        p50, p99 = _latencies(connection, paths, requests)
+        results[name] = {'p50_ms': p50, 'p99_ms': p99}
+        print(f"{name:<24} {p50:>8.3f} {p99:>8.3f}")
+
+    start = time.perf_counter()
+    connection.request('GET', '/boats')
+    body = connection.getresponse().read()
+    print(f"Full /boats: {len(body) / 1e6:.0f} MB in {time.perf_counter() - start:.2f} s "
+          f"(then served from cache until the next update)")
+    connection.close()
+    service.shutdown()
+    return results
+
+
+def bench_aggregate(sizes=(1_000_000, 10_000_000, 100_000_000), chunk_rows=1_000_000, in_memory_limit=10_000_000):
+    """Rows/sec of the daily aggregation (speed rankings + race progress): the whole day in one
+    DataFrame (compute_boat_rankings) and chunk by chunk (RankingAccumulator). Synthetic chunks are
+    generated outside the timed section; the in-memory path only runs up to in_memory_limit rows."""
+    import io
+    import contextlib
+    import pandas as pd
+    from simple_parquet_batch import RankingAccumulator, compute_boat_rankings
+
+    print("🔢 Daily aggregation (rankings + race progress)")
+    print(f"{'Rows':>12} {'Mode':<10} {'Rows/sec':>12} {'Seconds':>9}")
+    print("-" * 46)
+
+    results = []
+    for size in sizes:
+        modes = ('in_memory', 'chunked') if size <= in_memory_limit else ('chunked',)
+        for mode in modes:
+            elapsed = 0.0
+            if mode == 'in_memory':
+                df = pd.concat([telemetry_frame(min(chunk_rows, size - offset), first_row=offset)
+                                for offset in range(0, size, chunk_rows)], ignore_index=True)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    rankings = compute_boat_rankings(df)
+                elapsed = time.perf_counter() - start
+                del df
+            else:
+                accumulator = RankingAccumulator()
+                for offset in range(0, size, chunk_rows):
+                    chunk = telemetry_frame(min(chunk_rows, size - offset), first_row=offset)
+                    start = time.perf_counter()
+                    accumulator.add(chunk)
+                    elapsed += time.perf_counter() - start
+                start = time.perf_counter()
+                rankings = accumulator.rankings()
+                elapsed += time.perf_counter() - start
+            assert int(rankings['records'].sum()) == size
+
+            results.append({'rows': size, 'mode': mode, 'seconds': elapsed, 'rows_per_sec': size / elapsed})
+            print(f"{size:>12,} {mode:<10} {size / elapsed:>12,.0f} {elapsed:>9.2f}")
+
+    return results
+
+
+def _parquet_worker(rows, root, queue):
+    """save_to_azure_blob + load_from_azure_blob in a fresh process against the local blob stand-in"""
+    import io
+    import contextlib
+    from datetime import date
+
+    os.environ['LOCAL_BLOB_ROOT'] = root
+    os.environ['BLOB_CACHE_MAX_MB'] = '0'  # measure the download, not the cache
+    import simple_parquet_batch as batch
+
+    df = telemetry_frame(rows)
+    target_date = date(*BENCH_DATE)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        blob_path = batch.save_to_azure_blob(df, target_date)
+        write_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = batch.load_from_azure_blob(target_date)
+        read_seconds = time.perf_counter() - start
+    assert blob_path and len(loaded) == rows
+    nbytes = os.path.getsize(os.path.join(root, 'parquet-data', blob_path))
+    queue.put({'bytes': nbytes, 'write_seconds': write_seconds, 'read_seconds': read_seconds,
+               'peak_rss_mb': peak_rss_mb()})
+
+
+def bench_parquet(sizes=(1_000_000, 10_000_000), root=os.path.join(BENCH_DATA, 'blobs')):
+    """Parquet round trip through save_to_azure_blob / load_from_azure_blob (local blob stand-in)"""
+    import multiprocessing
+
+    print("🗄️  Parquet round trip (save_to_azure_blob / load_from_azure_blob)")
+    print(f"{'Rows':>12} {'MB':>8} {'Write rows/sec':>15} {'Read rows/sec':>15} {'Peak RSS MB':>12}")
+    print("-" * 66)
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for size in sizes:
+        queue = context.Queue()
+        worker = context.Process(target=_parquet_worker, args=(size, root, queue))
+        worker.start()
+        result = queue.get()
+        worker.join()
+        result.update({'rows': size, 'write_rows_per_sec': size / result['write_seconds'],
+                       'read_rows_per_sec': size / result['read_seconds']})
+        results.append(result)
+        print(f"{size:>12,} {result['bytes'] / 1e6:>8.1f} {result['write_rows_per_sec']:>15,.0f} "
+              f"{result['read_rows_per_sec']:>15,.0f} {result['peak_rss_mb']:>12.0f}")
+
+    return results
+
+
+def bench_sql_insert(sizes=(100_000, 1_000_000), chunk_rows=100_000, database=os.path.join(BENCH_DATA, 'insert.db')):
+    """Rows/sec inserting boat_telemetry into the SQLite stand-in (one transaction per chunk)"""
+    import local_db
+
+    print("🧾 boat_telemetry insert (SQLite)")
+    print(f"{'Rows':>12} {'Rows/sec':>12} {'Seconds':>9}")
+    print("-" * 35)
+
+    os.makedirs(BENCH_DATA, exist_ok=True)
+    results = []
+    for size in sizes:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(database + suffix):
+                os.remove(database + suffix)
+        conn = local_db.connect(database)
+        elapsed = 0.0
+        for offset in range(0, size, chunk_rows):
+            df = telemetry_frame(min(chunk_rows, size - offset), first_row=offset)
+            columns = {name: df[name].to_numpy() for name in df.columns}
+            columns['created_at'] = columns['enqueued_time']
+            start = time.perf_counter()
+            local_db.insert_telemetry(conn, columns)
+            elapsed += time.perf_counter() - start
+        conn.close()
+        results.append({'rows': size, 'seconds': elapsed, 'rows_per_sec': size / elapsed})
+        print(f"{size:>12,} {size / elapsed:>12,.0f} {elapsed:>9.2f}")
+
+    return results
+
+
+def bench_shards(size=1_000_000, shard_counts=(1, 2, 4), ticks=5):
+    """Events/sec of the sharded simulator (fake Event Hub, packed encoding, no sleeping between
+    ticks) as the fleet is split across more processes"""
+    from fleet_shards import run_sharded
+
+    shard_counts = sorted(set(shard_counts) | {os.cpu_count() or 1})
+    print(f"🧩 Sharded simulator: {size:,} boats, {ticks} ticks, {os.cpu_count()} cores")
+    rows = []
+    for shards in shard_counts:
+        result = run_sharded(shards, size, 'fake', 'packed', seed=42, tick_seconds=0, ticks=ticks, verbose=False)
+        rows.append({'boats': size, 'shards': shards, 'events_per_sec': result['events_per_sec'],
+                     'max_lag_seconds': max(shard['max_lag_seconds'] for shard in result['shards'])})
+
+    print(f"{'Shards':>7} {'Events/sec':>14} {'Speed-up':>9}")
+    print("-" * 32)
+    for row in rows:
+        print(f"{row['shards']:>7} {row['events_per_sec']:>14,.0f} {row['events_per_sec'] / rows[0]['events_per_sec']:>8.1f}x")
+    return rows
+
+
+def bench_history(day_counts=(30, 365), boats=1000, root=os.path.join(BENCH_DATA, 'history')):
+    """Historical leaderboards over daily rankings Parquet files: rankings_history.py (date pruning,
+    column projection, per-file reduction) vs reading every file whole with pandas"""
+    import numpy as np
+    import pandas as pd
+    from datetime import date, timedelta
+
+    folder = os.path.join(root, 'parquet-data', 'daily-rankings')
+    os.makedirs(folder, exist_ok=True)
+    end = date(2025, 12, 31)
+    rng = np.random.default_rng(42)
+    for offset in range(max(day_counts)):
+        path = os.path.join(folder, f"boat_rankings_{end - timedelta(days=offset):%Y%m%d}.parquet")
+        if os.path.exists(path):
+            continue
+        rankings = pd.DataFrame({'boat_id': np.arange(boats), 'avg_speed': rng.uniform(5, 20, boats).round(2),
+                                 'max_speed': 25.0, 'records': 8640, 'avg_lat': 0.0, 'avg_lng': 0.0,
+                                 'distance_km': 0.0, 'distance_to_finish_km': 0.0, 'race_rank': np.arange(1, boats + 1)})
+        rankings['rank'] = rankings['avg_speed'].rank(ascending=False, method='dense')
+        rankings.to_parquet(path, index=False)
+
+    previous_root = os.environ.get('LOCAL_BLOB_ROOT')
+    os.environ['LOCAL_BLOB_ROOT'] = root
+    try:
+        import rankings_history
+
+        print(f"📚 Historical leaderboards over daily rankings Parquet ({boats} boats per day)")
+        print(f"{'Days':>6} {'Leaderboard ms':>15} {'Winners ms':>11} {'Pandas ms':>10} {'Files/sec':>10}")
+        print("-" * 57)
+        results = []
+        for days in day_counts:
+            start = time.perf_counter()
+            board = rankings_history.leaderboard(days, end)
+            leaderboard = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rankings_history.daily_winners(days, end)
+            winners = time.perf_counter() - start
+
+            # the alternative: load every file of the window whole and aggregate in pandas
+            start = time.perf_counter()
+            names = [f"boat_rankings_{end - timedelta(days=offset):%Y%m%d}.parquet" for offset in range(days)]
+            frame = pd.concat(pd.read_parquet(os.path.join(folder, name)) for name in names)
+            expected = frame.groupby('boat_id')['avg_speed'].mean().sort_values(ascending=False)
+            baseline = time.perf_counter() - start
+            assert np.allclose(board['avg_speed'].to_numpy(), expected.to_numpy())
+
+            result = {'rows': days * boats, 'leaderboard_ms': leaderboard * 1000, 'winners_ms': winners * 1000,
+                      'pandas_ms': baseline * 1000, 'files_per_sec': days / leaderboard}
+            results.append(result)
+            print(f"{days:>6} {result['leaderboard_ms']:>15.1f} {result['winners_ms']:>11.1f} "
+                  f"{result['pandas_ms']:>10.1f} {result['files_per_sec']:>10,.0f}")
+    finally:
+        if previous_root is None:
+            os.environ.pop('LOCAL_BLOB_ROOT', None)
+        else:
+            os.environ['LOCAL_BLOB_ROOT'] = previous_root
+    return results
+
+
+def _micro_batch_worker(source, database, root, runs, queue):
+    """Replay a day of telemetry in `runs` slices of created_at; after each slice time an
+    incremental micro-batch and a full-day rerun (fresh process: the connection pool is global)"""
+    import io
+    import contextlib
+    import local_db
+    from datetime import date, datetime, timedelta
+
+    os.environ['SQLITE_DATABASE'] = database
+    os.environ['LOCAL_BLOB_ROOT'] = root
+    import simple_parquet_batch as batch
+    import micro_batches
+
+    conn = local_db.connect(database)
+    conn.execute("ATTACH DATABASE ? AS source", (source,))
+    day = date(*BENCH_DATE)
+    start = datetime(*BENCH_DATE)
+    for run in range(1, runs + 1):
+        # the rows that arrived in this slice of the day
+        boundary = (start + timedelta(days=run / runs)).strftime('%Y-%m-%d %H:%M:%S.%f')
+        conn.execute("INSERT INTO boat_telemetry SELECT * FROM source.boat_telemetry "
+                     "WHERE created_at < ? AND id > (SELECT IFNULL(MAX(id), 0) FROM boat_telemetry)", (boundary,))
+        conn.commit()
+        rows = conn.execute("SELECT COUNT(*) FROM boat_telemetry").fetchone()[0]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            micro_batches.run_incremental(day)
+            incremental = time.perf_counter() - started
+
+            started = time.perf_counter()
+            batch.save_to_azure_blob(batch.compute_boat_rankings_streaming(batch.iter_daily_batches(day)), day)
+            full = time.perf_counter() - started
+        queue.put({'rows': rows, 'incremental_seconds': incremental, 'full_seconds': full})
+    queue.put(None)
+    conn.close()
+
+
+def bench_micro_batch(size=1_000_000, runs=8, source=os.path.join(BENCH_DATA, 'telemetry.db')):
+    """Intraday refreshes of the day's rankings: a checkpointed micro-batch (only the rows that
+    arrived since the last run) vs re-extracting and re-aggregating the day from midnight"""
+    import shutil
+    import multiprocessing
+
+    make_telemetry_db(source, size).close()
+    database = os.path.join(BENCH_DATA, 'micro-batch.db')
+    root = os.path.join(BENCH_DATA, 'micro-batch-blobs')
+    for path in (database, database + '-wal', database + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(root, ignore_errors=True)
+
+    print(f"🧱 Intraday rankings refresh: {size:,} rows arriving over {runs} runs (SQLite, local blobs)")
+    print(f"{'Run':>4} {'Rows today':>11} {'Micro-batch s':>14} {'Full day s':>11} {'Speed-up':>9}")
+    print("-" * 53)
+    queue = multiprocessing.get_context('spawn').Queue()
+    worker = multiprocessing.get_context('spawn').Process(target=_micro_batch_worker,
+                                                           args=(source, database, root, runs, queue))
+    worker.start()
+    results = []
+    while True:
+        result = queue.get()
+        if result is None:
+            break
+        results.append(result)
+        print(f"{len(results):>4} {result['rows']:>11,} {result['incremental_seconds']:>14.2f} "
+              f"{result['full_seconds']:>11.2f} {result['full_seconds'] / result['incremental_seconds']:>8.1f}x")
+    worker.join()
+    return results
+
+
+def _backfill_worker(database, root, workers, runs, queue):
+    """Backfill every file under root `runs` times (fresh process: the connection pool and the
+    blob cache are global)"""
+    import io
+    import sqlite3
+    import contextlib
+
+    os.environ['SQLITE_DATABASE'] = database
+    os.environ['LOCAL_BLOB_ROOT'] = root
+    os.environ['BLOB_CACHE_MAX_MB'] = '0'
+    import pandas  # the backfill imports it lazily: keep that out of the first run
+    import parquet_to_sql
+
+    for run in range(runs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            days = parquet_to_sql.backfill_parquet_files(workers=workers)
+            seconds = time.perf_counter() - started
+        with sqlite3.connect(database) as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM boat_historical_rankings").fetchone()[0]
+        queue.put({'days': days, 'rows': rows, 'seconds': seconds})
+    queue.put(None)
+
+
+def bench_backfill(days=365, boats=200, worker_counts=(1, 8), runs=2, root=os.path.join(BENCH_DATA, 'backfill')):
+    """parquet_to_sql.py --backfill of a year of daily rankings files into SQLite: discovery,
+    threaded downloads and one upsert transaction per batch of dates; the second run replaces
+    every date in place"""
+    import shutil
+    import multiprocessing
+
+    folder = os.path.join(root, 'blobs', 'parquet-data', 'daily-rankings')
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(folder)
+    for day, rankings in ranking_frames(days * boats, boats=boats):
+        rankings.to_parquet(os.path.join(folder, f"boat_rankings_{day:%Y%m%d}.parquet"), index=False)
+
+    print(f"🔄 Backfill of {days} daily rankings files ({boats} boats each) into SQLite, local blobs")
+    print(f"{'Workers':>8} {'Run':>4} {'Days':>5} {'Rows':>9} {'Seconds':>8} {'Days/sec':>9}")
+    print("-" * 48)
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for workers in worker_counts:
+        database = os.path.join(root, f'backfill-{workers}.db')
+        queue = context.Queue()
+        worker = context.Process(target=_backfill_worker,
+                                 args=(database, os.path.join(root, 'blobs'), workers, runs, queue))
+        worker.start()
+        run = 0
+        while True:
+            result = queue.get()
+            if result is None:
+                break
+            run += 1
+            assert result['days'] == days and result['rows'] == days * boats
+            result.update(mode=f'{workers} workers, run {run}', days_per_sec=result['days'] / result['seconds'])
+            results.append(result)
+            print(f"{workers:>8} {run:>4} {result['days']:>5} {result['rows']:>9,} {result['seconds']:>8.2f} "
+                  f"{result['days_per_sec']:>9,.0f}")
+        worker.join()
+    return results
+
+
+def bench_window(sizes=(10_000, 100_000), ticks=60, slots=64):
+    """Rolling telemetry window: rows/sec appended one simulator tick at a time, and the time to
+    compute per-boat and fleet statistics over a full window (10 minutes of 10-second ticks)"""
+    import numpy as np
+    from telemetry_window import TelemetryWindow
+
+    print(f"📈 Rolling telemetry window ({ticks} ticks, {slots} slots per boat)")
+    print(f"{'Boats':>10} {'Append rows/sec':>16} {'Boat stats ms':>14} {'Fleet stats ms':>15} {'Memory MB':>10}")
+    print("-" * 70)
+    results = []
+    start_time = np.datetime64('2025-01-01T00:00:00', 'us')
+    for size in sizes:
+        rng = np.random.default_rng(42)
+        window = TelemetryWindow(minutes=10, slots=slots, capacity=size)
+        boats = np.arange(size)
+        speed, position = rng.uniform(5, 20, size), np.zeros(size)
+        start = time.perf_counter()
+        for tick in range(ticks):
+            window.append(boats, np.full(size, start_time + np.timedelta64(10 * tick, 's')), speed, position, position)
+        append = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stats = window.boat_stats()
+        boat_stats = time.perf_counter() - start
+        start = time.perf_counter()
+        window.fleet_stats()
+        fleet_stats = time.perf_counter() - start
+        assert len(stats) == size
+
+        result = {'boats': size, 'append_rows_per_sec': size * ticks / append, 'boat_stats_ms': boat_stats * 1000,
+                  'fleet_stats_ms': fleet_stats * 1000, 'memory_mb': window.memory_bytes / 1e6}
+        results.append(result)
+        print(f"{size:>10,} {result['append_rows_per_sec']:>16,.0f} {result['boat_stats_ms']:>14.1f} "
+              f"{result['fleet_stats_ms']:>15.1f} {result['memory_mb']:>10.1f}")
+    return results
+
+
+def bench_cli(commands=('', 'simulate', 'monitor', 'batch', 'sync', 'backfill'), runs=5, target_ms=100):
+    """Cold start of the sail CLI: wall time of `sail [command] --help` in a fresh interpreter
+    (median of several runs), i.e. the import cost a subcommand pays before doing any work"""
+    import subprocess
+    import statistics
+
+    def median_ms(arguments):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *arguments], stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        return statistics.median(times) * 1000
+
+    interpreter = median_ms(['-c', 'pass'])
+    print(f"🚀 sail CLI cold start (median of {runs} runs, bare interpreter {interpreter:.0f} ms)")
+    print(f"{'Command':<22} {'Start-up ms':>12}")
+    print("-" * 36)
+    results = []
+    for command in commands:
+        arguments = ['sail.py', *([command] if command else []), '--help']
+        startup = median_ms(arguments)
+        results.append({'mode': command or 'sail', 'startup_ms': startup, 'interpreter_ms': interpreter})
+        flag = "" if startup < target_ms else f"  ⚠️  over {target_ms} ms"
+        print(f"{'sail ' + (command + ' ' if command else '') + '--help':<22} {startup:>12.0f}{flag}")
+    return results
+
+
+BENCHMARKS = {
+    'fleet': bench_fleet,
+    'encoding': bench_encoding,
+    'validator': bench_validator,
+    'extract': bench_extract,
+    'aggregate': bench_aggregate,
+    'parquet': bench_parquet,
+    'sql_insert': bench_sql_insert,
+    'rankings': bench_rankings,
+    'upload': bench_upload,
+    'fleet_state': bench_fleet_state,
+    'race': bench_race,
+    'shards': bench_shards,
+    'history': bench_history,
+    'backfill': bench_backfill,
+    'micro_batch': bench_micro_batch,
+    'window': bench_window,
+    'cli': bench_cli,
+}
+
+# Problem sizes per scale; 'default' uses each benchmark's own defaults
+SCALES = {
+    'quick': {
+        'fleet': {'sizes': (10, 10_000, 100_000), 'seconds': 0.5},
+        'encoding': {'size': 10_000},
+        'validator': {'size': 200_000},
+        'extract': {'sizes': (200_000,)},
+        'aggregate': {'sizes': (1_000_000,)},
+        'parquet': {'sizes': (1_000_000,)},
+        'sql_insert': {'sizes': (100_000,)},
+        'rankings': {'sizes': (10_000, 100_000)},
+        'upload': {'sizes': (1_000_000,)},
+        'fleet_state': {'size': 100_000},
+        'race': {'sizes': (10_000, 100_000)},
+        'shards': {'size': 100_000, 'shard_counts': (1, 2)},
+        'history': {'day_counts': (30,)},
+        'backfill': {'days': 60},
+        'micro_batch': {'size': 200_000, 'runs': 4},
+        'window': {'sizes': (10_000,)},
+        'cli': {'runs': 3},
+    },
+    'default': {},
+    'full': {
+        'fleet': {'sizes': (10, 10_000, 1_000_000, 10_000_000)},
+        'extract': {'sizes': (1_000_000, 4_000_000, 10_000_000)},
+        'aggregate': {'sizes': (1_000_000, 10_000_000, 100_000_000)},
+        'parquet': {'sizes': (1_000_000, 10_000_000, 30_000_000)},
+        'sql_insert': {'sizes': (100_000, 1_000_000, 10_000_000)},
+        'shards': {'size': 10_000_000, 'shard_counts': (1, 2, 4, 8)},
+        'history': {'day_counts': (30, 365, 1095), 'boats': 10_000},
+        'backfill': {'days': 1095, 'boats': 1000},
+        'micro_batch': {'size': 4_000_000, 'runs': 24},
+        'window': {'sizes': (10_000, 100_000, 1_000_000)},
+    },
+}
+
+RESULTS_DIR = os.path.join(BENCH_DATA, 'results')
+
+# Fields that identify an entry of a benchmark's result list (the rest are measurements)
+ID_FIELDS = ('boats', 'size', 'rows', 'mode', 'path', 'encoding', 'shards')
+
+
+def flatten(value, prefix):
+    """Yield (metric name, number) for every measurement in a benchmark result"""
+    if isinstance(value, bool) or value is None:
+        return
+    if isinstance(value, (int, float)):
+        yield prefix, float(value)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}")
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict):
+                label = ','.join(f"{key}={item[key]}" for key in ID_FIELDS if key in item)
+                yield from flatten({key: v for key, v in item.items() if key not in ID_FIELDS}, f"{prefix}[{label}]")
+
+
+def better_direction(metric):
+    """+1 when higher is better, -1 when lower is better, 0 for informational numbers"""
+    name = metric.rsplit('.', 1)[-1]
+    if 'per_sec' in name:
+        return 1
+    if any(part in name for part in ('seconds', '_ms', 'rss_mb', 'bytes')):
+        return -1
+    return 0
+
+
+def environment():
+    """What the numbers depend on besides the code"""
+    import platform
+    import subprocess
+    versions = {}
+    for module in ('numpy', 'pandas', 'pyarrow'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {'git_commit': commit or None, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), **versions}
+
+
+def write_results(results, scale, path=None):
+    """Store one run as JSON (benchmark-data/results/<UTC time>.json by default)"""
+    from datetime import datetime, timezone
+    created_at = datetime.now(timezone.utc)
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{created_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+    with open(path, 'w') as f:
+        json.dump({'created_at': created_at.isoformat(), 'scale': scale, 'environment': environment(),
+                   'results': results}, f, indent=2, default=str)
+    print(f"📝 Results written to {path}")
+    return path
+
+
+def previous_results(exclude=None):
+    """Most recent stored run other than `exclude`"""
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    paths = sorted(os.path.join(RESULTS_DIR, name) for name in os.listdir(RESULTS_DIR) if name.endswith('.json'))
+    paths = [path for path in paths if path != exclude]
+    return paths[-1] if paths else None
+
+
+def compare(baseline_path, current, threshold=10.0):
+    """Print every metric present in both runs with its change; flag changes for the worse
+    beyond `threshold` percent. Returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get('scale') != current['scale']:
+        print(f"⚠️  Baseline ran at scale '{baseline.get('scale')}', this run at '{current['scale']}'")
+    old = dict(metric for name, result in baseline['results'].items() for metric in flatten(result, name))
+    new = dict(metric for name, result in current['results'].items() for metric in flatten(result, name))
+
+    print(f"\n📊 Compared with {baseline_path} ({baseline['environment'].get('git_commit')}, {baseline['created_at'][:19]})")
+    print(f"{'Metric':<60} {'Before':>14} {'After':>14} {'Change':>8}")
+    print("-" * 100)
+    regressions = 0
+    for metric in (name for name in new if name in old):
+        before, after = old[metric], new[metric]
+        change = (after - before) / before * 100 if before else 0.0
+        direction = better_direction(metric)
+        flag = ''
+        if direction and -direction * change > threshold:
+            flag = ' ⚠️  regression'
+            regressions += 1
+        elif direction and direction * change > threshold:
+            flag = ' 🚀'
+        print(f"{metric:<60} {before:>14,.2f} {after:>14,.2f} {change:>+7.1f}%{flag}")
+    print(f"\n{'❌' if regressions else '✅'} {regressions} regression(s) beyond {threshold:.0f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks")
+    parser.add_argument('names', nargs='*', metavar='benchmark', help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--scale', choices=list(SCALES), default='default', help="problem sizes")
+    parser.add_argument('--output', help="results file (default: benchmark-data/results/<time>.json)")
+    parser.add_argument('--compare', nargs='?', const='previous', metavar='RESULTS',
+                        help="compare with a results file (default: the previous run)")
+    parser.add_argument('--threshold', type=float, default=10.0, help="percent change reported as a regression")
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ Unknown benchmark: {name} (choose from {', '.join(BENCHMARKS)})")
+            return 2
+
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name](**SCALES[args.scale].get(name, {}))
+        print()
+    path = write_results(results, args.scale, args.output)
+
+    if args.compare:
+        baseline = previous_results(exclude=path) if args.compare == 'previous' else args.compare
+        if baseline is None:
+            print("ℹ️  No previous results to compare with")
+            return 0
+        current = {'scale': args.scale, 'results': results}
+        return 1 if compare(baseline, current, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Local on-disk cache for Parquet blobs (daily rankings and other immutable files)
+Entries are keyed by container/blob path and remember the blob's ETag. A cached blob is
+revalidated with a conditional download (If-None-Match): an unchanged blob costs one 304
+round trip and no egress. The cache is size-bounded (least recently used files are evicted
+first) and files are read back into pandas through a memory map.
+Usage: BLOB_CACHE_DIR=.blob-cache BLOB_CACHE_MAX_MB=1024 python3 parquet_to_sql.py --backfill
+       python3 blob_cache.py            (show what is cached)
+       python3 blob_cache.py --clear
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import hashlib
+import threading
+
+from pipeline_metrics import METRICS
+from data_access import with_retry
+
+BLOB_CACHE_DIR = os.getenv('BLOB_CACHE_DIR', '.blob-cache')
+
+# Total size of cached files; 0 disables the cache (every read downloads into memory)
+BLOB_CACHE_MAX_BYTES = int(float(os.getenv('BLOB_CACHE_MAX_MB', '1024')) * 1024 * 1024)
+
+INDEX_FILE = 'index.json'
+
+
+def if_modified():
+    """MatchConditions.IfModified from the Azure SDK, or the local stand-in's equivalent"""
+    try:
+        from azure.core import MatchConditions
+    except ImportError:
+        from local_blob import MatchConditions
+    return MatchConditions.IfModified
+
+
+def is_not_modified(error):
+    """ResourceNotModifiedError (Azure) / BlobNotModified (local stand-in): HTTP 304"""
+    return getattr(error, 'status_code', None) == 304 or type(error).__name__ == 'ResourceNotModifiedError'
+
+
+class BlobCache():
+    """ETag-validated, size-bounded LRU cache of blobs on local disk (thread-safe)"""
+
+    def __init__(self, directory=BLOB_CACHE_DIR, max_bytes=BLOB_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._pins = {}  # key -> readers holding the file; pinned files are never evicted
+        self._dirty = False  # access times changed since the index was last written
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, INDEX_FILE)
+        self._index = self._load_index()
+        atexit.register(self.flush)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # drop entries whose file has gone (cleared by hand, partial copy of the directory, ...)
+        return {key: entry for key, entry in index.items()
+                if os.path.exists(os.path.join(self.directory, entry['file']))}
+
+    def _save_index(self):
+        temp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(temp_path, self._index_path)
+        self._dirty = False
+
+    def flush(self):
+        """Write the index if hits have only updated access times since it was last saved"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    @property
+    def size(self):
+        with self._lock:
+            return sum(entry['size'] for entry in self._index.values())
+
+    def _pin(self, key, entry):
+        """Pin a cached entry for reading (caller holds the lock); False when its file is gone"""
+        if self._index.get(key) is not entry:
+            return False
+        if not os.path.exists(os.path.join(self.directory, entry['file'])):
+            # removed behind our back: forget it and download again
+            del self._index[key]
+            self._dirty = True
+            return False
+        self._pins[key] = self._pins.get(key, 0) + 1
+        return True
+
+    def unpin(self, key):
+        """Release a file returned by fetch(); it may be evicted again once nobody reads it"""
+        with self._lock:
+            self._pins[key] -= 1
+            if not self._pins[key]:
+                del self._pins[key]
+
+    def fetch(self, blob):
+        """(key, local path) of an up-to-date copy of the blob, downloading only when it changed.
+        The file is pinned against eviction and clear() until unpin(key)."""
+        key = f"{blob.container_name}/{blob.blob_name}"
+        with self._lock:
+            entry = self._index.get(key)
+
+        downloader = None
+        if entry is not None:
+            try:
+                downloader = blob.download_blob(etag=entry['etag'], match_condition=if_modified())
+            except Exception as e:
+                if not is_not_modified(e):
+                    raise
+                with self._lock:
+                    if self._pin(key, entry):
+                        entry['last_access'] = time.time()
+                        self.hits += 1
+                        self.bytes_saved += entry['size']
+                        self._dirty = True
+                        METRICS.set_gauge('blob_cache_hits', self.hits)
+                        return key, os.path.join(self.directory, entry['file'])
+        if downloader is None:
+            downloader = blob.download_blob()
+
+        # miss (or changed blob): stream straight to disk, then publish with an atomic rename
+        filename = hashlib.sha1(key.encode()).hexdigest() + os.path.splitext(blob.blob_name)[1]
+        path = os.path.join(self.directory, filename)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(temp_path, 'wb') as f:
+            downloader.readinto(f)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            entry = {'etag': downloader.properties.etag, 'file': filename, 'size': size, 'last_access': time.time()}
+            self._index[key] = entry
+            self._pin(key, entry)
+            self.misses += 1
+            self.bytes_downloaded += size
+            self._evict()
+            self._save_index()
+        METRICS.set_gauge('blob_cache_misses', self.misses)
+        return key, path
+
+    def _evict(self):
+        """Remove least recently used files until the cache fits max_bytes, skipping the ones
+        being read (caller holds the lock)"""
+        total = sum(entry['size'] for entry in self._index.values())
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key in self._pins:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except FileNotFoundError:
+                pass
+            del self._index[key]
+            total -= entry['size']
+            self.evictions += 1
+
+    def read_parquet(self, blob, columns=None):
+        """DataFrame from a cached Parquet blob, read through a memory map"""
+        import pandas as pd
+        with METRICS.stage('download') as stage:
+            key, path = with_retry(lambda: self.fetch(blob), 'download')
+            stage.bytes = os.path.getsize(path)
+        try:
+            with METRICS.stage('decode') as stage:
+                df = pd.read_parquet(path, columns=columns, memory_map=True)
+                stage.rows = len(df)
+                stage.bytes = os.path.getsize(path)
+        finally:
+            self.unpin(key)
+        return df
+
+    def clear(self):
+        """Remove every cached file that is not being read"""
+        with self._lock:
+            for key, entry in list(self._index.items()):
+                if key in self._pins:
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, entry['file']))
+                except FileNotFoundError:
+                    pass
+                del self._index[key]
+            self._save_index()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes_downloaded': self.bytes_downloaded,
+                'bytes_saved': self.bytes_saved,
+                'files': len(self._index),
+                'size_bytes': sum(entry['size'] for entry in self._index.values()),
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"💾 Blob cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+              f"{stats['bytes_downloaded'] / 1e6:.1f} MB downloaded, {stats['bytes_saved'] / 1e6:.1f} MB saved, "
+              f"{stats['evictions']} evicted, {stats['files']} files / {stats['size_bytes'] / 1e6:.1f} MB on disk")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_blob_cache():
+    """Process-wide cache, or None when BLOB_CACHE_MAX_MB=0"""
+    global _cache
+    if BLOB_CACHE_MAX_BYTES <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = BlobCache()
+        return _cache
+
+
+if __name__ == "__main__":
+    cache = BlobCache()
+    if '--clear' in sys.argv[1:]:
+        cache.clear()
+        print(f"🧹 Cleared blob cache: {cache.directory}")
+    else:
+        stats = cache.stats()
+        print(f"💾 {cache.directory}: {stats['files']} files, {stats['size_bytes'] / 1e6:.1f} MB "
+              f"(limit {cache.max_bytes / 1e6:.0f} MB)")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Streaming uploads to Azure Block Blobs
+BlockBlobWriter is a write-only file object: bytes are cut into blocks that are staged
+(stage_block) on background threads while the caller keeps encoding, and the blob is only
+committed (commit_block_list) on a clean close, so readers never see a partial file.
+write_parquet_blob encodes a DataFrame or a stream of Arrow batches row group by row group
+into such a writer: memory stays bounded by one row group plus the blocks in flight.
+Usage: from blob_stream import write_parquet_blob
+       write_parquet_blob(df, blob_client)
+"""
+
+import os
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_access import with_retry
+
+# Size of each staged block, and how many uploads run at once
+BLOCK_BYTES = int(float(os.getenv('BLOB_BLOCK_MB', '8')) * 1024 * 1024)
+UPLOAD_CONCURRENCY = int(os.getenv('BLOB_UPLOAD_CONCURRENCY', '4'))
+
+# Rows per Parquet row group when encoding a DataFrame (pyarrow's default; much smaller
+# groups cost both encoding speed and compression)
+ROW_GROUP_ROWS = int(os.getenv('PARQUET_ROW_GROUP_ROWS', '1048576'))
+
+
+def block_list_entry(block_id):
+    """BlobBlock for the Azure SDK; the local stand-in takes the id itself"""
+    try:
+        from azure.storage.blob import BlobBlock
+    except ImportError:
+        return block_id
+    return BlobBlock(block_id=block_id)
+
+
+class BlockBlobWriter():
+    """File-like sink that uploads what is written as staged blocks of a block blob"""
+
+    def __init__(self, blob, block_bytes=BLOCK_BYTES, concurrency=UPLOAD_CONCURRENCY):
+        self.blob = blob
+        self.block_bytes = block_bytes
+        self.bytes_written = 0
+        self.closed = False
+        self._buffer = bytearray()
+        self._block_ids = []
+        self._futures = []
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+        # at most 2 x concurrency blocks are held in memory (uploading or waiting to)
+        self._in_flight = threading.BoundedSemaphore(2 * concurrency)
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.block_bytes:
+            self._stage(bytes(self._buffer[:self.block_bytes]))
+            del self._buffer[:self.block_bytes]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _stage(self, data):
+        # fixed-width ids: Azure requires every block id of a blob to have the same length
+        block_id = base64.b64encode(f"block-{len(self._block_ids):08d}".encode()).decode()
+        self._block_ids.append(block_id)
+        self._in_flight.acquire()
+
+        def upload():
+            try:
+                with_retry(lambda: self.blob.stage_block(block_id, data), 'stage_block')
+            finally:
+                self._in_flight.release()
+
+        self._futures.append(self._pool.submit(upload))
+        # surface a failed upload early instead of at commit time
+        for future in [future for future in self._futures if future.done()]:
+            future.result()
+            self._futures.remove(future)
+
+    def close(self):
+        """Stage the last block and commit the block list: the blob appears atomically"""
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._block_ids:
+                self._stage(bytes(self._buffer))
+                self._buffer = bytearray()
+            for future in self._futures:
+                future.result()
+            block_list = [block_list_entry(block_id) for block_id in self._block_ids]
+            with_retry(lambda: self.blob.commit_block_list(block_list), 'commit_blocks')
+        finally:
+            self.closed = True
+            self._pool.shutdown(wait=True)
+
+    def abort(self):
+        """Stop without committing; Azure discards uncommitted blocks on its own"""
+        self.closed = True
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_record_batches(df, row_group_rows=ROW_GROUP_ROWS):
+    """Arrow conversion of a DataFrame a row group at a time (never the whole frame at once)"""
+    schema = None
+    for offset in range(0, max(len(df), 1), row_group_rows):
+        table = pa.Table.from_pandas(df.iloc[offset:offset + row_group_rows], schema=schema, preserve_index=False)
+        schema = table.schema
+        yield table
+
+
+def write_parquet_blob(data, blob, schema=None, row_group_rows=ROW_GROUP_ROWS, compression='snappy'):
+    """Encode a DataFrame (or an iterable of Arrow tables/record batches) as Parquet straight into
+    a block blob. Returns (rows, bytes) written."""
+    if hasattr(data, 'iloc'):
+        data = iter_record_batches(data, row_group_rows)
+    rows = 0
+    with BlockBlobWriter(blob) as sink:
+        writer = None
+        try:
+            for chunk in data:
+                if writer is None:
+                    writer = pq.ParquetWriter(sink, schema or chunk.schema, compression=compression)
+                if isinstance(chunk, pa.RecordBatch):
+                    chunk = pa.Table.from_batches([chunk])
+                writer.write_table(chunk, row_group_size=row_group_rows)
+                rows += chunk.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            raise ValueError("No data to write")
+    return rows, sink.bytes_written
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Shared SQL Database and Blob Storage access for the pipeline scripts
+One bounded pool of warm SQL connections, one cached BlobServiceClient per process, and
+retries with jittered exponential backoff that only fire for transient errors (throttling,
+failover, dropped connections, SQLite lock contention).
+Usage: from data_access import db_connection, run_with_connection, get_azure_client
+"""
+
+import os
+import re
+import time
+import queue
+import random
+import sqlite3
+import functools
+import threading
+from contextlib import contextmanager
+
+from pipeline_metrics import METRICS
+
+# SQL connections kept open per process (a backfill worker pool never needs more)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+
+# Attempts per operation, and the backoff window: attempt n sleeps uniform(0, min(max, base * 2**(n-1)))
+RETRY_ATTEMPTS = int(os.getenv('RETRY_ATTEMPTS', '5'))
+RETRY_BASE_SECONDS = float(os.getenv('RETRY_BASE_SECONDS', '0.5'))
+RETRY_MAX_SECONDS = float(os.getenv('RETRY_MAX_SECONDS', '30'))
+
+DB_SETTINGS = ('SQL_SERVER', 'SQL_DATABASE', 'SQL_USERNAME', 'SQL_PASSWORD')
+
+# SQLSTATEs for lost/failed connections, timeouts and deadlock victims
+TRANSIENT_SQLSTATES = {'08S01', '08001', '08004', '08007', 'HYT00', 'HYT01', '40001'}
+
+# Azure SQL error numbers documented as transient (throttling, failover, database unavailable)
+TRANSIENT_SQL_ERRORS = {1205, 4060, 4221, 10053, 10054, 10060, 10928, 10929, 40143, 40197,
+                        40501, 40540, 40613, 49918, 49919, 49920}
+
+TRANSIENT_HTTP_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def missing_db_config():
+    """Names of the SQL Server settings that are not set (nothing is needed for SQLite)"""
+    if os.getenv('SQLITE_DATABASE'):
+        return []
+    return [name for name in DB_SETTINGS if not os.getenv(name)]
+
+
+def time_range(start, end):
+    """Query parameters for a half-open [start, end) event_time range"""
+    if os.getenv('SQLITE_DATABASE'):
+        # the local stand-in stores timestamps as sortable text
+        return start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')
+    return start, end
+
+
+def open_db_connection():
+    """New connection to Azure SQL, or to the local SQLite stand-in when SQLITE_DATABASE is set"""
+    sqlite_path = os.getenv('SQLITE_DATABASE')
+    if sqlite_path:
+        import local_db
+        return local_db.connect(sqlite_path)
+
+    import pyodbc
+    return pyodbc.connect(
+        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+        f"SERVER={os.getenv('SQL_SERVER')};"
+        f"DATABASE={os.getenv('SQL_DATABASE')};"
+        f"UID={os.getenv('SQL_USERNAME')};"
+        f"PWD={os.getenv('SQL_PASSWORD')};"
+        f"Encrypt=yes;TrustServerCertificate=yes;"
+        f"Connection Timeout=30;"
+    )
+
+
+def is_transient(error):
+    """True for errors worth retrying; bad SQL, missing tables or bad credentials are not"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error)
+        return 'locked' in message or 'busy' in message
+
+    # pyodbc: args = (SQLSTATE, message with the native error number in parentheses)
+    args = getattr(error, 'args', ())
+    if len(args) >= 2 and isinstance(args[0], str) and re.fullmatch(r'[0-9A-Z]{5}', args[0]):
+        if args[0] in TRANSIENT_SQLSTATES:
+            return True
+        numbers = {int(number) for number in re.findall(r'\((\d+)\)', str(args[1]))}
+        return bool(numbers & TRANSIENT_SQL_ERRORS)
+
+    # azure-core: ServiceRequestError/ServiceResponseError (network), HttpResponseError (status)
+    if type(error).__name__ in ('ServiceRequestError', 'ServiceResponseError'):
+        return True
+    return getattr(error, 'status_code', None) in TRANSIENT_HTTP_STATUS
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given (1-based) failed attempt"""
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+
+
+def with_retry(operation, name, attempts=None):
+    """Call operation(), retrying transient failures with backoff; other errors raise at once"""
+    attempts = attempts or RETRY_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == attempts or not is_transient(e):
+                raise
+            delay = backoff_delay(attempt)
+            METRICS.retry(name)
+            print(f"⚠️  {name} attempt {attempt} failed: {e}")
+            print(f"🔄 Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+
+
+class ConnectionPool():
+    """At most `size` connections; idle ones are reused most-recently-returned first"""
+
+    def __init__(self, factory=open_db_connection, size=DB_POOL_SIZE):
+        self.factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No database connection free after {timeout}s (pool size {self.size})")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self.factory()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """Return a connection; discard it (close) when it may be broken"""
+        try:
+            if not discard:
+                try:
+                    conn.rollback()  # never hand out a half-finished transaction
+                except Exception:
+                    discard = True
+            if discard:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except Exception as e:
+            self.release(conn, discard=is_transient(e))
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def db_connection(timeout=None):
+    """Pooled connection as a context manager: with db_connection() as conn: ..."""
+    return get_pool().connection(timeout)
+
+
+def run_with_connection(name, work):
+    """Run work(conn) on a pooled connection, retrying transient failures on a fresh connection"""
+    def attempt():
+        with db_connection() as conn:
+            return work(conn)
+    return with_retry(attempt, name)
+
+
+@functools.lru_cache(maxsize=None)
+def _blob_service(connection_string, local_root):
+    if local_root:
+        # filesystem stand-in for offline runs
+        from local_blob import LocalBlobServiceClient
+        return LocalBlobServiceClient(local_root)
+    from azure.storage.blob import BlobServiceClient
+    return BlobServiceClient.from_connection_string(connection_string)
+
+
+def get_azure_client():
+    """BlobServiceClient for AZURE_STORAGE_CONNECTION_STRING (or LOCAL_BLOB_ROOT), built once and
+    shared; the client is thread-safe and keeps its HTTP connections alive between calls"""
+    return _blob_service(os.getenv('AZURE_STORAGE_CONNECTION_STRING'), os.getenv('LOCAL_BLOB_ROOT'))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Vectorized fleet engine for the race simulator
+Keeps the whole fleet as NumPy arrays (struct-of-arrays) so one tick is a few array operations
+instead of a Python loop over boat objects.
+Usage: python3 benchmarks.py fleet
+"""
+
+import numpy as np
+
+# Start line just outside Cascais, Portugal
+START_LATITUDE = 38.6241832
+START_LONGITUDE = -9.3925219
+
+# Keep speed within sane range (increased max speed for faster movement)
+MAX_SPEED = 25
+
+# Rough degrees-per-km conversion used to move the boats
+KM_PER_DEGREE_LONGITUDE = 85
+KM_PER_DEGREE_LATITUDE = 111
+
+
+class FleetArrays():
+    """Position, heading and speed of every boat, one NumPy array per field"""
+
+    def __init__(self, number_of_boats, seed=None, first_boat=0):
+        self.size = number_of_boats
+        self.rng = np.random.default_rng(seed)
+
+        # put all boats just outside Cascais, Portugal, heading south-west at 10 km/h with random spread
+        # (a shard of a larger fleet numbers its boats from first_boat)
+        self.boat = np.arange(first_boat, first_boat + number_of_boats, dtype=np.int64)
+        self.latitude = START_LATITUDE + self.rng.uniform(-0.01, 0.01, number_of_boats)
+        self.longitude = START_LONGITUDE + self.rng.uniform(-0.01, 0.01, number_of_boats)
+        self.heading = 225 + self.rng.integers(-20, 20, number_of_boats).astype(np.float64)
+        self.speed = 10 + self.rng.uniform(-5, 5, number_of_boats)
+
+        # scratch buffers reused every tick to avoid allocating at large fleet sizes
+        self._noise = np.empty(number_of_boats)
+        self._mask = np.empty(number_of_boats, dtype=bool)
+        self._band = np.empty(number_of_boats, dtype=bool)
+
+    def adjust_course(self):
+        """Apply the random heading/speed jitter and the latitude-band course rules"""
+        noise, mask, band = self._noise, self._mask, self._band
+
+        # make a small adjustment to heading and speed
+        self.rng.random(out=noise)
+        noise *= 10
+        noise -= 5
+        self.heading += noise
+        self.rng.random(out=noise)
+        noise *= 2
+        self.speed += noise
+
+        # keep heading and speed within sane range
+        np.less(self.heading, 0, out=mask)
+        mask |= self.heading > 360
+        self.heading[mask] = 0
+        np.clip(self.speed, 0, MAX_SPEED, out=self.speed)
+
+        # force boat to move south-west from Cascais
+        np.greater(self.latitude, 15, out=band)
+        self._force_heading(band, 205, 245, 225)
+
+        # force boat to move south-east once it passes latitude 15 to move past Africa and South America
+        np.greater(self.latitude, -50, out=band)
+        band &= self.latitude <= 15
+        self._force_heading(band, 130, 170, 150)
+
+        # once the boat is close to Antarctica, keep heading east towards Australia
+        np.greater(self.latitude, -64, out=band)
+        band &= self.latitude <= -50
+        self._force_heading(band, 70, 110, 90)
+
+    def _force_heading(self, band, low, high, heading):
+        """Reset the heading of boats inside a latitude band that steer outside [low, high]"""
+        mask = self._mask
+        np.less(self.heading, low, out=mask)
+        mask |= self.heading > high
+        mask &= band
+        self.heading[mask] = heading
+
+    def move(self, simulation_speed):
+        """Advance every boat along its heading (rough flat-earth approximation)"""
+        rad = np.radians(self.heading)
+        self.longitude += self.speed * np.sin(rad) * (simulation_speed / (60 * KM_PER_DEGREE_LONGITUDE))
+        self.latitude += self.speed * np.cos(rad) * (simulation_speed / (60 * KM_PER_DEGREE_LATITUDE))
+
+    def update(self, simulation_speed):
+        """Run one simulation tick for the whole fleet"""
+        self.adjust_course()
+        self.move(simulation_speed)
+
+    def corruption_mask(self, percent=1):
+        """Pick the boats whose GPS fix gets corrupted this tick (1 in 100 by default)"""
+        return self.rng.integers(0, 100, self.size) < percent
+
+
+def telemetry_columns(fleet):
+    """One tick of telemetry columns for a fleet, with random GPS corruption (-10000)"""
+    corrupted = fleet.corruption_mask()
+    return {
+        "boat": fleet.boat,
+        "latitude": np.where(corrupted, -10000, fleet.latitude),
+        "longitude": np.where(corrupted, -10000, fleet.longitude),
+        "heading": fleet.heading,
+        "speed": fleet.speed
+    }
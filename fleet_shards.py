@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Sharded race simulator for load generation
+The fleet is split by boat-id range across worker processes. Each shard simulates, encodes and
+sends its own boats through its own sink (its own Event Hub producer and share of the partitions,
+or its own files), so a load-test box uses every core. All shards run on one shared clock: tick N
+starts at the same wall-clock instant in every process. The coordinator adds up per-shard
+throughput and reports it per tick and at the end (METRICS 'send'/'update' stages and gauges).
+Usage: NUMBER_OF_BOATS=1000000 TELEMETRY_ENCODING=packed python3 race_simulator.py --shards 8
+       python3 benchmarks.py shards
+"""
+
+import os
+import time
+import queue
+import multiprocessing as mp
+
+from pipeline_metrics import METRICS
+
+# Seconds between all shards being ready and tick 0 (lets every process reach its first wait)
+START_DELAY_SECONDS = float(os.getenv('SHARD_START_DELAY_SECONDS', '0.5'))
+
+# Seconds to wait for the shards to build their fleets and sinks, and to close them
+SHARD_TIMEOUT_SECONDS = float(os.getenv('SHARD_TIMEOUT_SECONDS', '120'))
+
+
+def shard_ranges(number_of_boats, shards):
+    """(first boat, boat count) of each shard: contiguous boat-id ranges of near-equal size"""
+    bounds = [number_of_boats * shard // shards for shard in range(shards + 1)]
+    return [(first, last - first) for first, last in zip(bounds[:-1], bounds[1:])]
+
+
+def run_shard(index, shards, first_boat, boats, settings, reports, go, start, stop):
+    """Worker process: simulate and send one boat-id range, tick N at start + N x tick seconds"""
+    from fleet_engine import FleetArrays, telemetry_columns
+    from telemetry_sinks import create_sink
+
+    sink = None
+    ticks = 0
+    try:
+        seed = settings['seed']
+        fleet = FleetArrays(boats, seed=None if seed is None else [seed, index], first_boat=first_boat)
+        sink = create_sink(settings['sink'], settings['encoding'], shard=(index, shards))
+        partitions = sink.partition_ids() if hasattr(sink, 'partition_ids') else None
+        reports.put(('ready', index, partitions))
+        if not go.wait(SHARD_TIMEOUT_SECONDS):
+            return
+
+        coordinator = mp.parent_process()
+        while not stop.is_set() and (settings['ticks'] is None or ticks < settings['ticks']):
+            # a shard never outlives a coordinator that was killed
+            if coordinator is not None and not coordinator.is_alive():
+                break
+            deadline = start.value + ticks * settings['tick_seconds']
+            delay = deadline - time.time()
+            if delay > 0 and stop.wait(delay):
+                break
+            # a shard that cannot keep up runs late rather than skipping ticks
+            lag = max(time.time() - deadline, 0.0)
+
+            bytes_before, batches_before = sink.bytes_sent, sink.batches_sent
+            started = time.perf_counter()
+            sink.send(telemetry_columns(fleet))
+            sent = time.perf_counter()
+            fleet.update(settings['simulation_speed'])
+            updated = time.perf_counter()
+
+            reports.put(('tick', index, ticks, boats, sink.bytes_sent - bytes_before,
+                         sink.batches_sent - batches_before, sent - started, updated - sent, lag))
+            ticks += 1
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:
+        reports.put(('error', index, f"{type(exc).__name__}: {exc}"))
+    finally:
+        if sink is not None:
+            sink.close()
+        reports.put(('done', index, ticks))
+
+
+class ShardStats():
+    """Running totals of one shard, as reported by its worker"""
+
+    def __init__(self, first_boat, boats):
+        self.first_boat = first_boat
+        self.boats = boats
+        self.partitions = None
+        self.ticks = 0
+        self.events = 0
+        self.bytes = 0
+        self.batches = 0
+        self.send_seconds = 0.0
+        self.update_seconds = 0.0
+        self.max_lag = 0.0
+
+    def add(self, rows, nbytes, batches, send_seconds, update_seconds, lag):
+        self.ticks += 1
+        self.events += rows
+        self.bytes += nbytes
+        self.batches += batches
+        self.send_seconds += send_seconds
+        self.update_seconds += update_seconds
+        self.max_lag = max(self.max_lag, lag)
+
+    def events_per_sec(self):
+        return self.events / max(self.send_seconds + self.update_seconds, 1e-9)
+
+
+def run_sharded(shards, number_of_boats, sink_name, encoding, seed=None, tick_seconds=10, ticks=None,
+                simulation_speed=60, verbose=True):
+    """Coordinator: start one process per shard, release them on a shared clock and aggregate their
+    throughput until Ctrl+C or `ticks` ticks. Returns the per-shard and total results."""
+    shards = max(min(shards, number_of_boats), 1)
+    context = mp.get_context('spawn')
+    reports = context.Queue()
+    go, stop = context.Event(), context.Event()
+    start = context.Value('d', 0.0)
+    settings = {'sink': sink_name, 'encoding': encoding, 'seed': seed, 'tick_seconds': tick_seconds,
+                'ticks': ticks, 'simulation_speed': simulation_speed}
+
+    stats = [ShardStats(first, boats) for first, boats in shard_ranges(number_of_boats, shards)]
+    workers = [context.Process(target=run_shard, daemon=True,
+                               args=(index, shards, shard.first_boat, shard.boats, settings, reports, go, start, stop))
+               for index, shard in enumerate(stats)]
+    if verbose:
+        print(f"🧩 Starting {shards} shards for {number_of_boats:,} boats (sink: {sink_name}, encoding: {encoding})")
+    for worker in workers:
+        worker.start()
+
+    pending = {}
+    ready = set()
+    done = {}
+    errors = []
+    started = None
+    last_tick = None
+
+    def handle(report):
+        kind, index = report[0], report[1]
+        if kind == 'ready':
+            ready.add(index)
+            stats[index].partitions = report[2]
+        elif kind == 'tick':
+            nonlocal last_tick
+            last_tick = time.time()
+            tick, rows, nbytes, batches, send_seconds, update_seconds, lag = report[2:]
+            stats[index].add(rows, nbytes, batches, send_seconds, update_seconds, lag)
+            METRICS.record('send', send_seconds, rows, nbytes)
+            METRICS.record('update', update_seconds, rows)
+            METRICS.set_gauge(f'shard_{index}_events_per_sec', round(stats[index].events_per_sec()))
+            pending.setdefault(tick, []).append(report)
+            complete_ticks()
+        elif kind == 'error':
+            errors.append(f"shard {index}: {report[2]}")
+            print(f"❌ Shard {index} failed: {report[2]}")
+            stop.set()
+        elif kind == 'done':
+            done[index] = report[2]
+            complete_ticks()
+
+    def complete_ticks():
+        # a tick is complete once every shard still running (or that stopped after it) reported it
+        for tick in sorted(pending):
+            expected = sum(index not in done or done[index] > tick for index in range(shards))
+            if len(pending[tick]) < expected:
+                break
+            report_tick(tick, pending.pop(tick))
+
+    def report_tick(tick, tick_reports):
+        rows = sum(report[3] for report in tick_reports)
+        # the tick takes as long as its slowest shard, counted from the shared tick start
+        seconds = max(report[8] + report[6] + report[7] for report in tick_reports)
+        lag = max(report[8] for report in tick_reports)
+        METRICS.set_gauge('shard_tick_lag_seconds', round(lag, 3))
+        METRICS.set_gauge('shard_tick_events_per_sec', round(rows / max(seconds, 1e-9)))
+        if verbose:
+            print(f"⏱️  Tick {tick}: {rows:,} events from {len(tick_reports)} shards in {seconds:.2f}s "
+                  f"({rows / max(seconds, 1e-9):,.0f} events/sec, max lag {lag:.2f}s)")
+
+    try:
+        # every shard builds its fleet and sink before the clock starts
+        while len(ready) < shards and not errors:
+            handle(reports.get(timeout=SHARD_TIMEOUT_SECONDS))
+        for index, shard in enumerate(stats):
+            if verbose and shard.partitions:
+                print(f"   Shard {index}: boats {shard.first_boat}-{shard.first_boat + shard.boats - 1}, "
+                      f"partitions {', '.join(shard.partitions)}")
+        start.value = time.time() + START_DELAY_SECONDS
+        started = start.value
+        go.set()
+
+        while len(done) < shards:
+            try:
+                handle(reports.get(timeout=1.0))
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        go.set()
+        deadline = time.time() + SHARD_TIMEOUT_SECONDS
+        while len(done) < shards and time.time() < deadline:
+            try:
+                handle(reports.get(timeout=max(deadline - time.time(), 0.1)))
+            except (queue.Empty, KeyboardInterrupt):
+                break
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+
+    # throughput is measured from tick 0 to the last tick report (closing sinks is not counted)
+    elapsed = last_tick - started if started and last_tick else 0.0
+    return summarize(stats, elapsed, errors, verbose)
+
+
+def summarize(stats, elapsed, errors, verbose=True):
+    """Per-shard table and fleet totals (events/sec over the wall-clock run)"""
+    events = sum(shard.events for shard in stats)
+    results = {
+        'shards': [{'shard': index, 'first_boat': shard.first_boat, 'boats': shard.boats, 'ticks': shard.ticks,
+                    'events': shard.events, 'bytes': shard.bytes, 'batches': shard.batches,
+                    'events_per_sec': shard.events_per_sec(), 'max_lag_seconds': shard.max_lag}
+                   for index, shard in enumerate(stats)],
+        'events': events,
+        'bytes': sum(shard.bytes for shard in stats),
+        'elapsed_seconds': elapsed,
+        'events_per_sec': events / max(elapsed, 1e-9),
+        'errors': errors,
+    }
+    if verbose:
+        print(f"{'Shard':>6} {'Boats':>10} {'Ticks':>6} {'Events':>13} {'MB':>9} {'Events/sec':>12} {'Max lag':>8}")
+        print("-" * 70)
+        for row in results['shards']:
+            print(f"{row['shard']:>6} {row['boats']:>10,} {row['ticks']:>6} {row['events']:>13,} "
+                  f"{row['bytes'] / 1e6:>9.1f} {row['events_per_sec']:>12,.0f} {row['max_lag_seconds']:>7.2f}s")
+        print(f"✅ {events:,} events from {len(stats)} shards in {elapsed:.1f}s "
+              f"({results['events_per_sec']:,.0f} events/sec)")
+    return results
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+Live fleet state for the serving layer
+Consumes the event stream (Event Hub, captured files or HTTP POSTs from the simulator), applies the
+Stream Analytics filter and keeps only the latest clean state per boat in flat NumPy arrays indexed
+by boat id. The state is served as JSON over HTTP, so the Grafana geomap and current-rankings panels
+(JSON/Infinity datasource) no longer search boat_telemetry for the newest row of every boat.
+Race progress (race_course.py) is tracked from the same events for the /race leaderboard.
+Optionally the boats that changed are upserted into boat_live_state every few seconds, and with
+--window the last minutes of every boat's events are kept for rolling statistics (/window).
+Usage: python3 fleet_state_service.py --port 8090
+       python3 fleet_state_service.py --window --input "telemetry/boats-*.jsonl"
+       TELEMETRY_SINK=http python3 race_simulator.py          (simulator pushes to the service)
+       python3 fleet_state_service.py --eventhub --snapshot-seconds 30
+       python3 fleet_state_service.py --input "telemetry/boats-*.jsonl"
+"""
+
+import os
+import re
+import json
+import glob
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from pipeline_metrics import METRICS
+from stream_validator import validate, read_jsonl
+from wire_format import PACKED_CONTENT_TYPE, decode_packed, decode_events
+from local_db import is_sqlite, format_timestamps
+from race_course import RaceTracker
+import telemetry_window
+
+FLEET_STATE_PORT = int(os.getenv('FLEET_STATE_PORT', '8090'))
+
+# Seconds between boat_live_state snapshots (0 = never write to SQL)
+SNAPSHOT_SECONDS = int(os.getenv('FLEET_STATE_SNAPSHOT_SECONDS', '0'))
+
+# Keep a rolling window of recent events per boat for /window (telemetry_window.py)
+FLEET_STATE_WINDOW = os.getenv('FLEET_STATE_WINDOW', '0') == '1'
+
+# Event Hub consumer group of the service (keep it apart from the Stream Analytics job's)
+CONSUMER_GROUP = os.getenv('FLEET_STATE_CONSUMER_GROUP', '$Default')
+
+# Largest page /boats returns at once, and the number of encoded responses kept per state version
+MAX_PAGE_BOATS = 1_000_000
+RESPONSE_CACHE_SIZE = 64
+
+STATE_FIELDS = ('latitude', 'longitude', 'heading', 'speed')
+
+SQLSERVER_LIVE_TABLE = """
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='boat_live_state' AND xtype='U')
+CREATE TABLE boat_live_state (
+    boat_id INT PRIMARY KEY,
+    latitude FLOAT,
+    longitude FLOAT,
+    heading FLOAT,
+    speed FLOAT,
+    event_time DATETIME2 NOT NULL,
+    updated_at DATETIME2 DEFAULT GETUTCDATE()
+);
+"""
+
+SQLITE_LIVE_TABLE = """
+CREATE TABLE IF NOT EXISTS boat_live_state (
+    boat_id INTEGER PRIMARY KEY,
+    latitude REAL,
+    longitude REAL,
+    heading REAL,
+    speed REAL,
+    event_time TEXT NOT NULL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+SQLITE_UPSERT = """
+INSERT INTO boat_live_state (boat_id, latitude, longitude, heading, speed, event_time)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (boat_id) DO UPDATE SET
+    latitude = excluded.latitude,
+    longitude = excluded.longitude,
+    heading = excluded.heading,
+    speed = excluded.speed,
+    event_time = excluded.event_time,
+    updated_at = CURRENT_TIMESTAMP
+WHERE excluded.event_time >= boat_live_state.event_time
+"""
+
+SQLSERVER_UPSERT = """
+MERGE boat_live_state WITH (HOLDLOCK) AS target
+USING (SELECT ? AS boat_id, ? AS latitude, ? AS longitude, ? AS heading, ? AS speed, ? AS event_time) AS source
+ON target.boat_id = source.boat_id
+WHEN MATCHED AND source.event_time >= target.event_time THEN UPDATE SET
+    latitude = source.latitude,
+    longitude = source.longitude,
+    heading = source.heading,
+    speed = source.speed,
+    event_time = source.event_time,
+    updated_at = GETUTCDATE()
+WHEN NOT MATCHED THEN INSERT (boat_id, latitude, longitude, heading, speed, event_time)
+    VALUES (source.boat_id, source.latitude, source.longitude, source.heading, source.speed, source.event_time);
+"""
+
+
+class FleetState():
+    """Latest clean position, heading and speed of every boat (struct of arrays, thread-safe).
+    Row i belongs to boat i; event_time is in microseconds and -1 for boats never seen.
+    About 41 bytes per boat: 1M boats fit in ~40 MB."""
+
+    def __init__(self, capacity=1024):
+        self.version = 0
+        self.seen = 0
+        self.updates = 0
+        self.newest_event_time = -1
+        self._lock = threading.Lock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.event_time = np.full(capacity, -1, dtype=np.int64)
+        self.dirty = np.zeros(capacity, dtype=bool)
+        for name in STATE_FIELDS:
+            setattr(self, name, np.full(capacity, np.nan))
+
+    def _grow(self, boat_max):
+        """Make room for boat ids up to boat_max (doubling, so appends stay amortized O(1))"""
+        capacity = len(self.event_time)
+        if boat_max < capacity:
+            return
+        old = {name: getattr(self, name) for name in ('event_time', 'dirty') + STATE_FIELDS}
+        self._allocate(max(boat_max + 1, 2 * capacity))
+        for name, values in old.items():
+            getattr(self, name)[:capacity] = values
+
+    @property
+    def capacity(self):
+        return len(self.event_time)
+
+    def update(self, clean):
+        """Apply clean rows (stream_validator.validate output). Only the newest row of each boat
+        in the batch is kept, and only when it is not older than the stored state.
+        Returns the number of boats whose state changed."""
+        if len(clean) == 0:
+            return 0
+        boat = clean['boat_id'].to_numpy(np.int64)
+        event_time = clean['event_time'].to_numpy().astype('datetime64[us]').astype(np.int64)
+        valid = boat >= 0
+        if not valid.all():
+            boat, event_time, clean = boat[valid], event_time[valid], clean[valid]
+
+        # one event per boat is the common case (a simulator tick); sort only when a boat repeats
+        if np.bincount(boat).max() > 1:
+            order = np.lexsort((event_time, boat))
+            last = np.r_[boat[order][1:] != boat[order][:-1], True]
+            rows = order[last]
+        else:
+            rows = np.arange(len(boat))
+
+        with self._lock:
+            self._grow(int(boat.max()))
+            newer = event_time[rows] >= self.event_time[boat[rows]]
+            rows = rows[newer]
+            ids = boat[rows]
+            self.seen += int((self.event_time[ids] < 0).sum())
+            self.event_time[ids] = event_time[rows]
+            for name in STATE_FIELDS:
+                getattr(self, name)[ids] = clean[name].to_numpy()[rows]
+            self.dirty[ids] = True
+            if len(ids):
+                self.version += 1
+                self.updates += len(ids)
+                self.newest_event_time = max(self.newest_event_time, int(event_time[rows].max()))
+        return len(ids)
+
+    def boats(self, offset=0, limit=None):
+        """Copy of the state of the seen boats as a DataFrame ordered by boat id (one page of them
+        with offset/limit)"""
+        with self._lock:
+            ids = np.flatnonzero(self.event_time >= 0)
+            return self._frame(ids[offset:None if limit is None else offset + limit])
+
+    def boat(self, boat_id):
+        """State of one boat as a dict, or None when it has not been seen"""
+        with self._lock:
+            if not 0 <= boat_id < self.capacity or self.event_time[boat_id] < 0:
+                return None
+            state = {'boat_id': boat_id}
+            for name in STATE_FIELDS:
+                value = float(getattr(self, name)[boat_id])
+                state[name] = None if np.isnan(value) else value
+            state['event_time'] = iso_time(self.event_time[boat_id])
+            return state
+
+    def _frame(self, ids):
+        """DataFrame of the given boat ids (caller holds the lock)"""
+        frame = {'boat_id': ids}
+        for name in STATE_FIELDS:
+            frame[name] = getattr(self, name)[ids]
+        frame['event_time'] = self.event_time[ids].astype('datetime64[us]')
+        return pd.DataFrame(frame)
+
+    def leaderboard(self, top=10):
+        """The `top` fastest boats right now, fastest first"""
+        with self._lock:
+            seen = np.flatnonzero(self.event_time >= 0)
+            speed = self.speed[seen]
+            if top < len(seen):
+                part = np.argpartition(-speed, top)[:top]
+            else:
+                part = np.arange(len(seen))
+            ids = seen[part[np.argsort(-speed[part], kind='stable')]]
+            return self._frame(ids)
+
+    def take_dirty(self):
+        """State of the boats changed since the last call, clearing their dirty flags"""
+        with self._lock:
+            ids = np.flatnonzero(self.dirty)
+            self.dirty[ids] = False
+            return self._frame(ids)
+
+    def mark_dirty(self, ids):
+        """Flag boats again after a failed snapshot so the next one retries them"""
+        with self._lock:
+            self.dirty[np.asarray(ids, dtype=np.int64)] = True
+
+    def summary(self):
+        with self._lock:
+            seen = self.event_time >= 0
+            boats = self.seen
+            return {
+                'boats': boats,
+                'version': self.version,
+                'updates': self.updates,
+                'avg_speed': float(self.speed[seen].mean()) if boats else None,
+                'max_speed': float(self.speed[seen].max()) if boats else None,
+                'newest_event_time': iso_time(self.newest_event_time),
+                'memory_bytes': sum(getattr(self, name).nbytes for name in ('event_time', 'dirty') + STATE_FIELDS),
+            }
+
+
+def query_int(query, name, default):
+    """Non-negative integer query parameter (ValueError otherwise, answered with a 400)"""
+    value = int(query.get(name, [str(default)])[0])
+    if value < 0:
+        raise ValueError(f"{name} must not be negative")
+    return value
+
+
+def iso_time(micros):
+    if micros is None or micros < 0:
+        return None
+    return str(np.datetime64(int(micros), 'us')) + 'Z'
+
+
+def to_json(df):
+    """JSON array of row objects, with ISO UTC event times (what the Infinity datasource expects)"""
+    return df.to_json(orient='records', date_format='iso', date_unit='ms').encode()
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+class FleetStateService():
+    """Feeds a FleetState from raw events and serves it over HTTP"""
+
+    def __init__(self, state=None, window=None):
+        self.state = state or FleetState()
+        self.race = RaceTracker()
+        self.window = window
+        self.events = 0
+        self.rejected = 0
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._server = None
+
+    def ingest(self, columns):
+        """Validate raw event columns like Stream Analytics and fold the clean rows into the state.
+        Events without an enqueued time (HTTP pushes, captured files) are stamped on arrival."""
+        if not columns or len(columns.get('boat', ())) == 0:
+            return 0
+        count = len(columns['boat'])
+        if columns.get('EventEnqueuedUtcTime') is None:
+            columns = dict(columns, EventEnqueuedUtcTime=np.full(count, utc_now().isoformat(), dtype=object))
+        with METRICS.stage('ingest') as stage:
+            clean, _ = validate(columns)
+            changed = self.state.update(clean)
+            self.race.update(clean['boat_id'].to_numpy(), clean['latitude'].to_numpy(),
+                             clean['longitude'].to_numpy(), clean['event_time'].to_numpy())
+            if self.window is not None:
+                self.window.append_frame(clean)
+            stage.rows = count
+        with self._cache_lock:
+            self.events += count
+            self.rejected += count - len(clean)
+        METRICS.set_gauge('fleet_state_boats', self.state.seen)
+        return changed
+
+    def cached(self, key, build, version=None):
+        """Encoded response for the current version of its source (the fleet state by default):
+        rebuilt at most once per update"""
+        version = self.state.version if version is None else version
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        body = build()
+        with self._cache_lock:
+            if len(self._cache) >= RESPONSE_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = (version, body)
+        return body
+
+    def respond(self, path, query):
+        """(status, body) for a GET request; bad query parameters raise ValueError (400)"""
+        state = self.state
+        if path in ('/', '/boats'):
+            offset = query_int(query, 'offset', 0)
+            limit = min(query_int(query, 'limit', MAX_PAGE_BOATS), MAX_PAGE_BOATS)
+            return 200, self.cached(('boats', offset, limit),
+                                    lambda: to_json(state.boats(offset=offset, limit=limit)))
+        match = re.fullmatch(r'/boats/(\d+)', path)
+        if match:
+            boat = state.boat(int(match.group(1)))
+            if boat is None:
+                return 404, json.dumps({'error': f"boat {match.group(1)} not seen"}).encode()
+            return 200, json.dumps(boat).encode()
+        if path == '/leaderboard':
+            top = query_int(query, 'top', 10)
+            return 200, self.cached(('leaderboard', top), lambda: to_json(state.leaderboard(top)))
+        if path == '/race':
+            # late and out-of-order events move the race without changing the fleet state version
+            top = query_int(query, 'top', 10)
+            return 200, self.cached(('race', top), lambda: to_json(self.race.leaderboard(top)),
+                                    version=self.race.updates)
+        if path == '/window' or path.startswith('/window/'):
+            if self.window is None:
+                return 404, json.dumps({'error': "no rolling window (start the service with --window)"}).encode()
+            key = ('window', path, tuple(sorted((name, tuple(values)) for name, values in query.items())))
+            return self.cached(key, lambda: telemetry_window.respond(self.window, path, query),
+                               version=self.window.appended)
+        if path == '/summary':
+            with self._cache_lock:
+                events, rejected = self.events, self.rejected
+            return 200, self.cached('summary', lambda: json.dumps(
+                dict(state.summary(), events=events, rejected=rejected)).encode(),
+                version=(state.version, events))
+        return 404, json.dumps({'error': f"unknown path {path}"}).encode()
+
+    def serve(self, port=FLEET_STATE_PORT, host='127.0.0.1'):
+        """Serve GET /boats, /boats/<id>, /leaderboard?top=N, /race?top=N, /summary, /window[/boats[/<id>]]
+        and POST /ingest
+        (JSON records, JSON columns or the packed wire format) from a background thread"""
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive: Grafana and load tests reuse connections
+            disable_nagle_algorithm = True  # headers and body go out at once, no 40 ms delayed-ACK stall
+
+            def reply(self, status, body, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                try:
+                    status, body = service.respond(url.path.rstrip('/') or '/', parse_qs(url.query))
+                except ValueError as e:
+                    status, body = 400, json.dumps({'error': str(e)}).encode()
+                self.reply(status, body)
+
+            def do_POST(self):
+                if urlparse(self.path).path != '/ingest':
+                    self.reply(404, b'{"error": "POST only to /ingest"}')
+                    return
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    if self.headers.get('Content-Type') == PACKED_CONTENT_TYPE:
+                        columns = decode_packed(body)
+                    else:
+                        columns = decode_json_body(body)
+                    changed = service.ingest(columns)
+                except (ValueError, KeyError) as e:
+                    self.reply(400, json.dumps({'error': str(e)}).encode())
+                    return
+                self.reply(200, json.dumps({'changed': changed, 'version': service.state.version}).encode())
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"🛰️  Fleet state endpoint: http://{host}:{self._server.server_port}/boats")
+        return self._server
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def decode_json_body(body):
+    """POST body as columns: a list of event records or a dict of equal-length columns"""
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data if 'boat' in data and isinstance(data['boat'], list) else [data]
+    if isinstance(data, list):
+        names = dict.fromkeys(name for record in data for name in record)
+        return {name: [record.get(name) for record in data] for name in names}
+    return {name: list(values) for name, values in data.items()}
+
+
+# --------------------------------------------------------------------------------------------
+# Event sources and snapshots
+# --------------------------------------------------------------------------------------------
+
+def ingest_files(service, patterns):
+    """Feed captured JSONL or Parquet telemetry files through the service"""
+    paths = sorted(path for pattern in patterns for path in glob.glob(pattern))
+    events = 0
+    for path in paths:
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            chunks = (batch.to_pydict() for batch in pq.ParquetFile(path).iter_batches(batch_size=100_000))
+        else:
+            chunks = read_jsonl(path)
+        for columns in chunks:
+            service.ingest(columns)
+            events += len(columns['boat'])
+    print(f"📂 Loaded {events} events from {len(paths)} file(s): {service.state.summary()['boats']} boats")
+    return events
+
+
+def consume_eventhub(service):
+    """Read the Event Hub from its latest events on, in a background thread"""
+    from azure.eventhub import EventHubConsumerClient
+    consumer = EventHubConsumerClient.from_connection_string(
+        conn_str=os.getenv('AZURE_EVENTHUB_CONNECTION_STRING'),
+        consumer_group=CONSUMER_GROUP,
+        eventhub_name=os.getenv('AZURE_EVENTHUB_NAME', 'project1')
+    )
+
+    def on_event_batch(partition_context, events):
+        if events:
+            service.ingest(decode_events(events))
+
+    thread = threading.Thread(target=consumer.receive_batch, daemon=True,
+                              kwargs={'on_event_batch': on_event_batch, 'starting_position': '@latest',
+                                      'max_batch_size': 1000})
+    thread.start()
+    print(f"📡 Consuming Event Hub {os.getenv('AZURE_EVENTHUB_NAME', 'project1')} ({CONSUMER_GROUP})")
+    return consumer
+
+
+def create_live_table(conn):
+    if is_sqlite(conn):
+        conn.executescript(SQLITE_LIVE_TABLE)
+    else:
+        cursor = conn.cursor()
+        cursor.execute(SQLSERVER_LIVE_TABLE)
+        conn.commit()
+
+
+def write_snapshot(conn, df):
+    """Upsert changed boats into boat_live_state (an older event never overwrites a newer one)"""
+    create_live_table(conn)
+    if is_sqlite(conn):
+        times = format_timestamps(df['event_time'].to_numpy('datetime64[us]'))
+    else:
+        times = [value.to_pydatetime() for value in df['event_time']]
+    rows = list(zip(df['boat_id'].astype(int).tolist(), *(df[name].tolist() for name in STATE_FIELDS), times))
+    cursor = conn.cursor()
+    if is_sqlite(conn):
+        cursor.executemany(SQLITE_UPSERT, rows)
+    else:
+        cursor.fast_executemany = True
+        cursor.executemany(SQLSERVER_UPSERT, rows)
+    conn.commit()
+    return len(rows)
+
+
+def snapshot(state):
+    """Write the boats changed since the last snapshot; they stay dirty if the write fails"""
+    from data_access import run_with_connection
+    df = state.take_dirty()
+    if df.empty:
+        return 0
+    try:
+        with METRICS.stage('snapshot') as stage:
+            stage.rows = run_with_connection('snapshot', lambda conn: write_snapshot(conn, df))
+    except Exception:
+        state.mark_dirty(df['boat_id'].to_numpy())
+        raise
+    return stage.rows
+
+
+def snapshot_loop(state, seconds):
+    while True:
+        time.sleep(seconds)
+        try:
+            written = snapshot(state)
+            if written:
+                print(f"💾 Snapshot: {written} boats written to boat_live_state")
+        except Exception as e:
+            print(f"❌ Snapshot failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory live fleet state served over HTTP")
+    parser.add_argument('--port', type=int, default=FLEET_STATE_PORT)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--input', nargs='*', default=[], help="captured JSONL/Parquet files or globs to load first")
+    parser.add_argument('--eventhub', action='store_true', help="consume AZURE_EVENTHUB_NAME")
+    parser.add_argument('--snapshot-seconds', type=int, default=SNAPSHOT_SECONDS,
+                        help="upsert changed boats into boat_live_state every N seconds")
+    parser.add_argument('--window', action='store_true', default=FLEET_STATE_WINDOW,
+                        help="keep the last TELEMETRY_WINDOW_MINUTES of events per boat for /window statistics")
+    parser.add_argument('--window-minutes', type=float, default=telemetry_window.WINDOW_MINUTES)
+    args = parser.parse_args()
+
+    METRICS.configure('fleet_state')
+    service = FleetStateService(window=telemetry_window.TelemetryWindow(args.window_minutes) if args.window else None)
+    if args.input:
+        ingest_files(service, args.input)
+    consumer = consume_eventhub(service) if args.eventhub else None
+    if args.snapshot_seconds:
+        threading.Thread(target=snapshot_loop, args=(service.state, args.snapshot_seconds), daemon=True).start()
+    server = service.serve(args.port, args.host)
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping fleet state service...")
+    finally:
+        server.shutdown()
+        if consumer is not None:
+            consumer.close()
+        if args.snapshot_seconds:
+            snapshot(service.state)
+
+
+if __name__ == "__main__":
+    main()
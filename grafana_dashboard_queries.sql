@@ -109,3 +109,77 @@ SELECT
 FROM position_changes 
 WHERE prev_lat IS NOT NULL;
 
+
+-- =============================================================================
+-- ROLLUP PANELS (run telemetry_rollups.py update --every 60 first)
+-- Same panels read from pre-aggregated tables: a bounded number of rows per boat
+-- on every refresh, however large boat_telemetry grows
+-- =============================================================================
+
+-- Panel 3 (rollup): SPEED OVER TIME - 1-minute average speed per boat, last 2 hours
+SELECT 
+    bucket_start as time,
+    sum_speed / records as value,
+    CONCAT('Boat ', boat_id) as metric
+FROM boat_speed_rollup_1m
+WHERE bucket_start >= DATEADD(hour, -2, GETUTCDATE())
+ORDER BY bucket_start;
+
+-- Panel 3 (rollup, long ranges): 15-minute average and peak speed per boat, last 7 days
+SELECT 
+    bucket_start as time,
+    sum_speed / records as value,
+    max_speed as peak,
+    CONCAT('Boat ', boat_id) as metric
+FROM boat_speed_rollup_15m
+WHERE bucket_start >= DATEADD(day, -7, GETUTCDATE())
+ORDER BY bucket_start;
+
+-- Panel 4 (rollup): BOAT TRACKS - LTTB-downsampled last 6 hours (TRACK_POINTS points per boat)
+SELECT 
+    boat_id,
+    latitude,
+    longitude,
+    event_time,
+    CONCAT('Boat ', boat_id) as boat_name
+FROM boat_tracks_downsampled
+ORDER BY boat_id, point;
+
+-- Panel 6 (rollup): AVERAGE SPEED BY BOAT - last hour from 1-minute buckets
+SELECT 
+    CONCAT('Boat ', boat_id) as boat_name,
+    SUM(sum_speed) / SUM(records) as avg_speed
+FROM boat_speed_rollup_1m
+WHERE bucket_start >= DATEADD(hour, -1, GETUTCDATE())
+GROUP BY boat_id
+ORDER BY avg_speed DESC;
+
+
+-- =============================================================================
+-- LIVE STATE PANELS (run fleet_state_service.py)
+-- Panels 1 and 2 read the newest state per boat from memory instead of searching
+-- boat_telemetry on every refresh
+-- =============================================================================
+
+-- Panel 1 (live): REAL-TIME BOAT POSITIONS - Infinity datasource, type JSON, source URL
+--   http://127.0.0.1:8090/boats
+--   columns: boat_id, latitude, longitude, speed, heading, event_time (timestamp)
+
+-- Panel 2 (live): CURRENT BOAT RANKINGS - Infinity datasource, type JSON, source URL
+--   http://127.0.0.1:8090/leaderboard?top=20
+
+-- Panel 2 (live, race order): RACE LEADERBOARD - Infinity datasource, type JSON, source URL
+--   http://127.0.0.1:8090/race?top=20
+--   columns: race_rank, boat_id, leg, distance_to_finish_km, distance_km, finish_time
+
+-- Panel 1 (SQL fallback, run with --snapshot-seconds): positions snapshotted by the service
+SELECT 
+    boat_id,
+    latitude,
+    longitude,
+    speed,
+    heading,
+    event_time,
+    CONCAT('Boat ', boat_id) as boat_name
+FROM boat_live_state
+ORDER BY boat_id;
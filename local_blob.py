@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Local filesystem stand-in for Azure Blob Storage (Azurite-style, no emulator needed)
+Implements the subset of BlobServiceClient used by the batch scripts: upload, download,
+properties/ETag, listing by prefix and staged block uploads. Blobs live under
+LOCAL_BLOB_ROOT/<container>/<blob path>.
+Usage: LOCAL_BLOB_ROOT=./blob-data python3 simple_parquet_batch.py
+"""
+
+import os
+import enum
+import hashlib
+from datetime import datetime, timezone
+
+
+class BlobNotFound(Exception):
+    """Raised when a blob does not exist (like azure.core.exceptions.ResourceNotFoundError)"""
+
+
+class BlobNotModified(Exception):
+    """Raised by a conditional download when the ETag still matches (like ResourceNotModifiedError)"""
+    status_code = 304
+
+
+class MatchConditions(enum.Enum):
+    """Same member names as azure.core.MatchConditions, for runs without the Azure SDK"""
+    Unconditionally = 1
+    IfNotModified = 2
+    IfModified = 3
+    IfPresent = 4
+    IfMissing = 5
+
+
+class LocalBlobProperties():
+    def __init__(self, name, path):
+        stat = os.stat(path)
+        self.name = name
+        self.size = stat.st_size
+        self.last_modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+        self.etag = '"0x' + hashlib.md5(f"{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()[:16].upper() + '"'
+
+
+class LocalBlobDownloader():
+    def __init__(self, path, properties):
+        self.path = path
+        self.properties = properties
+        self.size = properties.size
+
+    def readall(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def readinto(self, stream):
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(4 * 1024 * 1024)
+                if not chunk:
+                    break
+                stream.write(chunk)
+        return self.size
+
+    def chunks(self):
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(4 * 1024 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+
+
+class LocalBlobClient():
+    def __init__(self, root, container, blob):
+        self.container_name = container
+        self.blob_name = blob
+        self.path = os.path.join(root, container, *blob.split('/'))
+        self._blocks_dir = self.path + '.blocks'
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def get_blob_properties(self):
+        if not self.exists():
+            raise BlobNotFound(f"The specified blob does not exist: {self.container_name}/{self.blob_name}")
+        return LocalBlobProperties(self.blob_name, self.path)
+
+    def upload_blob(self, data, overwrite=False, **kwargs):
+        if self.exists() and not overwrite:
+            raise FileExistsError(f"The specified blob already exists: {self.container_name}/{self.blob_name}")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.uploading'
+        with open(temp_path, 'wb') as f:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                f.write(data)
+            elif hasattr(data, 'read'):
+                while True:
+                    chunk = data.read(4 * 1024 * 1024)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+            else:
+                for chunk in data:
+                    f.write(chunk)
+        os.replace(temp_path, self.path)
+        return {'etag': self.get_blob_properties().etag}
+
+    def download_blob(self, etag=None, match_condition=None, **kwargs):
+        properties = self.get_blob_properties()
+        if etag is not None and getattr(match_condition, 'name', None) == 'IfModified' and etag == properties.etag:
+            raise BlobNotModified(f"The condition specified using HTTP conditional header(s) is not met: {self.blob_name}")
+        return LocalBlobDownloader(self.path, properties)
+
+    def delete_blob(self, **kwargs):
+        if not self.exists():
+            raise BlobNotFound(f"The specified blob does not exist: {self.container_name}/{self.blob_name}")
+        os.remove(self.path)
+
+    def stage_block(self, block_id, data, **kwargs):
+        os.makedirs(self._blocks_dir, exist_ok=True)
+        with open(os.path.join(self._blocks_dir, _block_file(block_id)), 'wb') as f:
+            f.write(data)
+
+    def commit_block_list(self, block_list, **kwargs):
+        """Concatenate staged blocks in the given order into the blob"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.uploading'
+        with open(temp_path, 'wb') as out:
+            for block in block_list:
+                block_id = getattr(block, 'id', block)
+                with open(os.path.join(self._blocks_dir, _block_file(block_id)), 'rb') as f:
+                    while True:
+                        chunk = f.read(4 * 1024 * 1024)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+        os.replace(temp_path, self.path)
+        for name in os.listdir(self._blocks_dir):
+            os.remove(os.path.join(self._blocks_dir, name))
+        os.rmdir(self._blocks_dir)
+        return {'etag': self.get_blob_properties().etag}
+
+
+def _block_file(block_id):
+    if isinstance(block_id, bytes):
+        block_id = block_id.decode()
+    return hashlib.sha1(block_id.encode()).hexdigest()
+
+
+class LocalContainerClient():
+    def __init__(self, root, container):
+        self.root = root
+        self.container_name = container
+        self.path = os.path.join(root, container)
+
+    def get_blob_client(self, blob):
+        return LocalBlobClient(self.root, self.container_name, blob)
+
+    def list_blobs(self, name_starts_with=None, **kwargs):
+        """Yield blob properties under the container, optionally filtered by name prefix"""
+        if not os.path.isdir(self.path):
+            return
+        for directory, subdirectories, files in os.walk(self.path):
+            subdirectories[:] = sorted(d for d in subdirectories if not d.endswith('.blocks'))
+            for filename in sorted(files):
+                if filename.endswith('.uploading'):
+                    continue
+                full_path = os.path.join(directory, filename)
+                name = os.path.relpath(full_path, self.path).replace(os.sep, '/')
+                if name_starts_with and not name.startswith(name_starts_with):
+                    continue
+                yield LocalBlobProperties(name, full_path)
+
+
+class LocalBlobServiceClient():
+    """Drop-in for BlobServiceClient backed by a local directory"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def get_blob_client(self, container, blob):
+        return LocalBlobClient(self.root, container, blob)
+
+    def get_container_client(self, container):
+        return LocalContainerClient(self.root, container)
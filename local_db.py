@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Local SQLite stand-in for the Azure SQL Database
+Same table and column names as the speed layer (boat_telemetry) so the scripts can run offline,
+plus boat_telemetry_windows for the tumbling-window aggregates of stream_validator.py
+and boat_historical_rankings for parquet_to_sql.py.
+Usage: python3 local_db.py boats.db
+"""
+
+import sys
+import sqlite3
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS boat_telemetry (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    boat_id INTEGER,
+    latitude REAL,
+    longitude REAL,
+    heading REAL,
+    speed REAL,
+    event_time TEXT,
+    enqueued_time TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_boat_telemetry_event_time ON boat_telemetry (event_time);
+CREATE INDEX IF NOT EXISTS ix_boat_telemetry_created_at ON boat_telemetry (created_at);
+
+CREATE TABLE IF NOT EXISTS boat_telemetry_windows (
+    window_start TEXT NOT NULL,
+    window_end TEXT NOT NULL,
+    boat_id INTEGER NOT NULL,
+    records INTEGER,
+    avg_speed REAL,
+    max_speed REAL,
+    avg_lat REAL,
+    avg_lng REAL,
+    PRIMARY KEY (window_start, boat_id)
+);
+
+CREATE TABLE IF NOT EXISTS boat_historical_rankings (
+    date TEXT NOT NULL,
+    boat_id INTEGER NOT NULL,
+    avg_speed REAL,
+    max_speed REAL,
+    records INTEGER,
+    rank INTEGER,
+    avg_lat REAL,
+    avg_lng REAL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (date, boat_id)
+);
+"""
+
+TELEMETRY_COLUMNS = ("boat_id", "latitude", "longitude", "heading", "speed", "event_time", "enqueued_time", "created_at")
+
+
+def connect(path):
+    """Open (and initialize) a local SQLite database. The connection may be handed between threads
+    (data_access pools it), but is only ever used by one thread at a time."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SQLITE_SCHEMA)
+    return conn
+
+
+def is_sqlite(conn):
+    return isinstance(conn, sqlite3.Connection)
+
+
+def format_timestamps(values):
+    """Timestamps as 'YYYY-MM-DD HH:MM:SS.ffffff' text, the format SQLite's CURRENT_TIMESTAMP sorts with"""
+    if hasattr(values, 'dtype'):
+        import numpy as np
+        # a chunk of telemetry only has a handful of distinct timestamps: format each one once
+        unique, inverse = np.unique(values.astype('datetime64[us]'), return_inverse=True)
+        formatted = np.char.replace(np.datetime_as_string(unique, unit='us'), 'T', ' ')
+        return formatted[inverse].tolist()
+    return [value.strftime('%Y-%m-%d %H:%M:%S.%f') for value in values]
+
+
+def insert_telemetry(conn, columns):
+    """Insert a chunk of telemetry columns (boat_telemetry column names) in one transaction"""
+    names = [name for name in TELEMETRY_COLUMNS if name in columns]
+    values = []
+    for name in names:
+        column = columns[name]
+        if name in ('event_time', 'enqueued_time', 'created_at'):
+            values.append(format_timestamps(column))
+        else:
+            values.append(column.tolist() if hasattr(column, 'tolist') else list(column))
+
+    with conn:
+        conn.executemany(
+            f"INSERT INTO boat_telemetry ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})",
+            zip(*values)
+        )
+
+
+def upsert_windows(conn, windows):
+    """Merge per-boat window aggregates; a late window combines with the row already stored"""
+    rows = zip(
+        format_timestamps(windows['window_start'].to_numpy('datetime64[us]')),
+        format_timestamps(windows['window_end'].to_numpy('datetime64[us]')),
+        windows['boat_id'].tolist(),
+        windows['records'].tolist(),
+        windows['avg_speed'].tolist(),
+        windows['max_speed'].tolist(),
+        windows['avg_lat'].tolist(),
+        windows['avg_lng'].tolist(),
+    )
+    with conn:
+        conn.executemany("""
+            INSERT INTO boat_telemetry_windows
+            (window_start, window_end, boat_id, records, avg_speed, max_speed, avg_lat, avg_lng)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (window_start, boat_id) DO UPDATE SET
+                avg_speed = (avg_speed * records + excluded.avg_speed * excluded.records) / (records + excluded.records),
+                avg_lat = (avg_lat * records + excluded.avg_lat * excluded.records) / (records + excluded.records),
+                avg_lng = (avg_lng * records + excluded.avg_lng * excluded.records) / (records + excluded.records),
+                max_speed = MAX(max_speed, excluded.max_speed),
+                records = records + excluded.records
+        """, rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 local_db.py <database.db>")
+    else:
+        connect(sys.argv[1]).close()
+        print(f"✅ Initialized local database: {sys.argv[1]}")
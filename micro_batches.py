@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Checkpointed micro-batches for the batch layer
+Instead of re-extracting the whole day on every run, a run reads only the day's boat_telemetry rows
+above a checkpointed high-water mark (created_at, or an identity column), appends them as small
+Parquet parts, folds them into the day's running per-boat totals (RankingAccumulator) and
+republishes daily-rankings/boat_rankings_YYYYMMDD.parquet, so a refresh costs in proportion to the
+new rows. Per day, under parquet-data/micro-batches/YYYYMMDD/:
+  part-NNNNN.parquet   the new rows of one chunk (boat_id, speed, latitude, longitude, event_time)
+  state-NNNNN.parquet  running totals and race progress after NNNNN parts
+  _checkpoint.json     watermark, committed parts, current state and parts already published
+The checkpoint is written after the part and the state, so a crashed run is simply repeated: it
+extracts from the same watermark and overwrites what was left uncommitted.
+Usage: python3 simple_parquet_batch.py --incremental --every 300
+       python3 simple_parquet_batch.py --incremental --date 2025-09-01 --rebuild
+"""
+
+import os
+import json
+import time
+from io import BytesIO
+from datetime import date
+
+import pandas as pd
+
+from pipeline_metrics import METRICS
+from data_access import db_connection, get_azure_client, with_retry
+from blob_stream import write_parquet_blob
+from partial_aggregates import iter_watermark_chunks, watermark_param
+from simple_parquet_batch import EXTRACT_CHUNK_ROWS, RankingAccumulator, day_range, save_to_azure_blob
+
+MICRO_BATCH_CONTAINER = 'parquet-data'
+MICRO_BATCH_PREFIX = 'micro-batches/'
+
+# Column used to find rows that are not in a part yet: created_at (default) or an identity column such as id
+WATERMARK_COLUMN = os.getenv('MICRO_BATCH_WATERMARK_COLUMN', 'created_at')
+
+PART_COLUMNS = ['boat_id', 'speed', 'latitude', 'longitude', 'event_time']
+
+
+def day_folder(target_date):
+    return f"{MICRO_BATCH_PREFIX}{target_date.strftime('%Y%m%d')}/"
+
+
+def blob_client(name):
+    return get_azure_client().get_blob_client(container=MICRO_BATCH_CONTAINER, blob=name)
+
+
+def read_checkpoint(target_date):
+    """The day's checkpoint, or an empty one before its first run"""
+    blob = blob_client(day_folder(target_date) + '_checkpoint.json')
+    if not with_retry(blob.exists, 'download'):
+        return {'date': target_date.isoformat(), 'watermark_column': WATERMARK_COLUMN, 'watermark': None,
+                'parts': 0, 'rows': 0, 'state': None, 'published_parts': 0}
+    checkpoint = json.loads(with_retry(lambda: blob.download_blob().readall(), 'download'))
+    if checkpoint['watermark_column'] != WATERMARK_COLUMN:
+        raise ValueError(f"{target_date} was checkpointed on {checkpoint['watermark_column']}, "
+                         f"not {WATERMARK_COLUMN} (set MICRO_BATCH_WATERMARK_COLUMN back)")
+    return checkpoint
+
+
+def write_checkpoint(target_date, checkpoint):
+    """Commit point of a run: a single blob upload, so readers see the old or the new checkpoint"""
+    body = json.dumps(checkpoint, indent=2).encode()
+    blob = blob_client(day_folder(target_date) + '_checkpoint.json')
+    with_retry(lambda: blob.upload_blob(body, overwrite=True), 'upload')
+
+
+def read_parquet(name):
+    with METRICS.stage('download') as stage:
+        data = with_retry(lambda: blob_client(name).download_blob().readall(), 'download')
+        stage.bytes = len(data)
+    with METRICS.stage('decode') as stage:
+        df = pd.read_parquet(BytesIO(data))
+        stage.rows = len(df)
+    return df
+
+
+def write_parquet(df, name):
+    with METRICS.stage('save') as stage:
+        stage.rows, stage.bytes = write_parquet_blob(df, blob_client(name))
+
+
+def as_part(df):
+    """Extracted rows in the part layout (event_time as a timestamp on either backend)"""
+    part = df[PART_COLUMNS].copy()
+    part['boat_id'] = part['boat_id'].astype('int64')
+    part['event_time'] = pd.to_datetime(part['event_time'], format='ISO8601')
+    return part
+
+
+def save_state(target_date, checkpoint, accumulator):
+    """Write the accumulator as the state after checkpoint['parts'] parts; returns its name"""
+    name = f"state-{checkpoint['parts']:05d}.parquet"
+    write_parquet(accumulator.state(), day_folder(target_date) + name)
+    return name
+
+
+def commit(target_date, checkpoint, **changes):
+    """Write the updated checkpoint, then drop the state file it no longer points to"""
+    previous_state = checkpoint['state']
+    checkpoint.update(changes)
+    write_checkpoint(target_date, checkpoint)
+    if previous_state and previous_state != checkpoint['state']:
+        try:
+            blob_client(day_folder(target_date) + previous_state).delete_blob()
+        except Exception as e:
+            print(f"⚠️  Could not delete {previous_state}: {e}")
+
+
+def publish(target_date, checkpoint, accumulator):
+    """Republish the day's rankings from the running totals and record it in the checkpoint"""
+    rankings = accumulator.rankings()
+    if save_to_azure_blob(rankings, target_date) is not None:
+        commit(target_date, checkpoint, published_parts=checkpoint['parts'])
+    return rankings
+
+
+def run_incremental(target_date=None, chunk_rows=EXTRACT_CHUNK_ROWS):
+    """Extract the day's rows above the checkpoint into new parts (one per chunk), fold them into
+    the running totals and republish the day's rankings. Returns the rankings (None before the
+    day has any rows)."""
+    target_date = target_date or date.today()
+    folder = day_folder(target_date)
+    checkpoint = read_checkpoint(target_date)
+    if checkpoint['state']:
+        accumulator = RankingAccumulator.from_state(read_parquet(folder + checkpoint['state']))
+    else:
+        accumulator = RankingAccumulator()
+    print(f"🧱 Micro-batch for {target_date}: {checkpoint['parts']} parts, {checkpoint['rows']} rows, "
+          f"{WATERMARK_COLUMN} > {checkpoint['watermark']}")
+
+    new_rows = 0
+    with db_connection() as reader:
+        chunks = iter_watermark_chunks(reader, PART_COLUMNS, WATERMARK_COLUMN,
+                                       watermark_param(reader, checkpoint['watermark']), chunk_rows,
+                                       where='speed IS NOT NULL AND event_time >= ? AND event_time < ?',
+                                       params=day_range(target_date))
+        for df in chunks:
+            with METRICS.stage('extract') as stage:
+                part = as_part(df)
+                stage.rows = len(part)
+            # part and state names follow the part count, so a repeated run overwrites them
+            write_parquet(part, f"{folder}part-{checkpoint['parts']:05d}.parquet")
+            with METRICS.stage('compute') as stage:
+                accumulator.add(part)
+                stage.rows = len(part)
+            checkpoint['parts'] += 1
+            state = save_state(target_date, checkpoint, accumulator)
+            commit(target_date, checkpoint, watermark=str(df['watermark'].iloc[-1]),
+                   rows=checkpoint['rows'] + len(part), state=state)
+            new_rows += len(part)
+            print(f"📦 Part {checkpoint['parts'] - 1}: {len(part)} rows (up to {checkpoint['watermark']})")
+
+    METRICS.set_gauge('micro_batch_rows', new_rows)
+    if checkpoint['parts'] == 0:
+        print("❌ No data to process")
+        return None
+    if checkpoint['published_parts'] == checkpoint['parts']:
+        print("✅ No new rows since the last run: the rankings are up to date")
+        return accumulator.rankings()
+    print(f"✅ {new_rows} new rows, {checkpoint['rows']} today in {checkpoint['parts']} parts")
+    return publish(target_date, checkpoint, accumulator)
+
+
+def rebuild(target_date=None):
+    """Recompute the running totals from the committed parts (after losing a state file or changing
+    the ranking code) and republish the day's rankings"""
+    target_date = target_date or date.today()
+    folder = day_folder(target_date)
+    checkpoint = read_checkpoint(target_date)
+    print(f"🔁 Rebuilding {target_date} from {checkpoint['parts']} parts")
+    if checkpoint['parts'] == 0:
+        print("❌ No data to process")
+        return None
+    accumulator = RankingAccumulator()
+    for number in range(checkpoint['parts']):
+        part = read_parquet(f"{folder}part-{number:05d}.parquet")
+        with METRICS.stage('compute') as stage:
+            accumulator.add(part)
+            stage.rows = len(part)
+    commit(target_date, checkpoint, state=save_state(target_date, checkpoint, accumulator), published_parts=0)
+    return publish(target_date, checkpoint, accumulator)
+
+
+def run_every(seconds, show=None):
+    """Run the micro-batch for today every `seconds` until Ctrl+C. After midnight the previous day
+    gets one last run, for rows that were still arriving. A failed run is repeated next time."""
+    day = date.today()
+    try:
+        while True:
+            today = date.today()
+            for target_date in ([day] if day != today else []) + [today]:
+                try:
+                    rankings = run_incremental(target_date)
+                    if show is not None and rankings is not None:
+                        show(rankings)
+                except Exception as e:
+                    print(f"❌ Micro-batch for {target_date} failed: {e}")
+            day = today
+            time.sleep(seconds)
+    except KeyboardInterrupt:
+        print("\n👋 Micro-batches stopped")
@@ -2,101 +2,255 @@
 """
 Monitor incoming boat telemetry data
 Check if data is flowing from Stream Analytics to SQL Database
+Polls only the rows added since the last check (a created_at/identity high-water mark) and keeps
+running totals, per-boat freshness, ingest rate and event lag in memory. The polled rows also feed
+a rolling window (telemetry_window.py) for live speed percentiles, gaps and records/sec, optionally
+served as JSON with --port.
 Usage: source database.env && python3 monitor_data.py
+       python3 monitor_data.py --window-minutes 5 --port 8091
+       SQLITE_DATABASE=boats.db python3 monitor_data.py   (local SQLite stand-in)
 """
 
-import pyodbc
 import time
 import os
+import argparse
 from datetime import datetime
+from pipeline_metrics import METRICS
+from data_access import backoff_delay, get_pool, is_transient, missing_db_config, with_retry
+from local_db import is_sqlite
 
-def get_db_connection():
-    """Get database connection using environment variables"""
-    server = os.getenv('SQL_SERVER')
-    database = os.getenv('SQL_DATABASE') 
-    username = os.getenv('SQL_USERNAME')
-    password = os.getenv('SQL_PASSWORD')
-    
-    if not all([server, database, username, password]):
+# Column used as high-water mark: created_at (default) or an identity column such as id.
+# With created_at, rows committed late with an already-seen timestamp are not picked up;
+# an identity column avoids that.
+WATERMARK_COLUMN = os.getenv('MONITOR_WATERMARK_COLUMN', 'created_at')
+
+# Seconds between checks
+POLL_SECONDS = int(os.getenv('MONITOR_POLL_SECONDS', '10'))
+
+# Port of the rolling-window JSON endpoint (0 = no endpoint)
+WINDOW_PORT = int(os.getenv('MONITOR_WINDOW_PORT', '0'))
+
+# Rows fetched per round trip while catching up
+FETCH_SIZE = 10000
+
+# A boat is stale when its newest event is this many seconds behind the newest event overall
+STALE_SECONDS = 60
+
+
+def as_datetime(value):
+    """SQL Server returns datetimes, SQLite returns 'YYYY-MM-DD HH:MM:SS[.ffffff]' text"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def count_rows_and_watermark(cursor, watermark_column=WATERMARK_COLUMN):
+    """Total row count and high-water mark, read once at start-up. SQLite reads both in one
+    statement. On SQL Server the count comes from the partition metadata instead of a table scan,
+    taken after the watermark so rows inserted in between are never skipped by the first poll
+    (at worst they are counted twice)."""
+    if is_sqlite(cursor.connection):
+        cursor.execute(f"SELECT COUNT(*), MAX({watermark_column}) FROM boat_telemetry")
+        total, watermark = cursor.fetchone()
+        return total or 0, watermark
+    cursor.execute(f"SELECT MAX({watermark_column}) FROM boat_telemetry")
+    watermark = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT SUM(p.rows) FROM sys.partitions p
+        WHERE p.object_id = OBJECT_ID('boat_telemetry') AND p.index_id IN (0, 1)
+    """)
+    return cursor.fetchone()[0] or 0, watermark
+
+
+class TelemetryMonitor():
+    """Running view of boat_telemetry built from incremental polls"""
+
+    def __init__(self, cursor, watermark_column=WATERMARK_COLUMN, window=None):
+        self.cursor = cursor
+        self.window = window  # optional telemetry_window.TelemetryWindow fed with every new row
+        self.watermark_column = watermark_column
+        self.total, self.watermark = count_rows_and_watermark(cursor, watermark_column)
+        self.boats = {}  # boat_id -> (event_time, latitude, longitude, speed)
+        self.latest = []
+        self.new_rows = 0
+        self.ingest_rate = 0.0
+        self.lag_avg = None
+        self.lag_max = None
+        self.last_poll = time.monotonic()
+
+    def poll(self):
+        """Fetch rows above the high-water mark and fold them into the running state"""
+        column = self.watermark_column
+        select = f"""
+            SELECT boat_id, latitude, longitude, speed, event_time, enqueued_time, created_at, {column}
+            FROM boat_telemetry
+        """
+        if self.watermark is None:
+            self.cursor.execute(select + f" ORDER BY {column}")
+        else:
+            self.cursor.execute(select + f" WHERE {column} > ? ORDER BY {column}", (self.watermark,))
+
+        new_rows = 0
+        lag_sum = 0.0
+        lag_count = 0
+        lag_max = None
+        latest = []
+        while True:
+            rows = self.cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            event_times = []
+            for boat_id, latitude, longitude, speed, event_time, enqueued_time, created_at, mark in rows:
+                event_time = as_datetime(event_time)
+                enqueued_time = as_datetime(enqueued_time)
+                event_times.append(event_time)
+                self.boats[boat_id] = (event_time, latitude, longitude, speed)
+                if event_time is not None and enqueued_time is not None:
+                    lag = (event_time - enqueued_time).total_seconds()
+                    lag_sum += lag
+                    lag_count += 1
+                    lag_max = lag if lag_max is None else max(lag_max, lag)
+            if self.window is not None:
+                self.window.append([row[0] for row in rows], event_times, [row[3] for row in rows],
+                                   [row[1] for row in rows], [row[2] for row in rows])
+            new_rows += len(rows)
+            latest = (latest + [tuple(row) for row in rows[-5:]])[-5:]
+            self.watermark = rows[-1][-1]
+
+        now = time.monotonic()
+        self.ingest_rate = new_rows / max(now - self.last_poll, 1e-9)
+        self.last_poll = now
+        self.new_rows = new_rows
+        self.total += new_rows
+        self.lag_avg = lag_sum / lag_count if lag_count else None
+        self.lag_max = lag_max
+        if latest:
+            self.latest = list(reversed(latest))
+        return new_rows
+
+    def stale_boats(self):
+        """Boats whose newest event is more than STALE_SECONDS behind the newest event of the fleet"""
+        times = [state[0] for state in self.boats.values() if state[0] is not None]
+        if not times:
+            return []
+        newest = max(times)
+        return sorted(boat_id for boat_id, state in self.boats.items()
+                      if state[0] is not None and (newest - state[0]).total_seconds() > STALE_SECONDS)
+
+
+def show_window(window):
+    """Rolling-window statistics of the fleet and its fastest boats"""
+    stats = window.fleet_stats()
+    METRICS.set_gauge('window_records_per_sec', stats['records_per_sec'] or 0)
+    if not stats['records']:
+        return
+    print(f"📈 Last {stats['window_minutes']:g} min: {stats['records']} records ({stats['records_per_sec'] or 0:.1f}/sec) "
+          f"from {stats['boats']} boats, longest gap {stats['max_gap_seconds']:.0f}s")
+    print(f"   Speed avg {stats['avg_speed']:.1f}, p50 {stats['p50_speed']:.1f}, p90 {stats['p90_speed']:.1f}, "
+          f"max {stats['max_speed']:.1f} km/h")
+    fastest = window.boat_stats().nlargest(3, 'avg_speed')
+    print("🏁 Fastest over the window: " + ", ".join(
+        f"Boat {row.boat_id} {row.avg_speed:.1f} km/h (p90 {row.p90_speed:.1f})" for row in fastest.itertuples()))
+
+
+def monitor_data(poll_seconds=POLL_SECONDS, window_minutes=None, port=WINDOW_PORT):
+    METRICS.configure('monitor')
+    if missing_db_config():
         print("❌ Missing database configuration!")
         print("💡 Load your environment variables:")
         print("   source database.env")
         print("   python3 monitor_data.py")
-        return None
-    
-    connection_string = (
-        f'DRIVER={{ODBC Driver 17 for SQL Server}};'
-        f'SERVER={server};'
-        f'DATABASE={database};'
-        f'UID={username};'
-        f'PWD={password};'
-        f'Encrypt=yes;'
-        f'TrustServerCertificate=yes;'
-        f'Connection Timeout=30;'
-    )
-    
-    return pyodbc.connect(connection_string)
-
-def monitor_data():
+        return
+
+    pool = get_pool()
+    conn = None
+    server = None
     try:
-        conn = get_db_connection()
-        if not conn:
-            return
-        cursor = conn.cursor()
-        
+        conn = with_retry(pool.acquire, 'connect')
+
         print("🔍 Monitoring boat telemetry data...")
         print("Press Ctrl+C to stop")
         print("=" * 60)
-        
-        last_count = 0
-        
+
+        from telemetry_window import TelemetryWindow, serve
+        window = TelemetryWindow() if window_minutes is None else TelemetryWindow(window_minutes)
+        server = serve(window, port) if port else None
+        monitor = TelemetryMonitor(conn.cursor(), window=window)
+
+        failures = 0
         while True:
-            # Get current record count
-            cursor.execute("SELECT COUNT(*) FROM boat_telemetry")
-            current_count = cursor.fetchone()[0]
-            
-            # Get latest records
-            cursor.execute("""
-                SELECT TOP 5 
-                    boat_id, 
-                    ROUND(latitude, 4) as lat, 
-                    ROUND(longitude, 4) as lng, 
-                    ROUND(speed, 1) as speed,
-                    created_at
-                FROM boat_telemetry 
-                ORDER BY created_at DESC
-            """)
-            
-            latest_records = cursor.fetchall()
-            
+            try:
+                with METRICS.stage('poll') as stage:
+                    stage.rows = monitor.poll()
+                failures = 0
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                # reconnect and carry on from the same high-water mark
+                failures += 1
+                delay = backoff_delay(failures)
+                METRICS.retry('poll')
+                print(f"⚠️  Poll failed: {e}")
+                print(f"🔄 Reconnecting in {delay:.1f} seconds...")
+                pool.release(conn, discard=True)
+                conn = None
+                time.sleep(delay)
+                conn = with_retry(pool.acquire, 'connect')
+                monitor.cursor = conn.cursor()
+                continue
+            METRICS.set_gauge('telemetry_rows', monitor.total)
+            METRICS.set_gauge('ingest_rows_per_second', monitor.ingest_rate)
+
             # Clear screen and show status
-            print(f"\n📊 Total Records: {current_count} (+{current_count - last_count} new)")
+            print(f"\n📊 Total Records: {monitor.total} (+{monitor.new_rows} new, {monitor.ingest_rate:.1f} rows/sec)")
             print(f"🕒 Last Check: {datetime.now().strftime('%H:%M:%S')}")
-            
-            if latest_records:
+            if monitor.lag_avg is not None:
+                print(f"⏱️  Event lag (event_time - enqueued_time): avg {monitor.lag_avg:.2f}s, max {monitor.lag_max:.2f}s")
+            if monitor.boats:
+                stale = monitor.stale_boats()
+                print(f"⛵ Boats seen: {len(monitor.boats)}, stale (>{STALE_SECONDS}s behind): {len(stale)}"
+                      + (f" {stale[:10]}" if stale else ""))
+            show_window(window)
+
+            if monitor.latest:
                 print("\n🚤 Latest Boat Data:")
                 print("Boat ID | Latitude  | Longitude | Speed | Time")
                 print("-" * 50)
-                for record in latest_records:
-                    print(f"   {record[0]:2d}   | {record[1]:8.4f} | {record[2]:9.4f} | {record[3]:4.1f} | {record[4].strftime('%H:%M:%S')}")
+                for record in monitor.latest:
+                    print(f"   {record[0]:2d}   | {record[1]:8.4f} | {record[2]:9.4f} | {record[3]:4.1f} | {as_datetime(record[6]).strftime('%H:%M:%S')}")
+            elif monitor.total:
+                print("\n⏳ No new rows since the monitor started")
             else:
                 print("\n⏳ No data received yet. Waiting for Stream Analytics...")
                 print("Make sure:")
                 print("1. Your race_simulator.py is running")
                 print("2. Stream Analytics job is started")
                 print("3. SQL Database output is configured")
-            
-            last_count = current_count
-            time.sleep(10)  # Check every 10 seconds
-            
+
+            time.sleep(poll_seconds)  # Check every 10 seconds
+
     except KeyboardInterrupt:
         print("\n👋 Monitoring stopped")
     except Exception as e:
         print(f"❌ Error: {e}")
     finally:
-        if 'conn' in locals():
-            conn.close()
+        if conn is not None:
+            pool.release(conn)
+        if server is not None:
+            server.shutdown()
 
-if __name__ == "__main__":
-    monitor_data()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor boat telemetry arriving in the SQL Database")
+    parser.add_argument('--poll-seconds', type=float, default=POLL_SECONDS,
+                        help=f"seconds between checks (default: MONITOR_POLL_SECONDS or {POLL_SECONDS})")
+    parser.add_argument('--window-minutes', type=float,
+                        help="length of the rolling statistics window (default: TELEMETRY_WINDOW_MINUTES or 10)")
+    parser.add_argument('--port', type=int, default=WINDOW_PORT,
+                        help="serve the rolling statistics as JSON on this port (/window, /window/boats)")
+    args = parser.parse_args(argv)
+    monitor_data(args.poll_seconds, args.window_minutes, args.port)
+
+
+if __name__ == "__main__":
+    main()
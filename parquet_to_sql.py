@@ -3,112 +3,168 @@
 Load Parquet files from Azure and insert into SQL for Grafana visualization
 Creates historical analytics tables for advanced dashboards
 Usage: source database.env && source azure_storage.env && python3 parquet_to_sql.py
+       python3 parquet_to_sql.py --backfill                          (every date under daily-rankings/)
+       python3 parquet_to_sql.py --from 2025-01-01 --to 2025-12-31   (a date range)
 """
 
-import pandas as pd
-import pyodbc
 import os
-from datetime import date, timedelta
-from simple_parquet_batch import get_db_connection, get_azure_client, load_from_azure_blob
+import re
+import argparse
+from io import BytesIO
+from datetime import date, datetime, timedelta
+from itertools import chain, repeat
+from concurrent.futures import ThreadPoolExecutor
+from data_access import get_azure_client, run_with_connection, with_retry
+from local_db import is_sqlite
+from blob_cache import get_blob_cache
+from pipeline_metrics import METRICS
+
+RANKINGS_CONTAINER = 'parquet-data'
+RANKINGS_PREFIX = 'daily-rankings/'
+RANKINGS_BLOB_NAME = re.compile(r'boat_rankings_(\d{8})\.parquet$')
+
+# Concurrent blob downloads during a backfill (I/O bound, so threads are enough)
+BACKFILL_WORKERS = int(os.getenv('BACKFILL_WORKERS', '8'))
+
+# Dates written per SQL transaction during a backfill
+BACKFILL_BATCH_DAYS = int(os.getenv('BACKFILL_BATCH_DAYS', '31'))
+
+RANKING_COLUMNS = ['boat_id', 'avg_speed', 'max_speed', 'records', 'rank', 'avg_lat', 'avg_lng']
+
+# Rows per executemany() call when filling the staging table
+UPSERT_BATCH_ROWS = int(os.getenv('UPSERT_BATCH_ROWS', '100000'))
+
+SQLSERVER_STAGING = """
+IF OBJECT_ID('tempdb..#rankings_staging') IS NOT NULL DROP TABLE #rankings_staging;
+CREATE TABLE #rankings_staging (
+    date DATE NOT NULL,
+    boat_id INT NOT NULL,
+    avg_speed DECIMAL(8,2),
+    max_speed DECIMAL(8,2),
+    records INT,
+    rank INT,
+    avg_lat DECIMAL(10,6),
+    avg_lng DECIMAL(10,6),
+    PRIMARY KEY (date, boat_id)
+);
+"""
+
+SQLSERVER_MERGE = """
+MERGE boat_historical_rankings WITH (HOLDLOCK) AS target
+USING #rankings_staging AS source
+ON target.date = source.date AND target.boat_id = source.boat_id
+WHEN MATCHED THEN UPDATE SET
+    avg_speed = source.avg_speed, max_speed = source.max_speed, records = source.records,
+    rank = source.rank, avg_lat = source.avg_lat, avg_lng = source.avg_lng, created_at = GETDATE()
+WHEN NOT MATCHED THEN INSERT (date, boat_id, avg_speed, max_speed, records, rank, avg_lat, avg_lng)
+    VALUES (source.date, source.boat_id, source.avg_speed, source.max_speed,
+            source.records, source.rank, source.avg_lat, source.avg_lng);
+DELETE target FROM boat_historical_rankings AS target
+WHERE target.date IN (SELECT DISTINCT date FROM #rankings_staging)
+  AND NOT EXISTS (SELECT 1 FROM #rankings_staging AS source
+                  WHERE source.date = target.date AND source.boat_id = target.boat_id);
+DROP TABLE #rankings_staging;
+"""
+
+SQLITE_STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS rankings_staging (
+    date TEXT NOT NULL,
+    boat_id INTEGER NOT NULL,
+    avg_speed REAL,
+    max_speed REAL,
+    records INTEGER,
+    rank INTEGER,
+    avg_lat REAL,
+    avg_lng REAL,
+    PRIMARY KEY (date, boat_id)
+);
+DELETE FROM rankings_staging;
+"""
+
+SQLITE_MERGE = [
+    """
+    INSERT INTO boat_historical_rankings (date, boat_id, avg_speed, max_speed, records, rank, avg_lat, avg_lng)
+    SELECT date, boat_id, avg_speed, max_speed, records, rank, avg_lat, avg_lng FROM rankings_staging WHERE true
+    ON CONFLICT (date, boat_id) DO UPDATE SET
+        avg_speed = excluded.avg_speed, max_speed = excluded.max_speed, records = excluded.records,
+        rank = excluded.rank, avg_lat = excluded.avg_lat, avg_lng = excluded.avg_lng,
+        created_at = CURRENT_TIMESTAMP
+    """,
+    """
+    DELETE FROM boat_historical_rankings
+    WHERE date IN (SELECT DISTINCT date FROM rankings_staging)
+      AND NOT EXISTS (SELECT 1 FROM rankings_staging AS source
+                      WHERE source.date = boat_historical_rankings.date
+                        AND source.boat_id = boat_historical_rankings.boat_id)
+    """,
+    "DELETE FROM rankings_staging",
+]
 
 def create_historical_tables():
     """Create tables for historical analytics in SQL Database"""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Set command timeout for DDL operations
-            cursor.execute("SET LOCK_TIMEOUT 60000")  # 60 seconds
-            
-            # Create historical rankings table
-            create_table_sql = """
-            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='boat_historical_rankings' AND xtype='U')
-            CREATE TABLE boat_historical_rankings (
-                date DATE NOT NULL,
-                boat_id INT NOT NULL,
-                avg_speed DECIMAL(8,2),
-                max_speed DECIMAL(8,2),
-                records INT,
-                rank INT,
-                avg_lat DECIMAL(10,6),
-                avg_lng DECIMAL(10,6),
-                created_at DATETIME DEFAULT GETDATE(),
-                PRIMARY KEY (date, boat_id)
-            );
-            """
-            
+    def create(conn):
+        if is_sqlite(conn):
+            # the local stand-in creates boat_historical_rankings on connect
+            return
+        cursor = conn.cursor()
+        
+        # Set command timeout for DDL operations
+        cursor.execute("SET LOCK_TIMEOUT 60000")  # 60 seconds
+        
+        # Create historical rankings table
+        create_table_sql = """
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='boat_historical_rankings' AND xtype='U')
+        CREATE TABLE boat_historical_rankings (
+            date DATE NOT NULL,
+            boat_id INT NOT NULL,
+            avg_speed DECIMAL(8,2),
+            max_speed DECIMAL(8,2),
+            records INT,
+            rank INT,
+            avg_lat DECIMAL(10,6),
+            avg_lng DECIMAL(10,6),
+            created_at DATETIME DEFAULT GETDATE(),
+            PRIMARY KEY (date, boat_id)
+        );
+        """
+        
+        with METRICS.stage('create_tables'):
             cursor.execute(create_table_sql)
             conn.commit()
-            conn.close()
-            print("✅ Created historical rankings table")
-            return
-            
-        except Exception as e:
-            print(f"⚠️  Table creation attempt {attempt + 1} failed: {e}")
-            if attempt == max_retries - 1:
-                print(f"❌ Failed to create table after {max_retries} attempts")
-                raise
-            print("🔄 Retrying in 2 seconds...")
-            import time
-            time.sleep(2)
+    
+    run_with_connection('create_tables', create)
+    print("✅ Created historical rankings table")
+
+def sql_date(conn, target_date):
+    """Date parameter for either backend (SQLite stores ISO text)"""
+    return target_date.isoformat() if is_sqlite(conn) else target_date
 
 def load_parquet_to_sql(target_date):
-    """Load Parquet data from Azure into SQL Database with retry logic"""
-    # Load from Azure Blob Storage
+    """Load Parquet data from Azure into SQL Database (transient errors are retried)"""
+    # Load from Azure Blob Storage (the batch module is only imported by the commands that need it)
+    from simple_parquet_batch import load_from_azure_blob
     df = load_from_azure_blob(target_date)
     
     if df.empty:
         print(f"⚠️  No Parquet data found for {target_date}")
         return False
     
-    # Add date column
-    df['date'] = target_date
+    def load(conn):
+        # Set command timeout for long operations
+        if not is_sqlite(conn):
+            conn.cursor().execute("SET LOCK_TIMEOUT 60000")  # 60 seconds
+        
+        # One atomic upsert: the dashboard never sees the date without rankings
+        upsert_rankings(conn, [(target_date, df)])
     
-    # Retry logic for SQL operations
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            # Connect to SQL
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Set command timeout for long operations
-            cursor.execute("SET LOCK_TIMEOUT 60000")  # 60 seconds
-            
-            # Clear existing data for this date
-            cursor.execute("DELETE FROM boat_historical_rankings WHERE date = ?", target_date)
-            
-            # Insert Parquet data in batch
-            insert_data = []
-            for _, row in df.iterrows():
-                insert_data.append((
-                    target_date, int(row['boat_id']), row['avg_speed'], row['max_speed'],
-                    int(row['records']), int(row['rank']), row['avg_lat'], row['avg_lng']
-                ))
-            
-            # Batch insert for better performance
-            cursor.executemany("""
-                INSERT INTO boat_historical_rankings 
-                (date, boat_id, avg_speed, max_speed, records, rank, avg_lat, avg_lng)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, insert_data)
-            
-            conn.commit()
-            conn.close()
-            
-            print(f"✅ Loaded {len(df)} rankings for {target_date} into SQL")
-            return True
-            
-        except Exception as e:
-            print(f"⚠️  SQL operation attempt {attempt + 1} failed: {e}")
-            if attempt == max_retries - 1:
-                print(f"❌ Failed after {max_retries} attempts")
-                return False
-            print("🔄 Retrying in 2 seconds...")
-            import time
-            time.sleep(2)
+    try:
+        run_with_connection('insert', load)
+    except Exception as e:
+        print(f"❌ Failed to load rankings for {target_date}: {e}")
+        return False
+    
+    print(f"✅ Loaded {len(df)} rankings for {target_date} into SQL")
+    return True
 
 def sync_all_parquet_files():
     """Sync all available Parquet files to SQL Database"""
@@ -127,18 +183,142 @@ def sync_all_parquet_files():
             success_count += 1
     
     print(f"✅ Synced {success_count} Parquet files to SQL Database")
+    if get_blob_cache() is not None:
+        get_blob_cache().print_stats()
+
+def discover_ranking_dates(start=None, end=None, service=None):
+    """Dates with a rankings file under daily-rankings/, optionally limited to [start, end]"""
+    service = service or get_azure_client()
+    container = service.get_container_client(RANKINGS_CONTAINER)
+    names = with_retry(lambda: [blob.name for blob in container.list_blobs(name_starts_with=RANKINGS_PREFIX)], 'discover')
+    dates = []
+    for name in names:
+        match = RANKINGS_BLOB_NAME.search(name)
+        if not match:
+            continue
+        blob_date = datetime.strptime(match.group(1), '%Y%m%d').date()
+        if (start is None or blob_date >= start) and (end is None or blob_date <= end):
+            dates.append(blob_date)
+    return sorted(dates)
+
+def download_rankings(service, target_date):
+    """Download and decode one day of rankings (runs on a worker thread)"""
+    import pandas as pd
+    blob_path = f"{RANKINGS_PREFIX}boat_rankings_{target_date.strftime('%Y%m%d')}.parquet"
+    blob = service.get_blob_client(container=RANKINGS_CONTAINER, blob=blob_path)
+    cache = get_blob_cache()
+    if cache is not None:
+        return target_date, cache.read_parquet(blob, columns=RANKING_COLUMNS)
+    with METRICS.stage('download') as stage:
+        parquet_data = with_retry(lambda: blob.download_blob().readall(), 'download')
+        stage.bytes = len(parquet_data)
+    with METRICS.stage('decode') as stage:
+        df = pd.read_parquet(BytesIO(parquet_data), columns=RANKING_COLUMNS)
+        stage.rows = len(df)
+        stage.bytes = len(parquet_data)
+    return target_date, df
+
+def ranking_rows(conn, frames):
+    """Parameter tuples built from whole column buffers (no per-row pandas access)"""
+    parts = []
+    for target_date, df in frames:
+        parts.append(zip(
+            repeat(sql_date(conn, target_date), len(df)),
+            df['boat_id'].to_numpy('int64').tolist(),
+            df['avg_speed'].to_numpy('float64').tolist(),
+            df['max_speed'].to_numpy('float64').tolist(),
+            df['records'].to_numpy('int64').tolist(),
+            df['rank'].to_numpy('int64').tolist(),
+            df['avg_lat'].to_numpy('float64').tolist(),
+            df['avg_lng'].to_numpy('float64').tolist(),
+        ))
+    return list(chain.from_iterable(parts))
+
+def upsert_rankings(conn, frames, batch_rows=UPSERT_BATCH_ROWS):
+    """Stage the rankings of one or more dates and apply them as a single atomic upsert on
+    (date, boat_id). Boats missing from a staged date are removed, so each date ends up exactly
+    as in its Parquet file, and readers see either the old or the new rankings, never neither."""
+    rows = ranking_rows(conn, frames)
+    insert_staging = "INSERT INTO {} VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    cursor = conn.cursor()
+    with METRICS.stage('insert') as stage:
+        try:
+            if is_sqlite(conn):
+                cursor.executescript(SQLITE_STAGING)
+                statement = insert_staging.format('rankings_staging')
+            else:
+                cursor.fast_executemany = True
+                cursor.execute(SQLSERVER_STAGING)
+                statement = insert_staging.format('#rankings_staging')
+            for offset in range(0, len(rows), batch_rows):
+                cursor.executemany(statement, rows[offset:offset + batch_rows])
+            if is_sqlite(conn):
+                for merge in SQLITE_MERGE:
+                    cursor.execute(merge)
+            else:
+                cursor.execute(SQLSERVER_MERGE)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        stage.rows = len(rows)
+    return len(rows)
+
+def backfill_parquet_files(start=None, end=None, workers=BACKFILL_WORKERS, batch_days=BACKFILL_BATCH_DAYS):
+    """Discover every rankings file (or those in [start, end]), download them concurrently and
+    load them into boat_historical_rankings a batch of dates per transaction"""
+    service = get_azure_client()
+    dates = discover_ranking_dates(start, end, service)
+    if not dates:
+        print("⚠️  No Parquet files found under daily-rankings/")
+        return 0
+    print(f"🔄 Backfilling {len(dates)} days ({dates[0]} to {dates[-1]}) with {workers} download workers...")
+
+    rows = 0
+    days = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # map() keeps results in date order and at most `workers` downloads run at once;
+        # submitting a window of batch_days at a time bounds the decoded frames held in memory
+        for offset in range(0, len(dates), batch_days):
+            window = dates[offset:offset + batch_days]
+            frames = [(day, df) for day, df in pool.map(lambda day: download_rankings(service, day), window)
+                      if not df.empty]
+            if frames:
+                # the upsert is idempotent, so a transient failure just replays the batch on a fresh connection
+                rows += run_with_connection('insert', lambda conn: upsert_rankings(conn, frames))
+                days += len(frames)
+            print(f"   ✅ {window[0]} .. {window[-1]}: {days}/{len(dates)} days, {rows} rows")
+
+    print(f"✅ Backfilled {days} Parquet files ({rows} rankings) into SQL Database")
+    if get_blob_cache() is not None:
+        get_blob_cache().print_stats()
+    return days
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load daily rankings Parquet files into boat_historical_rankings")
+    parser.add_argument('--backfill', action='store_true',
+                        help="discover and load every date under daily-rankings/")
+    parser.add_argument('--from', dest='start', type=date.fromisoformat, help="first date to backfill")
+    parser.add_argument('--to', dest='end', type=date.fromisoformat, help="last date to backfill")
+    parser.add_argument('--workers', type=int, default=BACKFILL_WORKERS, help="concurrent downloads")
+    return parser.parse_args(argv)
 
-def main():
+def main(argv=None):
     """Main sync process"""
+    args = parse_args(argv)
     print("⛵ Parquet to SQL Sync for Grafana Analytics")
     print("=" * 50)
+    METRICS.configure('sync')
     
     try:
         # Step 1: Create tables if needed
         create_historical_tables()
         
         # Step 2: Sync Parquet files to SQL
-        sync_all_parquet_files()
+        if args.backfill or args.start or args.end:
+            backfill_parquet_files(args.start, args.end, args.workers)
+        else:
+            sync_all_parquet_files()
         
         print("\n🎯 Now you can create Grafana panels!")
 
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Mergeable per-boat, per-hour partial aggregates (boat_hourly_partials)
+Each bucket keeps sum/count/max of speed and sums of lat/lng, so daily, weekly and arbitrary-range
+rankings are exact and come from merging O(boats x hours) partials instead of rescanning raw telemetry.
+New rows are folded in from a created_at high-water mark; a late row only updates its own hour bucket.
+Usage: source database.env && python3 partial_aggregates.py update
+       python3 partial_aggregates.py rankings --from 2025-09-01 --to 2025-09-08
+"""
+
+import os
+import argparse
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from pipeline_metrics import METRICS
+from local_db import is_sqlite
+from simple_parquet_batch import RankingAccumulator, show_rankings
+from data_access import db_connection
+
+PARTIAL_COLUMNS = ['records', 'sum_speed', 'max_speed', 'sum_lat', 'sum_lng']
+
+# How partial columns combine when two partials of the same bucket are merged
+MERGE_RULES = {'records': 'sum', 'sum_speed': 'sum', 'max_speed': 'max', 'sum_lat': 'sum', 'sum_lng': 'sum'}
+
+# Column used to find rows that have not been folded into the partials yet
+WATERMARK_COLUMN = os.getenv('PARTIALS_WATERMARK_COLUMN', 'created_at')
+
+CHUNK_ROWS = int(os.getenv('EXTRACT_CHUNK_ROWS', '100000'))
+
+SQLSERVER_SCHEMA = """
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='boat_hourly_partials' AND xtype='U')
+CREATE TABLE boat_hourly_partials (
+    hour_start DATETIME NOT NULL,
+    boat_id INT NOT NULL,
+    records BIGINT NOT NULL,
+    sum_speed FLOAT NOT NULL,
+    max_speed FLOAT,
+    sum_lat FLOAT NOT NULL,
+    sum_lng FLOAT NOT NULL,
+    PRIMARY KEY (hour_start, boat_id)
+);
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='boat_partials_state' AND xtype='U')
+CREATE TABLE boat_partials_state (
+    name VARCHAR(50) PRIMARY KEY,
+    watermark VARCHAR(50)
+);
+"""
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS boat_hourly_partials (
+    hour_start TEXT NOT NULL,
+    boat_id INTEGER NOT NULL,
+    records INTEGER NOT NULL,
+    sum_speed REAL NOT NULL,
+    max_speed REAL,
+    sum_lat REAL NOT NULL,
+    sum_lng REAL NOT NULL,
+    PRIMARY KEY (hour_start, boat_id)
+);
+CREATE TABLE IF NOT EXISTS boat_partials_state (
+    name TEXT PRIMARY KEY,
+    watermark TEXT
+);
+"""
+
+
+def sql_time(conn, value):
+    """Datetime parameter for either backend (SQLite stores sortable text)"""
+    if is_sqlite(conn):
+        return pd.Timestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+    return pd.Timestamp(value).to_pydatetime()
+
+
+def hourly_partials(df):
+    """Partials per (hour_start, boat_id) from raw rows with boat_id, speed, latitude, longitude, event_time"""
+    df = df.dropna(subset=['speed'])
+    hour_start = pd.to_datetime(df['event_time']).dt.floor('h')
+    return df.assign(hour_start=hour_start).groupby(['hour_start', 'boat_id']).agg(
+        records=('speed', 'size'),
+        sum_speed=('speed', 'sum'),
+        max_speed=('speed', 'max'),
+        sum_lat=('latitude', 'sum'),
+        sum_lng=('longitude', 'sum'),
+    ).reset_index()
+
+
+def merge_partials(*frames):
+    """Combine partials that may cover the same buckets"""
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=['hour_start', 'boat_id'] + PARTIAL_COLUMNS)
+    combined = pd.concat(frames, ignore_index=True)
+    return combined.groupby(['hour_start', 'boat_id'], as_index=False).agg(MERGE_RULES)
+
+
+def rankings_from_partials(partials):
+    """Exact rankings (compute_boat_rankings layout) for whatever buckets are passed in"""
+    accumulator = RankingAccumulator()
+    if not partials.empty:
+        accumulator.totals = partials.groupby('boat_id').agg(MERGE_RULES)
+    return accumulator.rankings()
+
+
+def create_partials_table(conn):
+    if is_sqlite(conn):
+        conn.executescript(SQLITE_SCHEMA)
+    else:
+        cursor = conn.cursor()
+        cursor.execute(SQLSERVER_SCHEMA)
+        conn.commit()
+
+
+def upsert_partials(conn, partials):
+    """Add partials to the stored buckets; only the buckets present in `partials` are touched"""
+    if partials.empty:
+        return
+    rows = list(zip(
+        [sql_time(conn, value) for value in partials['hour_start']],
+        partials['boat_id'].astype(int).tolist(),
+        partials['records'].astype(int).tolist(),
+        partials['sum_speed'].tolist(),
+        partials['max_speed'].tolist(),
+        partials['sum_lat'].tolist(),
+        partials['sum_lng'].tolist(),
+    ))
+    cursor = conn.cursor()
+    if is_sqlite(conn):
+        cursor.executemany("""
+            INSERT INTO boat_hourly_partials (hour_start, boat_id, records, sum_speed, max_speed, sum_lat, sum_lng)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (hour_start, boat_id) DO UPDATE SET
+                records = records + excluded.records,
+                sum_speed = sum_speed + excluded.sum_speed,
+                max_speed = MAX(max_speed, excluded.max_speed),
+                sum_lat = sum_lat + excluded.sum_lat,
+                sum_lng = sum_lng + excluded.sum_lng
+        """, rows)
+    else:
+        cursor.fast_executemany = True
+        cursor.executemany("""
+            MERGE boat_hourly_partials WITH (HOLDLOCK) AS target
+            USING (SELECT ? AS hour_start, ? AS boat_id, ? AS records, ? AS sum_speed,
+                          ? AS max_speed, ? AS sum_lat, ? AS sum_lng) AS source
+            ON target.hour_start = source.hour_start AND target.boat_id = source.boat_id
+            WHEN MATCHED THEN UPDATE SET
+                records = target.records + source.records,
+                sum_speed = target.sum_speed + source.sum_speed,
+                max_speed = CASE WHEN source.max_speed > target.max_speed THEN source.max_speed ELSE target.max_speed END,
+                sum_lat = target.sum_lat + source.sum_lat,
+                sum_lng = target.sum_lng + source.sum_lng
+            WHEN NOT MATCHED THEN INSERT (hour_start, boat_id, records, sum_speed, max_speed, sum_lat, sum_lng)
+                VALUES (source.hour_start, source.boat_id, source.records, source.sum_speed,
+                        source.max_speed, source.sum_lat, source.sum_lng);
+        """, rows)
+
+
+def load_partials(conn, start, end):
+    """Stored partials for hour buckets in [start, end)"""
+    partials = pd.read_sql("""
+        SELECT hour_start, boat_id, records, sum_speed, max_speed, sum_lat, sum_lng
+        FROM boat_hourly_partials
+        WHERE hour_start >= ? AND hour_start < ?
+    """, conn, params=[sql_time(conn, start), sql_time(conn, end)])
+    partials['hour_start'] = pd.to_datetime(partials['hour_start'])
+    return partials
+
+
+def read_watermark(conn, name='boat_telemetry'):
+    cursor = conn.cursor()
+    cursor.execute("SELECT watermark FROM boat_partials_state WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def watermark_param(conn, watermark):
+    """Stored watermarks are text; give SQL Server back a number or datetime to compare with"""
+    if watermark is None or is_sqlite(conn):
+        return watermark
+    try:
+        return int(watermark)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(watermark)
+    except ValueError:
+        return watermark
+
+
+def write_watermark(conn, watermark, name='boat_telemetry'):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE boat_partials_state SET watermark = ? WHERE name = ?", (str(watermark), name))
+    if cursor.rowcount == 0:
+        cursor.execute("INSERT INTO boat_partials_state (name, watermark) VALUES (?, ?)", (name, str(watermark)))
+
+
+def iter_watermark_chunks(reader, columns, watermark_column, watermark=None, chunk_rows=CHUNK_ROWS,
+                          where='speed IS NOT NULL', params=()):
+    """Stream boat_telemetry rows above the watermark in chunks of about chunk_rows rows, ordered by
+    the watermark column (returned as a 'watermark' column). Rows sharing the last watermark value
+    of a fetch are held back for the next chunk, so committing chunk['watermark'].iloc[-1] never
+    splits a group of equal values. `params` fill the placeholders of `where`."""
+    query = f"""
+        SELECT {', '.join(columns)}, {watermark_column}
+        FROM boat_telemetry
+        WHERE {where} {'AND ' + watermark_column + ' > ?' if watermark is not None else ''}
+        ORDER BY {watermark_column}
+    """
+    cursor = reader.cursor()
+    cursor.execute(query, tuple(params) + ((watermark,) if watermark is not None else ()))
+
+    names = list(columns) + ['watermark']
+    carry = pd.DataFrame(columns=names)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            df = pd.DataFrame.from_records([tuple(row) for row in rows], columns=names)
+            if not carry.empty:
+                df = pd.concat([carry, df], ignore_index=True) if not df.empty else carry
+            if df.empty:
+                return
+
+            if rows:
+                last = df['watermark'].iloc[-1]
+                tail = (df['watermark'] == last).to_numpy()
+                carry, df = df[tail], df[~tail]
+                if df.empty:
+                    continue
+            else:
+                carry = carry.iloc[0:0]
+
+            yield df
+            if not rows:
+                return
+    finally:
+        cursor.close()
+
+
+def update_partials(conn=None, reader=None, chunk_rows=CHUNK_ROWS):
+    """Fold every boat_telemetry row above the stored high-water mark into boat_hourly_partials.
+    Rows are streamed over a second (reader) connection; each chunk and its new watermark are
+    committed together, so a rerun after a crash never double counts."""
+    if conn is None:
+        with db_connection() as conn, db_connection() as reader:
+            return update_partials(conn, reader, chunk_rows)
+    create_partials_table(conn)
+
+    watermark = watermark_param(conn, read_watermark(conn))
+    columns = ['boat_id', 'speed', 'latitude', 'longitude', 'event_time']
+    total = 0
+    buckets = 0
+    for df in iter_watermark_chunks(reader, columns, WATERMARK_COLUMN, watermark, chunk_rows):
+        with METRICS.stage('partials') as stage:
+            partials = hourly_partials(df)
+            upsert_partials(conn, partials)
+            write_watermark(conn, df['watermark'].iloc[-1])
+            conn.commit()
+            stage.rows = len(df)
+        total += len(df)
+        buckets += len(partials)
+
+    print(f"✅ Folded {total} new rows into {buckets} hourly partial updates")
+    return total
+
+
+def rankings_for_range(start, end, conn=None):
+    """Exact rankings for [start, end) from the stored partials"""
+    if conn is None:
+        with db_connection() as conn:
+            return rankings_for_range(start, end, conn)
+    with METRICS.stage('merge_partials') as stage:
+        partials = load_partials(conn, start, end)
+        rankings = rankings_from_partials(partials)
+        stage.rows = len(partials)
+    return rankings
+
+
+def daily_rankings(target_date, conn=None):
+    start = datetime.combine(target_date, datetime.min.time())
+    return rankings_for_range(start, start + timedelta(days=1), conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hourly partial aggregates for exact boat rankings")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('update', help="fold new boat_telemetry rows into the partials")
+    ranking = subparsers.add_parser('rankings', help="rankings for a date range from the partials")
+    ranking.add_argument('--from', dest='start', type=date.fromisoformat, default=date.today())
+    ranking.add_argument('--to', dest='end', type=date.fromisoformat,
+                         help="last day included (default: same as --from)")
+    args = parser.parse_args()
+
+    METRICS.configure('partials')
+    if args.command == 'update':
+        print("🧮 Updating hourly partial aggregates...")
+        update_partials()
+    else:
+        end = (args.end or args.start) + timedelta(days=1)
+        print(f"🏁 Rankings from {args.start} to {end - timedelta(days=1)} (merged hourly partials)")
+        show_rankings(rankings_for_range(args.start, end))
+
+
+if __name__ == "__main__":
+    main()
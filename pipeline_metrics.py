@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Pipeline metrics shared by the simulator, monitor and batch scripts
+Records per-stage wall time, row counts, bytes and retries, and exposes them as a JSON run report
+(METRICS_REPORT=run_report.json) and/or a local Prometheus-text endpoint (METRICS_PORT=9108).
+Usage: METRICS_REPORT=run_report.json python3 simple_parquet_batch.py
+       METRICS_PORT=9108 python3 race_simulator.py   (then scrape http://localhost:9108/metrics)
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class StageStats():
+    """Running totals for one pipeline stage"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.last_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class StageRun():
+    """Handle yielded by Metrics.stage(); set rows/bytes on it while the stage runs"""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+
+
+class Metrics():
+    """Registry of stage timings and gauges for one job"""
+
+    def __init__(self, job='pipeline'):
+        self.job = job
+        self.started_at = datetime.now(timezone.utc)
+        self.stages = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._report_path = None  # written once at exit, to the path of the last configure()
+
+    def _stage(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block of work: with METRICS.stage('extract') as stage: ...; stage.rows = len(df)"""
+        run = StageRun()
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield run
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, run.rows, run.bytes, error=failed)
+
+    def record(self, name, seconds, rows=0, nbytes=0, error=False):
+        with self._lock:
+            stats = self._stage(name)
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.rows += rows
+            stats.bytes += nbytes
+            stats.seconds += seconds
+            stats.last_seconds = seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def retry(self, name):
+        with self._lock:
+            self._stage(name).retries += 1
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job': self.job,
+                'started_at': self.started_at.isoformat(),
+                'elapsed_seconds': (datetime.now(timezone.utc) - self.started_at).total_seconds(),
+                'stages': {name: stats.to_dict() for name, stats in self.stages.items()},
+                'gauges': dict(self.gauges),
+            }
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        report = self.to_dict()
+        job = report['job']
+        lines = []
+        for field, kind in (('seconds', 'counter'), ('calls', 'counter'), ('rows', 'counter'),
+                            ('bytes', 'counter'), ('retries', 'counter'), ('errors', 'counter'),
+                            ('last_seconds', 'gauge'), ('max_seconds', 'gauge')):
+            metric = f"sail_stage_{field}" + ("_total" if kind == 'counter' else "")
+            lines.append(f"# TYPE {metric} {kind}")
+            for stage, stats in report['stages'].items():
+                lines.append(f'{metric}{{job="{job}",stage="{stage}"}} {stats[field]}')
+        for name, value in report['gauges'].items():
+            lines.append(f"# TYPE sail_{name} gauge")
+            lines.append(f'sail_{name}{{job="{job}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"📈 Metrics report written to {path}")
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve /metrics (Prometheus text) and /report (JSON) from a background thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics'):
+                    body, content_type = metrics.to_prometheus().encode(), 'text/plain; version=0.0.4'
+                elif self.path.startswith('/report'):
+                    body, content_type = json.dumps(metrics.to_dict()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📈 Metrics endpoint: http://{host}:{self._server.server_port}/metrics")
+        return self._server
+
+    def configure(self, job):
+        """Name the job and enable the exporters selected by METRICS_PORT / METRICS_REPORT"""
+        self.job = job
+        port = os.getenv('METRICS_PORT')
+        if port and self._server is None:
+            self.serve(int(port))
+        report = os.getenv('METRICS_REPORT')
+        if report:
+            if self._report_path is None:
+                atexit.register(self._write_report_at_exit)
+            self._report_path = report
+
+    def _write_report_at_exit(self):
+        self.write_report(self._report_path)
+
+
+# Shared registry used by every script
+METRICS = Metrics()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Race course and race-progress leaderboard
+Great-circle (haversine) math on NumPy arrays, the course the simulator sails (Cascais → south
+Atlantic → Southern Ocean) as a list of waypoints, and RaceTracker: per-boat cumulative distance
+sailed and distance to finish, updated from each new position (O(1) per event, no track rescans).
+Boats are ranked by distance to finish, the way a real ocean race is.
+Usage: from race_course import RaceTracker
+       python3 benchmarks.py race
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Course waypoints (name, latitude, longitude), following the simulator's course rules: south-west
+# from Cascais to latitude 15, south-east through the south Atlantic to latitude -50, then east
+# along the Southern Ocean to the finish south of Australia
+ROUTE = (
+    ('Cascais', 38.6241832, -9.3925219),
+    ('Mid Atlantic (15N)', 15.0, -40.0),
+    ('South Atlantic (50S)', -50.0, 9.0),
+    ('Finish (south of Cape Leeuwin)', -50.0, 115.0),
+)
+
+LEG_START = np.radians([[lat, lng] for _, lat, lng in ROUTE[:-1]])
+LEG_END = np.radians([[lat, lng] for _, lat, lng in ROUTE[1:]])
+LAST_LEG = len(ROUTE) - 2
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km between points given in degrees (arrays broadcast)"""
+    lat1, lng1, lat2, lng2 = (np.radians(value) for value in (lat1, lng1, lat2, lng2))
+    return _haversine(lat1, lng1, lat2, lng2) * EARTH_RADIUS_KM
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    """Central angle in radians between points given in radians"""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _bearing(lat1, lng1, lat2, lng2):
+    """Initial great-circle bearing in radians from point 1 to point 2 (radians in)"""
+    return np.arctan2(np.sin(lng2 - lng1) * np.cos(lat2),
+                      np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lng2 - lng1))
+
+
+LEG_KM = _haversine(LEG_START[:, 0], LEG_START[:, 1], LEG_END[:, 0], LEG_END[:, 1]) * EARTH_RADIUS_KM
+LEG_BEARING = _bearing(LEG_START[:, 0], LEG_START[:, 1], LEG_END[:, 0], LEG_END[:, 1])
+
+# Course length still to sail after the end of each leg
+REMAINING_KM = np.r_[np.cumsum(LEG_KM[::-1])[::-1][1:], 0.0]
+COURSE_KM = float(LEG_KM.sum())
+
+
+def along_track_km(lat, lng, leg):
+    """Signed distance made good along each boat's current leg (degrees in, leg index per boat):
+    negative behind the leg start, above the leg length once past its end"""
+    lat, lng = np.radians(lat), np.radians(lng)
+    start = LEG_START[leg]
+    angle = _haversine(start[:, 0], start[:, 1], lat, lng)
+    bearing = _bearing(start[:, 0], start[:, 1], lat, lng)
+    # right spherical triangle: tan(along) = tan(angle) * cos(bearing difference)
+    return np.arctan2(np.sin(angle) * np.cos(bearing - LEG_BEARING[leg]), np.cos(angle)) * EARTH_RADIUS_KM
+
+
+def running_any(flags, group, starts, inclusive=True):
+    """Per row: whether any row of the same group up to it (or strictly before it) is flagged.
+    Rows are grouped in runs; group is the run index of each row, starts the first row of each run."""
+    total = np.cumsum(flags)
+    before = total - flags
+    return (total if inclusive else before) - before[starts][group] > 0
+
+
+def row_legs(lat, lng, group, starts, start_leg):
+    """Leg each event is on: a boat moves on to the next leg at its first event past the end of its
+    current leg (rows grouped by boat in time order, start_leg per group)"""
+    legs = start_leg[group].astype(np.int8)
+    for leg in range(LAST_LEG):
+        on_leg = legs == leg
+        if not on_leg.any():
+            continue
+        passed = np.zeros(len(legs), dtype=bool)
+        passed[on_leg] = along_track_km(lat[on_leg], lng[on_leg], legs[on_leg]) >= LEG_KM[leg]
+        legs[on_leg & running_any(passed, group, starts)] += 1
+    return legs
+
+
+def crossed_finish(lat, lng, leg):
+    """True for boats on the last leg that have passed the finish line (perpendicular to the leg)"""
+    return (leg == LAST_LEG) & (along_track_km(lat, lng, leg) >= LEG_KM[LAST_LEG])
+
+
+def distance_to_finish_km(lat, lng, leg):
+    """Great-circle distance to the end of the current leg plus the rest of the course"""
+    end = LEG_END[leg]
+    return (_haversine(np.radians(lat), np.radians(lng), end[:, 0], end[:, 1]) * EARTH_RADIUS_KM
+            + REMAINING_KM[leg])
+
+
+def group_bounds(boat):
+    """(first row, last row) of each run of equal boat ids in a boat-sorted array"""
+    starts = np.flatnonzero(np.r_[True, boat[1:] != boat[:-1]])
+    return starts, np.r_[starts[1:] - 1, len(boat) - 1]
+
+
+class RaceTracker():
+    """Per-boat race progress as struct-of-arrays indexed by boat id (thread-safe).
+    Each new position adds one haversine segment to the distance sailed and re-measures the
+    distance to finish; events older than a boat's last position, and events of boats that have
+    finished, are ignored."""
+
+    FIELDS = ('latitude', 'longitude', 'distance_km', 'distance_to_finish_km')
+    STATE_FIELDS = ('event_time', 'finish_time', 'leg') + FIELDS
+
+    def __init__(self, capacity=1024):
+        self.updates = 0
+        self._lock = threading.Lock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.event_time = np.full(capacity, -1, dtype=np.int64)
+        self.finish_time = np.full(capacity, -1, dtype=np.int64)
+        self.leg = np.zeros(capacity, dtype=np.int8)
+        self.latitude = np.full(capacity, np.nan)
+        self.longitude = np.full(capacity, np.nan)
+        self.distance_km = np.zeros(capacity)
+        self.distance_to_finish_km = np.full(capacity, np.nan)
+
+    def _grow(self, boat_max):
+        capacity = len(self.event_time)
+        if boat_max < capacity:
+            return
+        old = {name: getattr(self, name) for name in self.STATE_FIELDS}
+        self._allocate(max(boat_max + 1, 2 * capacity))
+        for name, values in old.items():
+            getattr(self, name)[:capacity] = values
+
+    def update(self, boat, latitude, longitude, event_time):
+        """Fold positions in (arrays; event_time as datetime64 or int64 microseconds).
+        Rows may come in any order within a batch. Returns the number of events applied."""
+        boat = np.asarray(boat, dtype=np.int64)
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        event_time = np.asarray(event_time)
+        if event_time.dtype.kind == 'M':
+            event_time = event_time.astype('datetime64[us]').astype(np.int64)
+        if len(boat) == 0:
+            return 0
+
+        # group the batch by boat, oldest first within a boat (a fleet tick already is: one row per boat)
+        if not (boat[1:] > boat[:-1]).all():
+            order = np.lexsort((event_time, boat))
+            boat, latitude, longitude, event_time = boat[order], latitude[order], longitude[order], event_time[order]
+
+        with self._lock:
+            self._grow(int(boat.max()))
+            fresh = (event_time >= self.event_time[boat]) & (self.finish_time[boat] < 0)
+            if not fresh.all():
+                boat, latitude, longitude, event_time = boat[fresh], latitude[fresh], longitude[fresh], event_time[fresh]
+                if len(boat) == 0:
+                    return 0
+            starts, last = group_bounds(boat)
+            group = np.repeat(np.arange(len(starts)), last - starts + 1)
+            legs = row_legs(latitude, longitude, group, starts, self.leg[boat[starts]])
+
+            # stop each boat at its first event past the finish line and drop the rest
+            crossed = np.zeros(len(boat), dtype=bool)
+            on_last_leg = legs == LAST_LEG
+            if on_last_leg.any():
+                crossed[on_last_leg] = crossed_finish(latitude[on_last_leg], longitude[on_last_leg], legs[on_last_leg])
+                keep = ~running_any(crossed, group, starts, inclusive=False)
+                if not keep.all():
+                    boat, latitude, longitude, event_time = boat[keep], latitude[keep], longitude[keep], event_time[keep]
+                    legs, crossed = legs[keep], crossed[keep]
+                    starts, last = group_bounds(boat)
+            ids = boat[starts]
+
+            # previous position of every event: the row before it, or the stored one for a boat's first row
+            previous_lat = np.r_[np.nan, latitude[:-1]]
+            previous_lng = np.r_[np.nan, longitude[:-1]]
+            previous_lat[starts] = self.latitude[ids]
+            previous_lng[starts] = self.longitude[ids]
+            segments = np.nan_to_num(haversine_km(previous_lat, previous_lng, latitude, longitude))
+            self.distance_km[ids] += np.add.reduceat(segments, starts)
+
+            lat, lng = latitude[last], longitude[last]
+            self.latitude[ids] = lat
+            self.longitude[ids] = lng
+            self.event_time[ids] = event_time[last]
+            leg = legs[last]
+            self.leg[ids] = leg
+            finished = crossed[last]
+            self.finish_time[ids[finished]] = event_time[last][finished]
+            self.distance_to_finish_km[ids] = np.where(finished, 0.0, distance_to_finish_km(lat, lng, leg))
+            self.updates += len(boat)
+        return len(boat)
+
+    def update_frame(self, df):
+        """Fold rows of a DataFrame with boat_id, latitude, longitude and event_time in"""
+        event_time = pd.to_datetime(df['event_time'], format='ISO8601').to_numpy('datetime64[us]')
+        return self.update(df['boat_id'].to_numpy(), df['latitude'].to_numpy(), df['longitude'].to_numpy(), event_time)
+
+    def state(self):
+        """Progress of every seen boat as a DataFrame, for restore() (e.g. in a later run)"""
+        with self._lock:
+            ids = np.flatnonzero(self.event_time >= 0)
+            return pd.DataFrame({'boat_id': ids, **{name: getattr(self, name)[ids] for name in self.STATE_FIELDS}})
+
+    def restore(self, state):
+        """Take back the progress saved by state(), replacing what is stored for those boats"""
+        if len(state) == 0:
+            return
+        ids = state['boat_id'].to_numpy(np.int64)
+        with self._lock:
+            self._grow(int(ids.max()))
+            for name in self.STATE_FIELDS:
+                values = getattr(self, name)
+                values[ids] = state[name].to_numpy().astype(values.dtype)
+            self.updates += len(ids)
+
+    def leaderboard(self, top=None):
+        """Finished boats by finish time, then the others by distance to finish
+        (ties: most distance sailed first)"""
+        with self._lock:
+            ids = np.flatnonzero(self.event_time >= 0)
+            finish_time = self.finish_time[ids]
+            finished = finish_time >= 0
+            if top is not None and top < len(ids):
+                # one float key: finished boats sort far below any distance, in finish order
+                key = np.where(finished, finish_time * 1e-6 - 1e12, self.distance_to_finish_km[ids])
+                part = np.argpartition(key, top)[:top]
+                ids, finish_time, finished = ids[part], finish_time[part], finished[part]
+            ids = ids[np.lexsort((-self.distance_km[ids], self.distance_to_finish_km[ids],
+                                  np.where(finished, finish_time, np.iinfo(np.int64).max)))]
+            board = pd.DataFrame({'boat_id': ids, 'leg': self.leg[ids] + 1,
+                                  **{name: getattr(self, name)[ids] for name in self.FIELDS},
+                                  'event_time': self.event_time[ids].astype('datetime64[us]')})
+            finish_time = self.finish_time[ids]
+            board['finish_time'] = np.where(finish_time >= 0, finish_time, np.iinfo(np.int64).min).astype('datetime64[us]')
+        board.insert(0, 'race_rank', np.arange(1, len(board) + 1))
+        return board
+
+
+def race_leaderboard(df):
+    """Race leaderboard of one batch of telemetry rows (boat_id, latitude, longitude, event_time):
+    distance sailed over those rows and distance to finish from each boat's last position"""
+    tracker = RaceTracker()
+    tracker.update_frame(df)
+    return tracker.leaderboard()
+
+
+if __name__ == "__main__":
+    print("🧭 Race course")
+    for (name, lat, lng), leg_km in zip(ROUTE[1:], LEG_KM):
+        print(f"   → {name:<32} ({lat:7.2f}, {lng:8.2f})  {leg_km:8.0f} km")
+    print(f"   Total course: {COURSE_KM:,.0f} km")
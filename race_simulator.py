@@ -9,6 +9,8 @@
 # tool always shows clean data.
 
 # Usage source azure_storage.env && python3 race_simulator.py
+# Offline: NUMBER_OF_BOATS=1000 python3 race_simulator.py --fast-forward 7 --output week.parquet
+# Load test: NUMBER_OF_BOATS=1000000 TELEMETRY_ENCODING=packed python3 race_simulator.py --shards 0
 # 
 # --------------------------------------------------------------------------------------------
 
@@ -17,163 +19,299 @@
 # CONFIGURATION - Set these environment variables before running the app
 # --------------------------------------------------------------------------------------------
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from azure_storage.env file
-load_dotenv('azure_storage.env')
 
+# Set from azure_storage.env when the app starts (see load_settings), not when the module is imported
 NAMESPACE_CONNECTION_STR = os.getenv('AZURE_EVENTHUB_CONNECTION_STRING')
 EVENTHUB_NAME = os.getenv('AZURE_EVENTHUB_NAME', 'project1')
 
+# Where telemetry goes: eventhub (default), fake (in-process Event Hub), jsonl or parquet (rotating local files)
+TELEMETRY_SINK = os.getenv('TELEMETRY_SINK', 'eventhub')
+
+# Event wire format: json (one event per boat, default) or packed (one columnar event per chunk of boats)
+TELEMETRY_ENCODING = os.getenv('TELEMETRY_ENCODING', 'json')
+
+# How many boats to print each tick (console I/O is expensive with large fleets)
+PRINT_BOATS = int(os.getenv('PRINT_BOATS', '10'))
+
+# Tick loop: sync (send, sleep, update) or async (fixed tick rate with backpressure, see tick_scheduler.py)
+SIMULATOR_SCHEDULER = os.getenv('SIMULATOR_SCHEDULER', 'sync')
+
+# Worker processes sharing the fleet by boat-id range (1 = single process, 0 = one per core)
+SIMULATOR_SHARDS = int(os.getenv('SIMULATOR_SHARDS', '1'))
+
 
 # --------------------------------------------------------------------------------------------
 # APP CODE STARTS HERE
 # --------------------------------------------------------------------------------------------
 
-import math, random
 import time
-import json
-from azure.eventhub import EventHubProducerClient, EventData
-from azure.eventhub.exceptions import EventHubError
+import argparse
+from datetime import datetime, timedelta, timezone
+from pipeline_metrics import METRICS
 
-# Number of boats in the race
-NUMBER_OF_BOATS = 10
+# Number of boats in the race (raise it for load tests, e.g. NUMBER_OF_BOATS=100000)
+NUMBER_OF_BOATS = int(os.getenv('NUMBER_OF_BOATS', '10'))
+
+# Optional seed for reproducible races
+FLEET_SEED = int(os.getenv('FLEET_SEED')) if os.getenv('FLEET_SEED') else None
 
 # Speed at which simulation runs (1 = realtime, 60 = one hour every minute, 1440 = one day every minute etc)
 SIMULATION_SPEED = 60  # Increased to 60x for faster boat movement
 
-# A data record for one boat
-class BoatData():
-    def __init__(self, latitude, longitude, heading, speed):
-        self.Latitude = latitude
-        self.Longitude = longitude
-        self.Heading = heading
-        self.Speed = speed
+# Seconds between two telemetry ticks
+TICK_SECONDS = 10
 
-# The data array for the entire fleet
-FleetData = []
+# The data arrays for the entire fleet (see fleet_engine.FleetArrays)
+FleetData = None
 
 # Initialize the fleet
 def init_fleet():
-    for i in range(NUMBER_OF_BOATS):
-
-        # put all boats just outside Cascais, Portugal, heading sout-west at 10 km/h with random spread
-        boat = BoatData(
-            38.6241832 + random.uniform(-0.01, 0.01) ,
-            -9.3925219 + random.uniform(-0.01, 0.01), 
-            225 + random.randrange(-20, 20), 
-            10 + random.uniform(-5, 5))
-        FleetData.append(boat)
-
-
-# Send the fleet data to the EventHub 
-def send_events(producer):
-    batch = producer.create_batch()
-    for i in range(NUMBER_OF_BOATS):
-        boat_data = FleetData[i]
-
-        # introduce random GPS corruption
-        latitude = boat_data.Latitude
-        longitude = boat_data.Longitude
-        if (random.randrange(0, 100) == 0):
-            latitude = -10000
-            longitude = -10000
-
-        # send the data record
-        event_data = EventData(json.dumps({
-            "boat": i,
-            "latitude": latitude,
-            "longitude": longitude,
-            "heading": boat_data.Heading,
-            "speed": boat_data.Speed
-        }))
-        event_data.content_type = "application/json"
-        batch.add(event_data)
-
-        # report boat info
-        print ("Boat:", i, "Lat:", latitude, "Long:", longitude, "Heading:", boat_data.Heading, "Speed:", boat_data.Speed)
-    
-    producer.send_batch(batch)
-
-    # report boat info
-    print ("Boat:", i, "Lat:", latitude, "Long:", longitude, "Heading:", boat_data.Heading, "Speed:", boat_data.Speed)
+    global FleetData
+    from fleet_engine import FleetArrays
 
+    # put all boats just outside Cascais, Portugal, heading sout-west at 10 km/h with random spread
+    FleetData = FleetArrays(NUMBER_OF_BOATS, seed=FLEET_SEED)
 
-# Update boat heading and speed
-def update_boat(boat):
 
-    # make a small adjustment to heading and speed
-    boat.Heading += random.uniform(-5, 5)
-    boat.Speed += random.uniform(0,2)
+# Send the fleet data to the telemetry sink (EventHub by default, see telemetry_sinks.py)
+def send_events(sink):
+    from fleet_engine import telemetry_columns
+    columns = telemetry_columns(FleetData)
+    latitude, longitude = columns["latitude"], columns["longitude"]
 
-    # keep heading and speed within sane range
-    if (boat.Heading < 0 or boat.Heading > 360):
-        boat.Heading = 0
-    if (boat.Speed < 0):
-        boat.Speed = 0
-    if (boat.Speed > 25):  # Increased max speed for faster movement
-        boat.Speed = 25
+    # send the data records, split across as many batches and partitions as needed
+    bytes_before, batches_before = sink.bytes_sent, sink.batches_sent
+    with METRICS.stage('send') as stage:
+        sink.send(columns)
+        stage.rows = NUMBER_OF_BOATS
+        stage.bytes = sink.bytes_sent - bytes_before
+    batches = sink.batches_sent - batches_before
+    METRICS.set_gauge('send_batches', batches)
+    METRICS.set_gauge('send_batch_size', NUMBER_OF_BOATS / max(batches, 1))
 
-    # force boat to move south-west from Cascais
-    if (boat.Latitude > 15 and (boat.Heading < 205 or boat.Heading > 245)):
-        boat.Heading = 225
-
-    # force boat to move south-east once it passes latitude 15 to move past Africa and South America
-    if (boat.Latitude > -50 and boat.Latitude <= 15 and (boat.Heading < 130 or boat.Heading > 170)):
-        boat.Heading = 150
-
-    # once the boat is close to Antarctica, keep heading east towards Australia
-    if (boat.Latitude > -64 and boat.Latitude <= -50 and (boat.Heading < 70 or boat.Heading > 110)):
-        boat.Heading = 90
+    # report boat info
+    for i in range(min(NUMBER_OF_BOATS, PRINT_BOATS)):
+        print ("Boat:", i, "Lat:", latitude[i], "Long:", longitude[i], "Heading:", FleetData.heading[i], "Speed:", FleetData.speed[i])
+    if NUMBER_OF_BOATS > PRINT_BOATS:
+        print ("... and", NUMBER_OF_BOATS - PRINT_BOATS, "more boats")
 
 
-# Update the fleet
+# Update the fleet (heading/speed jitter, course rules and position update for every boat at once)
 def update_fleet():
-    for i in range(NUMBER_OF_BOATS):
-        boat = FleetData[i]
-
-        # adjust course and speed
-        update_boat(boat)
-
-        # calculate x and y speed components
-        rad = boat.Heading * math.pi / 180
-        vx = boat.Speed * math.sin(rad)
-        vy = boat.Speed * math.cos(rad)
-
-        # update ship position (rough approximation)
-        boat.Longitude += (vx * SIMULATION_SPEED / (60 * 85))
-        boat.Latitude += (vy * SIMULATION_SPEED / (60 * 111))
-
-
-# check if the eventhub namespace connection string has been set
-if NAMESPACE_CONNECTION_STR.startswith("REPLACE "):
-    print ("The app cannot start because you did not set the NAMESPACE_CONNECTION_STR variable. Please check the race_simulator.py file for further instructions.")
-    exit()
-
-# check if the eventhub name has been set
-if EVENTHUB_NAME.startswith("REPLACE "):
-    print ("The app cannot start because you did not set the EVENTHUB_NAME variable. Please check the race_simulator.py file for further instructions.")
-    exit()
-
-
-# set up an eventhub producer
-producer = EventHubProducerClient.from_connection_string(
-    conn_str=NAMESPACE_CONNECTION_STR,
-    eventhub_name=EVENTHUB_NAME
-)
-
-# initialize the fleet
-init_fleet()
-
-# send fleet telemetry to EventHub every 60 seconds
-while True:
+    with METRICS.stage('update') as stage:
+        FleetData.update(SIMULATION_SPEED)
+        stage.rows = NUMBER_OF_BOATS
+
+
+# Generate days of telemetry offline: same fleet model and corruption, no sleeping and no EventHub
+def fast_forward(days, output, start=None, clean=False, seed=None):
+    import numpy as np
+    from fleet_engine import FleetArrays
+    fleet = FleetArrays(NUMBER_OF_BOATS, seed=seed if seed is not None else (FLEET_SEED or 0))
+    if start is None:
+        start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None) - timedelta(days=days)
+
+    ticks = int(days * 86400 / TICK_SECONDS)
+    ticks_per_day = 86400 // TICK_SECONDS
+    writer = open_telemetry_writer(output)
+    tick_time = np.datetime64(start, 'us')
+    tick_step = np.timedelta64(TICK_SECONDS, 's')
+    rows = 0
+
+    print(f"⏩ Fast-forwarding {days} day(s) for {NUMBER_OF_BOATS} boats ({ticks} ticks) into {output}")
+    started = time.perf_counter()
     try:
-        send_events(producer)
-        time.sleep(10)
-        update_fleet()
-    except KeyboardInterrupt:
-        break
-
-# close producer
-producer.close()
-
+        for tick in range(ticks):
+            corrupted = fleet.corruption_mask()
+
+            # introduce random GPS corruption, or drop it like Stream Analytics would
+            latitude = np.where(corrupted, -10000, fleet.latitude)
+            longitude = np.where(corrupted, -10000, fleet.longitude)
+            keep = ~corrupted if clean else slice(None)
+
+            # events are enqueued at the tick and processed up to 2 seconds later
+            latency = (fleet.rng.uniform(0.1, 2.0, fleet.size) * 1e6).astype('timedelta64[us]')
+            processed = tick_time + latency
+
+            chunk = {
+                "boat_id": fleet.boat[keep],
+                "latitude": latitude[keep],
+                "longitude": longitude[keep],
+                "heading": fleet.heading[keep],
+                "speed": fleet.speed[keep],
+                "event_time": processed[keep],
+                "enqueued_time": np.full(fleet.size, tick_time)[keep],
+                "created_at": processed[keep],
+            }
+            with METRICS.stage('write') as stage:
+                writer.write(chunk)
+                stage.rows = len(chunk["boat_id"])
+            rows += len(chunk["boat_id"])
+
+            with METRICS.stage('update'):
+                fleet.update(SIMULATION_SPEED)
+            tick_time += tick_step
+
+            if (tick + 1) % ticks_per_day == 0:
+                print(f"📅 Day {(tick + 1) // ticks_per_day} done: {rows} rows")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Wrote {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    return rows
+
+
+class ParquetTelemetryWriter():
+    """Buffer fast-forward chunks and write them as Parquet row groups"""
+
+    def __init__(self, path, row_group_rows=1_000_000):
+        self.path = path
+        self.row_group_rows = row_group_rows
+        self.pending = []
+        self.pending_rows = 0
+        self.writer = None
+
+    def write(self, chunk):
+        self.pending.append(chunk)
+        self.pending_rows += len(chunk["boat_id"])
+        if self.pending_rows >= self.row_group_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        import numpy as np
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({name: np.concatenate([chunk[name] for chunk in self.pending]) for name in self.pending[0]})
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema, compression='snappy')
+        self.writer.write_table(table)
+        self.pending = []
+        self.pending_rows = 0
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class SqliteTelemetryWriter():
+    """Insert fast-forward chunks into a local boat_telemetry table"""
+
+    def __init__(self, path):
+        import local_db
+        self.local_db = local_db
+        self.conn = local_db.connect(path)
+
+    def write(self, chunk):
+        self.local_db.insert_telemetry(self.conn, chunk)
+
+    def close(self):
+        self.conn.close()
+
+
+def open_telemetry_writer(output):
+    if output.endswith('.parquet'):
+        return ParquetTelemetryWriter(output)
+    if output.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SqliteTelemetryWriter(output)
+    raise ValueError(f"Unsupported fast-forward output (use .parquet or .db): {output}")
+
+
+def load_settings():
+    """Load environment variables from azure_storage.env file (only when the simulator runs)"""
+    from dotenv import load_dotenv
+    global NAMESPACE_CONNECTION_STR, EVENTHUB_NAME
+    load_dotenv('azure_storage.env')
+    NAMESPACE_CONNECTION_STR = os.getenv('AZURE_EVENTHUB_CONNECTION_STRING')
+    EVENTHUB_NAME = os.getenv('AZURE_EVENTHUB_NAME', 'project1')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Global Sailing Race simulator")
+    parser.add_argument('--fast-forward', type=float, metavar='DAYS',
+                        help="generate DAYS of telemetry offline instead of streaming in real time")
+    parser.add_argument('--output', default='telemetry.parquet',
+                        help="fast-forward output file (.parquet or .db for SQLite)")
+    parser.add_argument('--start', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        help="first simulated day (YYYY-MM-DD, default: DAYS before today)")
+    parser.add_argument('--seed', type=int, help="random seed (default: FLEET_SEED or 0)")
+    parser.add_argument('--clean', action='store_true',
+                        help="drop corrupted GPS records, as Stream Analytics does before boat_telemetry")
+    parser.add_argument('--shards', type=int, default=SIMULATOR_SHARDS,
+                        help="split the fleet across N worker processes, each with its own sink (0 = one per core)")
+    parser.add_argument('--scheduler', choices=('sync', 'async'), default=SIMULATOR_SCHEDULER,
+                        help="async keeps a fixed tick rate and computes the next tick while sending")
+    parser.add_argument('--backpressure', choices=('block', 'coalesce', 'drop_oldest'),
+                        help="async scheduler: what to do when the sink falls behind (default: TICK_BACKPRESSURE or block)")
+    parser.add_argument('--ticks', type=int, help="stop after N ticks (default: run until Ctrl+C)")
+    parser.add_argument('--tick-seconds', type=float, default=TICK_SECONDS,
+                        help=f"seconds between two telemetry ticks (default: {TICK_SECONDS})")
+    args = parser.parse_args(argv)
+    if args.fast_forward is not None and not args.fast_forward > 0:
+        parser.error("--fast-forward: DAYS must be a positive number")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_settings()
+    METRICS.configure('simulator')
+    if args.fast_forward is not None:
+        fast_forward(args.fast_forward, args.output, start=args.start, clean=args.clean, seed=args.seed)
+        return
+
+    if TELEMETRY_SINK == 'eventhub':
+        # check if the eventhub namespace connection string has been set
+        if not NAMESPACE_CONNECTION_STR or NAMESPACE_CONNECTION_STR.startswith("REPLACE "):
+            print ("The app cannot start because you did not set the NAMESPACE_CONNECTION_STR variable. Please check the race_simulator.py file for further instructions.")
+            exit()
+
+        # check if the eventhub name has been set
+        if EVENTHUB_NAME.startswith("REPLACE "):
+            print ("The app cannot start because you did not set the EVENTHUB_NAME variable. Please check the race_simulator.py file for further instructions.")
+            exit()
+
+    # one process per shard, each with its own fleet slice and sink (see fleet_shards.py)
+    shards = args.shards or os.cpu_count()
+    if shards > 1:
+        from fleet_shards import run_sharded
+        run_sharded(shards, NUMBER_OF_BOATS, TELEMETRY_SINK, TELEMETRY_ENCODING, seed=FLEET_SEED,
+                    tick_seconds=args.tick_seconds, ticks=args.ticks, simulation_speed=SIMULATION_SPEED)
+        return
+
+    # set up the telemetry sink (an eventhub producer unless TELEMETRY_SINK says otherwise)
+    from telemetry_sinks import create_sink
+    sink = create_sink(TELEMETRY_SINK, TELEMETRY_ENCODING, asynchronous=args.scheduler == 'async')
+
+    # initialize the fleet
+    init_fleet()
+
+    # fixed-rate ticks on an event loop: simulation and sending overlap
+    if args.scheduler == 'async':
+        import tick_scheduler
+        tick_scheduler.run_scheduled(FleetData, sink, args.tick_seconds, SIMULATION_SPEED,
+                                     policy=args.backpressure or tick_scheduler.TICK_BACKPRESSURE,
+                                     ticks=args.ticks)
+        return
+
+    # send fleet telemetry every 10 seconds
+    tick = 0
+    while args.ticks is None or tick < args.ticks:
+        try:
+            send_events(sink)
+            time.sleep(args.tick_seconds)
+            update_fleet()
+            tick += 1
+        except KeyboardInterrupt:
+            break
+
+    # close sink (and its producer)
+    sink.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Historical leaderboards straight from the batch layer's daily-rankings/ Parquet files
+The advanced_grafana_queries.sql leaderboards (daily winners, 7-day leaderboard, 30-day speed
+trends, ranking evolution) computed with pyarrow datasets, without copying Parquet back into SQL.
+Files are pruned by the date in their name before anything is opened, only the needed columns
+are read, and every file is reduced as it is scanned, so months of history fit in a laptop's memory.
+Reads LOCAL_BLOB_ROOT, the local blob cache (BLOB_CACHE_MAX_MB) or Azure Blob Storage directly.
+Usage: python3 rankings_history.py winners --days 14
+       python3 rankings_history.py leaderboard --days 7
+       python3 rankings_history.py trends --days 30 --boat 0 --boat 1
+       python3 rankings_history.py export --output grafana-data
+"""
+
+import os
+import json
+import argparse
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from pipeline_metrics import METRICS
+from blob_cache import get_blob_cache
+from parquet_to_sql import RANKINGS_CONTAINER, RANKINGS_PREFIX, RANKINGS_BLOB_NAME, discover_ranking_dates
+from telemetry_dataset import dataset_filesystem
+
+# Files read at once (remote reads are I/O bound, so threads are enough)
+HISTORY_WORKERS = int(os.getenv('HISTORY_WORKERS', '8'))
+
+# Where `export` writes the Grafana JSON files
+HISTORY_EXPORT_DIR = os.getenv('HISTORY_EXPORT_DIR', 'grafana-data')
+
+# Look-back windows of the advanced_grafana_queries.sql panels, in days
+PANEL_DAYS = {'winners': 14, 'leaderboard': 7, 'trends': 30, 'evolution': 14}
+
+
+def date_window(days, end=None):
+    """[first, last] dates of the `days` days ending on `end` (today by default), like
+    `date >= DATEADD(day, -days, GETDATE())` in the SQL panels"""
+    end = end or date.today()
+    return end - timedelta(days=days - 1), end
+
+
+def ranking_files(start, end):
+    """(filesystem, [(date, path)]) of the daily rankings files in [start, end], oldest first.
+    Only file names are listed: files outside the range are never opened."""
+    cache = get_blob_cache()
+    if not os.getenv('LOCAL_BLOB_ROOT') and cache is not None:
+        # ETag-validated local copies: months of history are only downloaded once
+        from data_access import get_azure_client, with_retry
+        service = get_azure_client()
+        dates = discover_ranking_dates(start, end, service)
+
+        def fetch(day):
+            blob_path = f"{RANKINGS_PREFIX}boat_rankings_{day.strftime('%Y%m%d')}.parquet"
+            blob = service.get_blob_client(container=RANKINGS_CONTAINER, blob=blob_path)
+            return with_retry(lambda: cache.fetch(blob), 'download')
+
+        with METRICS.stage('download'):
+            with ThreadPoolExecutor(max_workers=HISTORY_WORKERS) as pool:
+                paths = list(pool.map(fetch, dates))
+        return pafs.LocalFileSystem(), list(zip(dates, paths))
+
+    filesystem, base = dataset_filesystem(RANKINGS_CONTAINER, RANKINGS_PREFIX.rstrip('/'))
+    files = []
+    for info in filesystem.get_file_info(pafs.FileSelector(base, allow_not_found=True)):
+        match = RANKINGS_BLOB_NAME.search(info.base_name)
+        if info.is_file and match:
+            day = date(int(match.group(1)[:4]), int(match.group(1)[4:6]), int(match.group(1)[6:]))
+            if start <= day <= end:
+                files.append((day, info.path))
+    return filesystem, sorted(files)
+
+
+def scan(start, end, columns, condition=None):
+    """Yield (date, table) for every day in [start, end]: the projected columns of that day's
+    file, filtered by `condition` (pushed down to the row groups)"""
+    filesystem, files = ranking_files(start, end)
+    if not files:
+        return
+    dataset = ds.dataset([path for _, path in files], filesystem=filesystem, format='parquet')
+    fragments = {fragment.path: fragment for fragment in dataset.get_fragments()}
+
+    def read(item):
+        day, path = item
+        with METRICS.stage('read_history') as stage:
+            table = fragments[path].to_table(columns=columns, filter=condition, schema=dataset.schema)
+            stage.rows = table.num_rows
+        return day, table
+
+    # a bounded window of reads in flight keeps memory flat however long the range is
+    window = 2 * HISTORY_WORKERS
+    with ThreadPoolExecutor(max_workers=HISTORY_WORKERS) as pool:
+        for offset in range(0, len(files), window):
+            yield from pool.map(read, files[offset:offset + window])
+
+
+def with_date(day, table):
+    return table.append_column('date', pa.array([day] * table.num_rows, pa.date32()))
+
+
+def collect(start, end, columns, condition=None):
+    """Every scanned day in one DataFrame with a date column (for panels that are one row per day
+    and boat anyway)"""
+    tables = [with_date(day, table) for day, table in scan(start, end, columns, condition)]
+    if not tables:
+        return pd.DataFrame(columns=['date'] + columns)
+    return pa.concat_tables(tables).to_pandas()
+
+
+def daily_winners(days=PANEL_DAYS['winners'], end=None):
+    """Rank 1 boat of each day, newest day first"""
+    start, end = date_window(days, end)
+    winners = collect(start, end, ['boat_id', 'avg_speed', 'records', 'max_speed'], ds.field('rank') == 1)
+    return winners.sort_values(['date', 'boat_id'], ascending=[False, True], ignore_index=True)
+
+
+def leaderboard(days=PANEL_DAYS['leaderboard'], end=None):
+    """Average of the daily average speeds and average daily position per boat over the window.
+    Each file is reduced to per-boat sums as it is read, so memory is bounded by the fleet size."""
+    start, end = date_window(days, end)
+    partials = None
+    for _, table in scan(start, end, ['boat_id', 'avg_speed', 'rank']):
+        table = table.group_by('boat_id').aggregate([('avg_speed', 'sum'), ('avg_speed', 'count'), ('rank', 'sum')])
+        if partials is not None:
+            table = (pa.concat_tables([partials, table])
+                     .group_by('boat_id')
+                     .aggregate([('avg_speed_sum', 'sum'), ('avg_speed_count', 'sum'), ('rank_sum', 'sum')])
+                     .rename_columns(['boat_id', 'avg_speed_sum', 'avg_speed_count', 'rank_sum']))
+        partials = table
+    if partials is None:
+        return pd.DataFrame(columns=['rank', 'boat_id', 'avg_speed', 'avg_position', 'days'])
+
+    board = pd.DataFrame({
+        'boat_id': partials['boat_id'].to_numpy(),
+        'avg_speed': pc.divide(partials['avg_speed_sum'], pc.cast(partials['avg_speed_count'], pa.float64())).to_numpy(),
+        'avg_position': pc.divide(partials['rank_sum'], pc.cast(partials['avg_speed_count'], pa.float64())).to_numpy(),
+        'days': partials['avg_speed_count'].to_numpy(),
+    }).sort_values(['avg_speed', 'boat_id'], ascending=[False, True], ignore_index=True)
+    board.insert(0, 'rank', range(1, len(board) + 1))
+    return board
+
+
+def boat_condition(boat_ids):
+    return ds.field('boat_id').isin(list(boat_ids)) if boat_ids else None
+
+
+def speed_trends(days=PANEL_DAYS['trends'], end=None, boat_ids=None):
+    """Daily average speed per boat (one row per day and boat)"""
+    start, end = date_window(days, end)
+    trends = collect(start, end, ['boat_id', 'avg_speed'], boat_condition(boat_ids))
+    return trends.sort_values(['date', 'boat_id'], ignore_index=True)
+
+
+def ranking_evolution(days=PANEL_DAYS['evolution'], end=None, boat_ids=None):
+    """Daily rank per boat (lower is better)"""
+    start, end = date_window(days, end)
+    evolution = collect(start, end, ['boat_id', 'rank'], boat_condition(boat_ids))
+    return evolution.sort_values(['date', 'boat_id'], ignore_index=True)
+
+
+def grafana_panels(end=None, boat_ids=None):
+    """The four panels with the column names of advanced_grafana_queries.sql"""
+    winners = daily_winners(end=end)
+    board = leaderboard(end=end)
+    trends = speed_trends(end=end, boat_ids=boat_ids)
+    evolution = ranking_evolution(end=end, boat_ids=boat_ids)
+    return {
+        'daily_winners': pd.DataFrame({
+            'Date': winners['date'].astype(str),
+            'Winner': 'Boat ' + winners['boat_id'].astype(str),
+            'Speed (km/h)': winners['avg_speed'].round(2),
+            'Data Points': winners['records'],
+            'Peak Speed': winners['max_speed'].round(2),
+        }),
+        'leaderboard': pd.DataFrame({
+            'Rank': board['rank'],
+            'Boat': 'Boat ' + board['boat_id'].astype(str),
+            'Avg Speed (km/h)': board['avg_speed'].round(2),
+            'Avg Position': board['avg_position'].round(1),
+        }),
+        'speed_trends': pd.DataFrame({
+            'time': trends['date'].astype(str),
+            'metric': 'Boat ' + trends['boat_id'].astype(str),
+            'Average Speed': trends['avg_speed'],
+        }),
+        'ranking_evolution': pd.DataFrame({
+            'time': evolution['date'].astype(str),
+            'metric': 'Boat ' + evolution['boat_id'].astype(str),
+            'Ranking': evolution['rank'],
+        }),
+    }
+
+
+def export(output=HISTORY_EXPORT_DIR, end=None, boat_ids=None):
+    """Write every panel as a JSON array of rows (for a Grafana JSON/Infinity datasource).
+    Files are replaced atomically, so a dashboard never reads a half-written file."""
+    os.makedirs(output, exist_ok=True)
+    paths = []
+    for name, frame in grafana_panels(end, boat_ids).items():
+        path = os.path.join(output, f"{name}.json")
+        with METRICS.stage('export') as stage:
+            with open(f"{path}.tmp", 'w') as f:
+                json.dump(frame.to_dict('records'), f)
+            os.replace(f"{path}.tmp", path)
+            stage.rows = len(frame)
+        paths.append(path)
+        print(f"📤 {path}: {len(frame)} rows")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Historical leaderboards over the daily-rankings Parquet files")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    commands = {name: subparsers.add_parser(name, help=help) for name, help in (
+        ('winners', "rank 1 boat of each day"),
+        ('leaderboard', "average speed and position per boat over the window"),
+        ('trends', "daily average speed per boat"),
+        ('evolution', "daily rank per boat"),
+        ('export', "write every panel as JSON for Grafana"),
+    )}
+    for name, command in commands.items():
+        if name in PANEL_DAYS:
+            command.add_argument('--days', type=int, default=PANEL_DAYS[name])
+        command.add_argument('--end', type=date.fromisoformat, help="last day of the window (default: today)")
+        if name in ('trends', 'evolution', 'export'):
+            command.add_argument('--boat', type=int, action='append', help="only these boats (trends, evolution)")
+    commands['export'].add_argument('--output', default=HISTORY_EXPORT_DIR)
+    args = parser.parse_args()
+
+    METRICS.configure('history')
+    if args.command == 'export':
+        export(args.output, args.end, args.boat)
+        return
+    if args.command == 'winners':
+        result = daily_winners(args.days, args.end)
+    elif args.command == 'leaderboard':
+        result = leaderboard(args.days, args.end)
+    elif args.command == 'trends':
+        result = speed_trends(args.days, args.end, args.boat)
+    else:
+        result = ranking_evolution(args.days, args.end, args.boat)
+    print(result.head(50).to_string(index=False) if not result.empty else "⚠️  No rankings files in the window")
+
+
+if __name__ == "__main__":
+    main()
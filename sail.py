@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+sail: one entry point for the pipeline scripts
+Only argparse is imported up front: each subcommand imports its module (and with it pandas, NumPy,
+pyodbc or the Azure SDK) when it runs, so `sail --help` or a typo costs tens of milliseconds, not
+seconds. Every module stays importable without side effects and runnable on its own.
+Usage: python3 sail.py simulate --fast-forward 7 --output week.parquet
+       python3 sail.py monitor --poll-seconds 5
+       python3 sail.py batch --date 2025-01-31
+       python3 sail.py sync
+       python3 sail.py backfill --from 2025-01-01 --to 2025-01-31
+       python3 benchmarks.py cli     (cold start of every subcommand)
+"""
+
+import sys
+import argparse
+import importlib
+
+# subcommand -> (module, help, arguments put in front of the user's)
+COMMANDS = {
+    'simulate': ('race_simulator', "stream (or fast-forward) simulated boat telemetry", []),
+    'monitor': ('monitor_data', "watch telemetry arriving in the SQL Database", []),
+    'batch': ('batch_cli', "compute a day's rankings and store them as Parquet", []),
+    'sync': ('parquet_to_sql', "load the recent daily rankings into SQL for Grafana", []),
+    'backfill': ('parquet_to_sql', "load every daily rankings file (or --from/--to) into SQL", ['--backfill']),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sail', description="Global Sailing Race pipeline",
+                                     epilog="Run 'sail <command> --help' for the options of a command.")
+    subparsers = parser.add_subparsers(dest='command', metavar='command', required=True)
+    for name, (_, help, _) in COMMANDS.items():
+        # the subcommand's own parser handles its options (and --help) once its module is loaded
+        subparsers.add_parser(name, help=help, add_help=False)
+    args, rest = parser.parse_known_args(argv)
+
+    module_name, _, prefix = COMMANDS[args.command]
+    module = importlib.import_module(module_name)
+    # usage and error messages read `sail <command> ...`
+    sys.argv[0] = f"sail {args.command}"
+    return module.main(prefix + rest)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,31 +3,33 @@
 Simple Parquet + Azure Blob Batch Processor
 Lambda Architecture study case 
 Usage source database.env && source azure_storage.env && python3 simple_parquet_batch.py
+      python3 simple_parquet_batch.py --incremental --every 300   (checkpointed micro-batches, see micro_batches.py)
 """
 
 import pandas as pd
-import pyodbc
 import os
-from datetime import date
-from azure.storage.blob import BlobServiceClient
+from datetime import date, datetime, timedelta
 from io import BytesIO
+from pipeline_metrics import METRICS
+from batch_cli import parse_args
+from data_access import get_azure_client, get_pool, run_with_connection, time_range, with_retry
+from blob_cache import get_blob_cache
+from blob_stream import write_parquet_blob
+from race_course import RaceTracker
 
-def get_db_connection():
-    """Simple database connection with extended timeout"""
-    return pyodbc.connect(
-        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-        f"SERVER={os.getenv('SQL_SERVER')};"
-        f"DATABASE={os.getenv('SQL_DATABASE')};"
-        f"UID={os.getenv('SQL_USERNAME')};"
-        f"PWD={os.getenv('SQL_PASSWORD')};"
-        f"Encrypt=yes;TrustServerCertificate=yes;"
-        f"Connection Timeout=60;"  # Extended timeout for Azure SQL
-    )
-
-def get_azure_client():
-    """Simple Azure Blob Storage connection"""
-    conn_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
-    return BlobServiceClient.from_connection_string(conn_string)
+# Rows per fetchmany() round trip in streaming extraction mode
+EXTRACT_CHUNK_ROWS = int(os.getenv('EXTRACT_CHUNK_ROWS', '100000'))
+
+# Extraction mode: 'pandas' loads the whole day at once, 'stream' reads it in bounded chunks
+BATCH_EXTRACT_MODE = os.getenv('BATCH_EXTRACT_MODE', 'pandas')
+
+# Also write the day's raw telemetry to the partitioned dataset (telemetry_dataset.py)
+BATCH_RAW_DATASET = os.getenv('BATCH_RAW_DATASET', '0') == '1'
+
+def day_range(target_date):
+    """Half-open [midnight, next midnight) range so the event_time index can be used"""
+    start = datetime.combine(target_date, datetime.min.time())
+    return time_range(start, start + timedelta(days=1))
 
 def extract_daily_data(target_date=None):
     """Extract boat data from SQL Database (Speed Layer source)"""
@@ -36,52 +38,197 @@ def extract_daily_data(target_date=None):
     
     print(f"📊 Extracting boat data for {target_date}")
     
-    # Retry logic for connection issues
-    max_retries = 3
-    for attempt in range(max_retries):
+    query = """
+    SELECT boat_id, speed, latitude, longitude, event_time
+    FROM boat_telemetry 
+    WHERE event_time >= ? AND event_time < ?
+      AND speed IS NOT NULL
+    ORDER BY boat_id, event_time
+    """
+    
+    def extract(conn):
+        with METRICS.stage('extract') as stage:
+            df = pd.read_sql(query, conn, params=list(day_range(target_date)))
+            stage.rows = len(df)
+        return df
+    
+    df = run_with_connection('extract', extract)
+    print(f"✅ Extracted {len(df)} records")
+    return df
+
+def iter_daily_batches(target_date=None, chunk_rows=EXTRACT_CHUNK_ROWS):
+    """Stream one day of boat data as Arrow record batches of at most chunk_rows rows.
+    Memory stays bounded by the chunk size, whatever the size of the day."""
+    import pyarrow as pa
+
+    if target_date is None:
+        target_date = date.today()
+
+    print(f"📊 Streaming boat data for {target_date} in chunks of {chunk_rows} rows")
+    
+    pool = get_pool()
+
+    def start_query():
+        conn = pool.acquire()
         try:
-            conn = get_db_connection()
-            query = """
-            SELECT boat_id, speed, latitude, longitude, event_time
-            FROM boat_telemetry 
-            WHERE CAST(event_time AS DATE) = ?
-              AND speed IS NOT NULL
-            ORDER BY boat_id, event_time
-            """
-            
-            df = pd.read_sql(query, conn, params=[target_date])
-            conn.close()
-            
-            print(f"✅ Extracted {len(df)} records")
-            return df
-            
-        except Exception as e:
-            print(f"⚠️  Attempt {attempt + 1} failed: {e}")
-            if attempt == max_retries - 1:
-                print(f"❌ Failed after {max_retries} attempts")
-                raise
-            print("🔄 Retrying in 2 seconds...")
-            import time
-            time.sleep(2)
+            cursor = conn.cursor()
+            # in event_time order (a range scan of the event_time index) so race progress
+            # can be folded in incrementally
+            cursor.execute("""
+                SELECT boat_id, speed, latitude, longitude, event_time
+                FROM boat_telemetry 
+                WHERE event_time >= ? AND event_time < ?
+                  AND speed IS NOT NULL
+                ORDER BY event_time
+            """, day_range(target_date))
+            return conn, cursor
+        except Exception:
+            pool.release(conn, discard=True)
+            raise
+
+    # Retries only cover opening the query, before the first chunk has been handed out
+    conn, cursor = with_retry(start_query, 'extract')
+
+    names = ['boat_id', 'speed', 'latitude', 'longitude', 'event_time']
+    # event_time: datetimes from SQL Server, text from the SQLite stand-in
+    types = [pa.int64(), pa.float64(), pa.float64(), pa.float64(), None]
+    total = 0
+    try:
+        while True:
+            with METRICS.stage('extract') as stage:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                batch = pa.RecordBatch.from_arrays(
+                    [pa.array(column, type=type_) for column, type_ in zip(zip(*rows), types)],
+                    names=names
+                )
+                stage.rows = batch.num_rows
+            total += batch.num_rows
+            yield batch
+    finally:
+        cursor.close()
+        pool.release(conn)
+
+    print(f"✅ Extracted {total} records")
+
+class RankingAccumulator():
+    """Per-boat running sums, counts and maxima; rankings can be produced at any point"""
+
+    TOTAL_COLUMNS = ['sum_speed', 'max_speed', 'records', 'sum_lat', 'sum_lng']
+
+    def __init__(self):
+        self.totals = None
+        self.race = RaceTracker()
+
+    def add(self, batch):
+        """Fold a chunk of rows (Arrow batch or DataFrame with boat_id/speed/latitude/longitude) in.
+        With an event_time column the boats' race progress is tracked as well."""
+        df = batch.to_pandas() if hasattr(batch, 'to_pandas') else batch
+        if 'event_time' in df:
+            self.race.update_frame(df.dropna(subset=['latitude', 'longitude']))
+        partial = df.groupby('boat_id').agg(
+            sum_speed=('speed', 'sum'),
+            max_speed=('speed', 'max'),
+            records=('speed', 'count'),
+            sum_lat=('latitude', 'sum'),
+            sum_lng=('longitude', 'sum'),
+        )
+        if self.totals is not None:
+            partial = pd.concat([self.totals, partial]).groupby(level=0).agg({
+                'sum_speed': 'sum', 'max_speed': 'max', 'records': 'sum', 'sum_lat': 'sum', 'sum_lng': 'sum'
+            })
+        self.totals = partial
+
+    def rankings(self):
+        """Rankings in the same layout as compute_boat_rankings()"""
+        if self.totals is None:
+            return pd.DataFrame(columns=['boat_id', 'avg_speed', 'max_speed', 'records', 'avg_lat', 'avg_lng', 'rank'])
+        totals = self.totals
+        rankings = pd.DataFrame({
+            'avg_speed': totals['sum_speed'] / totals['records'],
+            'max_speed': totals['max_speed'],
+            'records': totals['records'],
+            'avg_lat': totals['sum_lat'] / totals['records'],
+            'avg_lng': totals['sum_lng'] / totals['records'],
+        }).round(2)
+        rankings = rank_boats(rankings.reset_index())
+        if self.race.updates:
+            rankings = add_race_progress(rankings, self.race)
+        return rankings
+
+    def state(self):
+        """Running totals and race progress as one row per boat (from_state() takes it back), so
+        the aggregation can be carried from one run to the next"""
+        if self.totals is None:
+            return pd.DataFrame(columns=['boat_id'] + self.TOTAL_COLUMNS)
+        race = self.race.state()
+        race.columns = ['boat_id'] + [f"race_{name}" for name in race.columns[1:]]
+        # every boat with a position also has totals
+        return self.totals.reset_index().merge(race, on='boat_id', how='left')
+
+    @classmethod
+    def from_state(cls, state):
+        """Accumulator continuing from a state() DataFrame"""
+        accumulator = cls()
+        if len(state) == 0:
+            return accumulator
+        accumulator.totals = state.set_index('boat_id')[cls.TOTAL_COLUMNS]
+        race_columns = [name for name in state.columns if name.startswith('race_')]
+        if race_columns:
+            race = state.dropna(subset=['race_event_time'])[['boat_id'] + race_columns]
+            accumulator.race.restore(race.rename(columns=lambda name: name.removeprefix('race_')))
+        return accumulator
+
+def add_race_progress(rankings, race):
+    """Add the day's distance sailed, the distance to finish and the race rank from a RaceTracker"""
+    progress = race.leaderboard()[['boat_id', 'distance_km', 'distance_to_finish_km', 'race_rank']]
+    rankings = rankings.merge(progress.round(2), on='boat_id', how='left')
+    return rankings.sort_values('rank', kind='stable', ignore_index=True)
+
+def rank_boats(rankings):
+    """Add the dense rank on average speed and sort by it"""
+    rankings['rank'] = rankings['avg_speed'].rank(ascending=False, method='dense')
+    return rankings.sort_values('rank')
+
+def compute_boat_rankings_streaming(batches):
+    """Compute daily boat rankings incrementally from a stream of batches (bounded memory)"""
+    print("🔢 Computing boat rankings incrementally...")
+    accumulator = RankingAccumulator()
+    rows = 0
+    for batch in batches:
+        with METRICS.stage('compute') as stage:
+            accumulator.add(batch)
+            stage.rows = batch.num_rows if hasattr(batch, 'num_rows') else len(batch)
+        rows += stage.rows
+    rankings = accumulator.rankings()
+    print(f"✅ Computed rankings for {len(rankings)} boats from {rows} records")
+    return rankings
 
 def compute_boat_rankings(df):
     """Compute daily boat rankings (Batch Layer processing)"""
     print("🔢 Computing boat rankings...")
     
-    # Simple aggregation by boat
-    rankings = df.groupby('boat_id').agg({
-        'speed': ['mean', 'max', 'count'],
-        'latitude': 'mean',
-        'longitude': 'mean'
-    }).round(2)
-    
-    # Flatten column names
-    rankings.columns = ['avg_speed', 'max_speed', 'records', 'avg_lat', 'avg_lng']
-    rankings = rankings.reset_index()
-    
-    # Add ranking
-    rankings['rank'] = rankings['avg_speed'].rank(ascending=False, method='dense')
-    rankings = rankings.sort_values('rank')
+    with METRICS.stage('compute') as stage:
+        # Simple aggregation by boat
+        rankings = df.groupby('boat_id').agg({
+            'speed': ['mean', 'max', 'count'],
+            'latitude': 'mean',
+            'longitude': 'mean'
+        }).round(2)
+        
+        # Flatten column names
+        rankings.columns = ['avg_speed', 'max_speed', 'records', 'avg_lat', 'avg_lng']
+        rankings = rankings.reset_index()
+        
+        # Add ranking
+        rankings = rank_boats(rankings)
+        
+        # Race progress: great-circle distance sailed today and distance to finish
+        race = RaceTracker()
+        race.update_frame(df.dropna(subset=['latitude', 'longitude']))
+        rankings = add_race_progress(rankings, race)
+        stage.rows = len(df)
     
     print(f"✅ Computed rankings for {len(rankings)} boats")
     return rankings
@@ -98,15 +245,11 @@ def save_to_azure_blob(df, target_date=None):
     blob_path = f"daily-rankings/{filename}"
     
     try:
-        # Convert to Parquet in memory
-        parquet_buffer = BytesIO()
-        df.to_parquet(parquet_buffer, compression='snappy')
-        parquet_buffer.seek(0)
-        
-        # Upload to Azure
-        blob_client = get_azure_client()
-        blob = blob_client.get_blob_client(container='parquet-data', blob=blob_path)
-        blob.upload_blob(parquet_buffer.getvalue(), overwrite=True)
+        # Encode row group by row group and upload as staged blocks while encoding continues;
+        # the blob is committed (and becomes visible) only once the whole file is written
+        with METRICS.stage('save') as stage:
+            blob = get_azure_client().get_blob_client(container='parquet-data', blob=blob_path)
+            stage.rows, stage.bytes = write_parquet_blob(df, blob)
         
         print(f"✅ Saved: {blob_path}")
         return blob_path
@@ -124,12 +267,21 @@ def load_from_azure_blob(target_date=None):
     blob_path = f"daily-rankings/{filename}"
     
     try:
-        blob_client = get_azure_client()
-        blob = blob_client.get_blob_client(container='parquet-data', blob=blob_path)
+        blob = get_azure_client().get_blob_client(container='parquet-data', blob=blob_path)
         
-        # Download and load
-        parquet_data = blob.download_blob().readall()
-        df = pd.read_parquet(BytesIO(parquet_data))
+        cache = get_blob_cache()
+        if cache is not None:
+            # ETag-validated local copy: unchanged files are not downloaded again
+            df = cache.read_parquet(blob)
+        else:
+            # Download and load
+            with METRICS.stage('download') as stage:
+                parquet_data = with_retry(lambda: blob.download_blob().readall(), 'download')
+                stage.bytes = len(parquet_data)
+            with METRICS.stage('decode') as stage:
+                df = pd.read_parquet(BytesIO(parquet_data))
+                stage.rows = len(df)
+                stage.bytes = len(parquet_data)
         
         print(f"☁️  Loaded: {blob_path}")
         return df
@@ -154,33 +306,79 @@ def show_rankings(rankings):
         
         print(f"{rank:<6} {boat_id:<6} {avg_speed:<12.2f} {max_speed:<12.2f} {records:<8}")
 
-def main():
+def show_race_leaderboard(rankings):
+    """Display the race leaderboard: boats closest to the finish first"""
+    if 'race_rank' not in rankings:
+        return
+    print("\n🧭 RACE LEADERBOARD (distance to finish)")
+    print("=" * 60)
+    print(f"{'Pos':<6} {'Boat':<6} {'To finish km':<14} {'Sailed today km':<16}")
+    print("-" * 60)
+    
+    for _, boat in rankings.sort_values('race_rank').head(10).iterrows():
+        print(f"{int(boat['race_rank']):<6} {int(boat['boat_id']):<6} "
+              f"{boat['distance_to_finish_km']:<14.1f} {boat['distance_km']:<16.1f}")
+
+def main(argv=None):
     """Simple Lambda Architecture Batch Processing Pipeline"""
+    run(parse_args(argv))
+
+def run(args):
+    """Run the batch for parsed batch_cli arguments"""
+    target_date = args.date or date.today()
     print("⛵ Simple Parquet + Azure Blob Lambda Architecture")
     print("=" * 55)
+    METRICS.configure('batch')
     
     try:
-        # Step 1: Extract (from Speed Layer SQL Database)
-        data = extract_daily_data()
-        
-        if data.empty:
-            print("❌ No data to process")
+        if args.incremental or args.rebuild:
+            # Checkpointed micro-batches: only the rows added since the last run
+            import micro_batches
+            if args.every:
+                micro_batches.run_every(args.every, show=show_rankings)
+                return
+            refresh = micro_batches.rebuild if args.rebuild else micro_batches.run_incremental
+            rankings = refresh(target_date)
+            if rankings is not None:
+                show_rankings(rankings)
+                show_race_leaderboard(rankings)
             return
-        
-        # Step 2: Transform (Batch Layer analytics)
-        rankings = compute_boat_rankings(data)
+
+        if BATCH_EXTRACT_MODE == 'stream':
+            # Steps 1+2: Extract in bounded chunks and aggregate as they arrive
+            rankings = compute_boat_rankings_streaming(iter_daily_batches(target_date))
+            
+            if rankings.empty:
+                print("❌ No data to process")
+                return
+        else:
+            # Step 1: Extract (from Speed Layer SQL Database)
+            data = extract_daily_data(target_date)
+            
+            if data.empty:
+                print("❌ No data to process")
+                return
+            
+            # Step 2: Transform (Batch Layer analytics)
+            rankings = compute_boat_rankings(data)
         
         # Step 3: Load (Batch Layer storage - Azure Blob + Parquet)
-        blob_path = save_to_azure_blob(rankings)
+        blob_path = save_to_azure_blob(rankings, target_date)
         
         if blob_path:
             # Step 4: Serve (Serving Layer preview)
             show_rankings(rankings)
+            show_race_leaderboard(rankings)
             
             print(f"\n✅ Batch processing complete!")
             print(f"📁 Data stored in Azure: {blob_path}")
             print(f"📊 Format: Compressed Parquet (industry standard)")
             
+            if BATCH_RAW_DATASET:
+                # Step 5: Keep the raw telemetry in the batch layer (date=/hour= Parquet dataset)
+                from telemetry_dataset import export_day
+                export_day(target_date)
+            
         else:
             print("❌ Failed to save to Azure Blob Storage")
             
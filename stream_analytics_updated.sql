@@ -7,6 +7,8 @@ This query:
 2. Validates GPS coordinates are within valid ranges
 3. Ensures all required fields are present
 4. Outputs clean data to Azure SQL Database
+5. Uses the simulated tick time (timestamp, sent by the async tick scheduler) as event_time,
+   falling back to EventProcessedUtcTime for events that do not carry it
 */
 
 SELECT
@@ -15,7 +17,7 @@ SELECT
     TRY_CAST(longitude as float) as longitude,
     TRY_CAST(heading as float) as heading,
     TRY_CAST(speed as float) as speed,
-    TRY_CAST(EventProcessedUtcTime as datetime) as event_time,
+    COALESCE(TRY_CAST([timestamp] as datetime), TRY_CAST(EventProcessedUtcTime as datetime)) as event_time,
     TRY_CAST(EventEnqueuedUtcTime as datetime) as enqueued_time
 INTO
     [boat-telemetry-sql]  -- This will be your new SQL Database output
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Local speed-layer stage mirroring stream_analytics_updated.sql
+Validates incoming boat events in vectorized batches with the same rules as the Stream Analytics
+query, routes rejects to a dead-letter JSONL file with a reason code, writes clean rows into a
+local boat_telemetry table and keeps tumbling-window per-boat aggregates (boat_telemetry_windows).
+Usage: python3 stream_validator.py --input "telemetry/boats-*.jsonl" --database boats.db
+       python3 stream_validator.py --fake-hub 60 --boats 1000 --encoding packed
+       python3 stream_validator.py --check-parity
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import local_db
+from pipeline_metrics import METRICS
+
+# Reason codes, in the order the WHERE clause of stream_analytics_updated.sql checks them
+REASON_CODES = (
+    'missing_boat',            # boat is not null
+    'missing_position',        # latitude / longitude are not null
+    'corrupted_gps',           # latitude / longitude != -10000.0
+    'latitude_out_of_range',   # latitude between -90 and 90
+    'longitude_out_of_range',  # longitude between -180 and 180
+    'invalid_speed',           # speed between 0 and 50
+    'missing_timestamp',       # EventProcessedUtcTime / EventEnqueuedUtcTime are not null
+)
+
+CORRUPTED_GPS = -10000.0
+MAX_SPEED = 50.0
+
+# Tumbling window length for the per-boat aggregates
+WINDOW_SECONDS = int(os.getenv('WINDOW_SECONDS', '60'))
+
+CHUNK_SIZE = 100_000
+
+# The query whose WHERE clause validate() must agree with (see check_parity)
+STREAM_ANALYTICS_QUERY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stream_analytics_updated.sql')
+
+
+def to_numeric(values):
+    """TRY_CAST(x as float): anything that is not a number becomes NaN"""
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'iuf':
+        return pd.Series(values, dtype='float64')
+    return pd.to_numeric(pd.Series(values), errors='coerce').astype('float64')
+
+
+def to_timestamp(values, count):
+    """TRY_CAST(x as datetime) to naive UTC; a missing column means all nulls"""
+    if values is None:
+        return pd.Series(pd.NaT, index=range(count), dtype='datetime64[us]')
+    stamps = pd.to_datetime(pd.Series(values), errors='coerce', utc=True, format='ISO8601')
+    return stamps.dt.tz_convert(None).astype('datetime64[us]')
+
+
+def validate(columns, processed_time=None):
+    """Apply the Stream Analytics filter to a chunk of event columns.
+    Returns (clean rows in boat_telemetry layout, reason code per event or None)."""
+    count = len(columns['boat'])
+    if processed_time is None:
+        processed_time = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    boat = to_numeric(columns['boat'])
+    latitude = to_numeric(columns['latitude'])
+    longitude = to_numeric(columns['longitude'])
+    heading = to_numeric(columns['heading']) if 'heading' in columns else pd.Series(np.nan, index=range(count))
+    speed = to_numeric(columns['speed'])
+    enqueued = to_timestamp(columns.get('EventEnqueuedUtcTime'), count)
+    if 'EventProcessedUtcTime' in columns:
+        processed = to_timestamp(columns['EventProcessedUtcTime'], count)
+    else:
+        processed = pd.Series(np.datetime64(processed_time, 'us'), index=range(count))
+    # event_time: the simulated tick time when the sender stamps it (tick_scheduler.py), as the
+    # COALESCE in the query does; otherwise the processing time
+    if 'timestamp' in columns:
+        event_time = to_timestamp(columns['timestamp'], count).fillna(processed)
+    else:
+        event_time = processed
+
+    failures = (
+        boat.isna(),
+        latitude.isna() | longitude.isna(),
+        (latitude == CORRUPTED_GPS) | (longitude == CORRUPTED_GPS),
+        (latitude < -90.0) | (latitude > 90.0),
+        (longitude < -180.0) | (longitude > 180.0),
+        ~((speed >= 0.0) & (speed <= MAX_SPEED)),
+        enqueued.isna() | processed.isna(),
+    )
+
+    # first failing rule wins; 0 means the event is clean
+    codes = np.zeros(count, dtype=np.int8)
+    for code, failed in enumerate(failures, start=1):
+        codes[(codes == 0) & failed.to_numpy()] = code
+
+    keep = codes == 0
+    clean = pd.DataFrame({
+        'boat_id': boat[keep].astype('int64').to_numpy(),
+        'latitude': latitude[keep].to_numpy(),
+        'longitude': longitude[keep].to_numpy(),
+        'heading': heading[keep].to_numpy(),
+        'speed': speed[keep].to_numpy(),
+        'event_time': event_time[keep].to_numpy(),
+        'enqueued_time': enqueued[keep].to_numpy(),
+    })
+    reasons = np.array((None,) + REASON_CODES, dtype=object)[codes]
+    return clean, reasons
+
+
+def sql_where_clause(path=STREAM_ANALYTICS_QUERY):
+    """The WHERE clause of the Stream Analytics query, without its comments"""
+    with open(path) as f:
+        query = f.read()
+    query = re.sub(r'/\*.*?\*/', ' ', query, flags=re.S)
+    query = re.sub(r'--[^\n]*', ' ', query)
+    return ' '.join(re.split(r'\bWHERE\b', query, maxsplit=1, flags=re.I)[1].split())
+
+
+def try_float(value):
+    """TRY_CAST(x as float) for one value: None when it is not a number"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+def try_datetime(value):
+    """TRY_CAST(x as datetime) for one value, as ISO 8601 text (None when it is not a time)"""
+    if value is None:
+        return None
+    try:
+        return pd.to_datetime(value, utc=True, format='ISO8601').isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def passes_sql_filter(records, path=STREAM_ANALYTICS_QUERY):
+    """Run the WHERE clause of stream_analytics_updated.sql itself (in an in-memory SQLite database,
+    with SQL NULL semantics) over the records' fields cast as TRY_CAST would. Returns one bool per
+    record; used to prove parity of validate()."""
+    processed_time = datetime.now(timezone.utc).isoformat()
+    conn = sqlite3.connect(':memory:')
+    conn.execute("""
+        CREATE TABLE events (position INTEGER PRIMARY KEY, boat REAL, latitude REAL, longitude REAL,
+                             heading REAL, speed REAL, EventProcessedUtcTime TEXT, EventEnqueuedUtcTime TEXT)
+    """)
+    conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+        (position, try_float(record.get('boat')), try_float(record.get('latitude')),
+         try_float(record.get('longitude')), try_float(record.get('heading')), try_float(record.get('speed')),
+         # Stream Analytics stamps EventProcessedUtcTime itself; only an explicit value can be invalid
+         try_datetime(record.get('EventProcessedUtcTime', processed_time)),
+         try_datetime(record.get('EventEnqueuedUtcTime')))
+        for position, record in enumerate(records)))
+    passed = np.zeros(len(records), dtype=bool)
+    passed[[row[0] for row in conn.execute(f"SELECT position FROM events WHERE {sql_where_clause(path)}")]] = True
+    conn.close()
+    return passed
+
+
+class TumblingWindows():
+    """Per-boat tumbling-window aggregates on enqueued time, emitted once the stream passes a window"""
+
+    def __init__(self, seconds=WINDOW_SECONDS):
+        self.seconds = seconds
+        self.state = None
+        self.watermark = None
+
+    def add(self, clean):
+        if clean.empty:
+            return
+        window_start = clean['enqueued_time'].dt.floor(f'{self.seconds}s')
+        partial = clean.assign(window_start=window_start).groupby(['window_start', 'boat_id']).agg(
+            records=('speed', 'size'),
+            sum_speed=('speed', 'sum'),
+            max_speed=('speed', 'max'),
+            sum_lat=('latitude', 'sum'),
+            sum_lng=('longitude', 'sum'),
+        )
+        if self.state is not None:
+            partial = pd.concat([self.state, partial]).groupby(level=[0, 1]).agg({
+                'records': 'sum', 'sum_speed': 'sum', 'max_speed': 'max', 'sum_lat': 'sum', 'sum_lng': 'sum'
+            })
+        self.state = partial
+
+        newest = clean['enqueued_time'].max()
+        self.watermark = newest if self.watermark is None else max(self.watermark, newest)
+
+    def emit(self, flush=False):
+        """Return the closed windows (all windows when flush=True) and forget them"""
+        if self.state is None or self.state.empty:
+            return pd.DataFrame()
+        window_starts = self.state.index.get_level_values('window_start')
+        window_length = pd.Timedelta(seconds=self.seconds)
+        closed = np.ones(len(self.state), dtype=bool) if flush else (window_starts + window_length <= self.watermark)
+
+        done = self.state[closed].reset_index()
+        self.state = self.state[~closed]
+        return pd.DataFrame({
+            'window_start': done['window_start'],
+            'window_end': done['window_start'] + window_length,
+            'boat_id': done['boat_id'],
+            'records': done['records'],
+            'avg_speed': done['sum_speed'] / done['records'],
+            'max_speed': done['max_speed'],
+            'avg_lat': done['sum_lat'] / done['records'],
+            'avg_lng': done['sum_lng'] / done['records'],
+        })
+
+
+class StreamValidator():
+    """Validate event chunks, dead-letter rejects and load clean rows into local SQLite"""
+
+    def __init__(self, database, dead_letter_path='dead_letter.jsonl', window_seconds=WINDOW_SECONDS):
+        self.conn = local_db.connect(database)
+        self.dead_letter = open(dead_letter_path, 'a')
+        self.windows = TumblingWindows(window_seconds)
+        self.accepted = 0
+        self.rejected = {code: 0 for code in REASON_CODES}
+
+    def process(self, columns):
+        with METRICS.stage('validate') as stage:
+            clean, reasons = validate(columns)
+            stage.rows = len(reasons)
+
+        self._dead_letter(columns, reasons)
+
+        with METRICS.stage('insert') as stage:
+            clean['created_at'] = np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), 'us')
+            local_db.insert_telemetry(self.conn, {name: clean[name].to_numpy() for name in clean.columns})
+            stage.rows = len(clean)
+        self.accepted += len(clean)
+
+        with METRICS.stage('window'):
+            self.windows.add(clean)
+            self._write_windows(self.windows.emit())
+
+    def _dead_letter(self, columns, reasons):
+        rejected = np.flatnonzero(reasons != None)  # noqa: E711 - element-wise comparison
+        if len(rejected) == 0:
+            return
+        names = list(columns)
+        values = {name: np.asarray(columns[name], dtype=object)[rejected] for name in names}
+        for i, index in enumerate(rejected):
+            reason = reasons[index]
+            self.rejected[reason] += 1
+            record = {name: _json_value(values[name][i]) for name in names}
+            record['reason'] = reason
+            self.dead_letter.write(json.dumps(record) + "\n")
+
+    def _write_windows(self, windows):
+        if not windows.empty:
+            local_db.upsert_windows(self.conn, windows)
+
+    def close(self):
+        self._write_windows(self.windows.emit(flush=True))
+        self.dead_letter.close()
+        self.conn.close()
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return value.isoformat()
+    return value
+
+
+def read_jsonl(path, chunk_size=CHUNK_SIZE):
+    """Yield column chunks from a JSONL telemetry capture.
+    Uses pyarrow's streaming JSON reader; falls back to json.loads for files with mixed value types."""
+    yielded = 0
+    try:
+        import pyarrow as pa
+        import pyarrow.json as pj
+    except ImportError:
+        pa = None
+    if pa is not None:
+        try:
+            reader = pj.open_json(
+                path,
+                read_options=pj.ReadOptions(use_threads=False, block_size=8 << 20),
+                parse_options=pj.ParseOptions(explicit_schema=pa.schema([
+                    ('EventEnqueuedUtcTime', pa.timestamp('us', tz='UTC')),
+                ])),
+            )
+            for block in reader:
+                # a block holds as many rows as fit in block_size bytes: re-slice to chunk_size rows
+                for offset in range(0, block.num_rows, chunk_size):
+                    batch = block.slice(offset, chunk_size)
+                    yield {name: batch.column(name).to_numpy(zero_copy_only=False) for name in batch.schema.names}
+                    yielded += batch.num_rows
+            return
+        except pa.ArrowInvalid:
+            pass
+
+    fields = ('boat', 'latitude', 'longitude', 'heading', 'speed', 'timestamp', 'EventProcessedUtcTime',
+              'EventEnqueuedUtcTime')
+    with open(path) as f:
+        for _ in range(yielded):
+            f.readline()
+        while True:
+            lines = [line for line in (f.readline() for _ in range(chunk_size)) if line.strip()]
+            if not lines:
+                return
+            records = json.loads('[' + ','.join(lines) + ']')
+            columns = {name: [record.get(name) for record in records] for name in fields}
+            for name in ('timestamp', 'EventProcessedUtcTime'):
+                if all(value is None for value in columns[name]):
+                    del columns[name]
+            yield columns
+
+
+def read_parquet_capture(path, chunk_size=CHUNK_SIZE):
+    """Yield column chunks from a Parquet telemetry capture (FileSink with file_format='parquet')"""
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield {name: batch.column(name).to_numpy(zero_copy_only=False) for name in batch.schema.names}
+
+
+def read_capture(path, chunk_size=CHUNK_SIZE):
+    """Column chunks of a FileSink capture, JSONL or Parquet by extension"""
+    if path.endswith('.parquet'):
+        return read_parquet_capture(path, chunk_size)
+    return read_jsonl(path, chunk_size)
+
+
+def read_events(sink):
+    """Drain a FakeEventHubSink and decode its events (json or packed) into columns"""
+    from wire_format import decode_events
+    columns = decode_events(sink.drain())
+    if columns:
+        yield columns
+
+
+def simulate_events(boats, ticks, encoding='json', seed=None):
+    """Yield the columns of `ticks` simulated fleet ticks, each sent through a FakeEventHubSink in
+    the given wire format and decoded again with read_events"""
+    from fleet_engine import FleetArrays, telemetry_columns
+    from telemetry_sinks import FakeEventHubSink
+    from race_simulator import SIMULATION_SPEED
+
+    fleet = FleetArrays(boats, seed=seed)
+    sink = FakeEventHubSink(retain=None, encoding=encoding)
+    for _ in range(ticks):
+        sink.send(telemetry_columns(fleet))
+        yield from read_events(sink)
+        fleet.update(SIMULATION_SPEED)
+
+
+def parity_records(count=50_000, seed=7):
+    """Every edge case of the SQL filter (sentinel, range bounds, nulls, bad casts) plus random events"""
+    rng = np.random.default_rng(seed)
+    enqueued = datetime.now(timezone.utc).isoformat()
+    records = [
+        {'boat': None, 'latitude': 1.0, 'longitude': 1.0, 'speed': 1.0, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 'x', 'latitude': 1.0, 'longitude': 1.0, 'speed': 1.0, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': None, 'longitude': 1.0, 'speed': 1.0, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': -10000, 'longitude': -10000, 'speed': 1.0, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': 90.0, 'longitude': -180.0, 'speed': 0.0, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': 90.0001, 'longitude': 0.0, 'speed': 50.0, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': 0.0, 'longitude': 180.5, 'speed': 1.0, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': 0.0, 'longitude': 0.0, 'speed': 50.01, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': 0.0, 'longitude': 0.0, 'speed': -0.1, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': 0.0, 'longitude': 0.0, 'speed': None, 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': 0.0, 'longitude': 0.0, 'speed': '12.5', 'EventEnqueuedUtcTime': enqueued},
+        {'boat': 1, 'latitude': 0.0, 'longitude': 0.0, 'speed': 1.0, 'EventEnqueuedUtcTime': None},
+        {'boat': 1, 'latitude': 0.0, 'longitude': 0.0, 'speed': 1.0, 'EventEnqueuedUtcTime': 'not a date'},
+    ]
+    for _ in range(count):
+        corrupted = rng.random() < 0.01
+        records.append({
+            'boat': int(rng.integers(0, 1000)),
+            'latitude': -10000 if corrupted else float(rng.uniform(-120, 120)),
+            'longitude': -10000 if corrupted else float(rng.uniform(-200, 200)),
+            'heading': float(rng.uniform(0, 360)),
+            'speed': float(rng.uniform(-5, 60)),
+            'EventEnqueuedUtcTime': enqueued,
+        })
+    return records
+
+
+def check_parity(count=50_000, seed=7):
+    """Compare validate() with the query's own WHERE clause on random events plus every edge case"""
+    records = parity_records(count, seed)
+    fields = ('boat', 'latitude', 'longitude', 'heading', 'speed', 'EventEnqueuedUtcTime')
+    columns = {name: [record.get(name) for record in records] for name in fields}
+    _, reasons = validate(columns)
+    expected = passes_sql_filter(records)
+    actual = reasons == None  # noqa: E711 - element-wise comparison
+    mismatches = np.flatnonzero(expected != actual)
+    if len(mismatches):
+        print(f"❌ Parity check failed for {len(mismatches)} of {len(records)} events, e.g. {records[mismatches[0]]}")
+        return False
+    print(f"✅ validate() matches the Stream Analytics filter on {len(records)} events "
+          f"({int(actual.sum())} clean, {len(records) - int(actual.sum())} rejected)")
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Validate boat telemetry locally like Stream Analytics")
+    parser.add_argument('--input', nargs='*', default=[], help="JSONL or Parquet capture files or globs")
+    parser.add_argument('--fake-hub', type=int, metavar='TICKS',
+                        help="validate TICKS simulated ticks sent through an in-process Event Hub instead")
+    parser.add_argument('--boats', type=int, default=1000, help="with --fake-hub: fleet size")
+    parser.add_argument('--encoding', choices=('json', 'packed'), default='json', help="with --fake-hub: wire format")
+    parser.add_argument('--database', default=os.getenv('SQLITE_DATABASE', 'boats.db'), help="local SQLite database")
+    parser.add_argument('--dead-letter', default='dead_letter.jsonl', help="file for rejected events")
+    parser.add_argument('--window-seconds', type=int, default=WINDOW_SECONDS, help="tumbling window length")
+    parser.add_argument('--check-parity', action='store_true', help="compare with the SQL filter and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.check_parity:
+        sys.exit(0 if check_parity() else 1)
+
+    if args.fake_hub:
+        sources = [simulate_events(args.boats, args.fake_hub, args.encoding)]
+    else:
+        paths = sorted(path for pattern in args.input for path in glob.glob(pattern))
+        if not paths:
+            print("❌ No input files found (use --input telemetry/boats-*.jsonl, or --fake-hub 10)")
+            return
+        sources = [read_capture(path) for path in paths]
+
+    METRICS.configure('stream')
+    validator = StreamValidator(args.database, args.dead_letter, args.window_seconds)
+    started = time.perf_counter()
+    total = 0
+    try:
+        for source in sources:
+            for columns in source:
+                validator.process(columns)
+                total += len(columns['boat'])
+    finally:
+        validator.close()
+
+    elapsed = time.perf_counter() - started
+    rejected = sum(validator.rejected.values())
+    print(f"✅ Processed {total} events in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} events/sec)")
+    print(f"   {validator.accepted} clean rows -> boat_telemetry, {rejected} rejects -> {args.dead_letter}")
+    for code, count in validator.rejected.items():
+        if count:
+            print(f"   {code}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Raw telemetry in the batch layer: a hive-partitioned Parquet dataset (date=YYYY-MM-DD/hour=HH)
+Each hour of clean boat_telemetry is written sorted by boat_id and event_time, in row groups with
+min/max statistics, so readers skip whole partitions by time and whole row groups by boat.
+Historical track and speed questions are answered from Parquet with predicate pushdown instead of
+scanning the SQL speed layer. A compaction job merges the small files of an hour into right-sized ones.
+Usage: python3 telemetry_dataset.py export --date 2025-09-01
+       python3 telemetry_dataset.py compact --from 2025-09-01 --to 2025-09-30
+       python3 telemetry_dataset.py track --boat 3 --from 2025-09-01T10:00 --to 2025-09-01T12:00
+       python3 telemetry_dataset.py speeds --from 2025-09-01 --to 2025-09-08
+"""
+
+import os
+import uuid
+import argparse
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from pipeline_metrics import METRICS
+from data_access import run_with_connection, time_range
+
+RAW_CONTAINER = 'parquet-data'
+RAW_PREFIX = 'raw-telemetry'
+
+RAW_SCHEMA = pa.schema([
+    ('boat_id', pa.int32()),
+    ('event_time', pa.timestamp('us')),
+    ('latitude', pa.float64()),
+    ('longitude', pa.float64()),
+    ('heading', pa.float64()),
+    ('speed', pa.float64()),
+    ('enqueued_time', pa.timestamp('us')),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string()), ('hour', pa.int8())]), flavor='hive')
+
+SORT_KEYS = [('boat_id', 'ascending'), ('event_time', 'ascending')]
+
+# Rows per row group: small enough that a boat filter skips most of a file
+ROW_GROUP_ROWS = int(os.getenv('RAW_ROW_GROUP_ROWS', '65536'))
+
+# Compaction: files below this size are merged, into files of at most this many rows
+SMALL_FILE_BYTES = int(float(os.getenv('RAW_SMALL_FILE_MB', '32')) * 1024 * 1024)
+TARGET_FILE_ROWS = int(os.getenv('RAW_TARGET_FILE_ROWS', '4000000'))
+
+
+def dataset_filesystem(container=RAW_CONTAINER, prefix=RAW_PREFIX):
+    """(filesystem, base path) of a blob folder: the local blob stand-in or the Azure storage account"""
+    local_root = os.getenv('LOCAL_BLOB_ROOT')
+    if local_root:
+        return pafs.LocalFileSystem(), os.path.abspath(os.path.join(local_root, container, prefix))
+    settings = dict(part.split('=', 1) for part in os.getenv('AZURE_STORAGE_CONNECTION_STRING', '').split(';') if '=' in part)
+    filesystem = pafs.AzureFileSystem(account_name=settings.get('AccountName'), account_key=settings.get('AccountKey'))
+    return filesystem, f"{container}/{prefix}"
+
+
+def partition_path(base, hour_start):
+    return f"{base}/date={hour_start.date().isoformat()}/hour={hour_start.hour:02d}"
+
+
+def data_files(filesystem, directory):
+    """Parquet files of one partition directory (names starting with _ or . are in-progress writes)"""
+    selector = pafs.FileSelector(directory, allow_not_found=True)
+    return [info for info in filesystem.get_file_info(selector)
+            if info.is_file and info.base_name.endswith('.parquet') and not info.base_name.startswith(('_', '.'))]
+
+
+def as_table(df):
+    """boat_telemetry rows (SQL Server datetimes or SQLite text) as a RAW_SCHEMA table"""
+    for column in ('event_time', 'enqueued_time'):
+        df[column] = pd.to_datetime(df[column], format='ISO8601')
+    return pa.Table.from_pandas(df[RAW_SCHEMA.names], schema=RAW_SCHEMA, preserve_index=False)
+
+
+def write_file(filesystem, directory, table):
+    """Write one sorted Parquet file into a partition directory and return its path"""
+    filesystem.create_dir(directory, recursive=True)
+    name = f"part-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+    options = dict(row_group_size=ROW_GROUP_ROWS, compression='snappy', write_statistics=True,
+                   sorting_columns=[pq.SortingColumn(0), pq.SortingColumn(1)])
+    if isinstance(filesystem, pafs.LocalFileSystem):
+        # write under a hidden name first so readers never see a half-written file
+        temp_path = f"{directory}/_{name}"
+        pq.write_table(table, temp_path, filesystem=filesystem, **options)
+        filesystem.move(temp_path, f"{directory}/{name}")
+    else:
+        # a blob only becomes visible once its upload is committed
+        pq.write_table(table, f"{directory}/{name}", filesystem=filesystem, **options)
+    return f"{directory}/{name}"
+
+
+def write_partitions(table, replace=False):
+    """Split rows by event hour and add one sorted file to each date=/hour= partition.
+    With replace=True the partition's existing files are removed after the new file is written."""
+    filesystem, base = dataset_filesystem()
+    hours = table['event_time'].to_numpy().astype('datetime64[h]')
+    written = []
+    for hour in np.unique(hours):
+        rows = table.filter(pa.array(hours == hour)).sort_by(SORT_KEYS)
+        directory = partition_path(base, pd.Timestamp(hour).to_pydatetime())
+        old_files = data_files(filesystem, directory) if replace else []
+        with METRICS.stage('write_raw') as stage:
+            written.append(write_file(filesystem, directory, rows))
+            stage.rows = rows.num_rows
+        for info in old_files:
+            filesystem.delete_file(info.path)
+    return written
+
+
+def export_day(target_date=None):
+    """Export one day of clean boat_telemetry, an hour at a time, replacing what the dataset
+    held for those hours (reruns are idempotent and memory is bounded by one hour of rows)"""
+    if target_date is None:
+        target_date = date.today()
+    print(f"🗂️  Exporting raw telemetry for {target_date} to {RAW_PREFIX}/date={target_date.isoformat()}/")
+
+    query = """
+        SELECT boat_id, event_time, latitude, longitude, heading, speed, enqueued_time
+        FROM boat_telemetry
+        WHERE event_time >= ? AND event_time < ?
+          AND speed IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+        ORDER BY boat_id, event_time
+    """
+    start = datetime.combine(target_date, datetime.min.time())
+    total = 0
+    files = 0
+    for hour in range(24):
+        hour_start = start + timedelta(hours=hour)
+
+        def extract(conn):
+            with METRICS.stage('extract') as stage:
+                df = pd.read_sql(query, conn, params=list(time_range(hour_start, hour_start + timedelta(hours=1))))
+                stage.rows = len(df)
+            return df
+
+        df = run_with_connection('extract', extract)
+        if df.empty:
+            continue
+        files += len(write_partitions(as_table(df), replace=True))
+        total += len(df)
+
+    print(f"✅ Exported {total} rows into {files} hourly files")
+    return total
+
+
+def compact(start=None, end=None):
+    """Merge hour partitions made of several (small) files into files of up to TARGET_FILE_ROWS
+    rows, re-sorted by boat_id and event_time. New files are written before the old ones are
+    deleted, so a reader running at that moment can briefly see both."""
+    filesystem, base = dataset_filesystem()
+    merged = 0
+    removed = 0
+    for day_info in filesystem.get_file_info(pafs.FileSelector(base, allow_not_found=True)):
+        if not (day_info.type == pafs.FileType.Directory and day_info.base_name.startswith('date=')):
+            continue
+        day = date.fromisoformat(day_info.base_name[len('date='):])
+        if (start and day < start) or (end and day > end):
+            continue
+        for hour_info in filesystem.get_file_info(pafs.FileSelector(day_info.path)):
+            if hour_info.type != pafs.FileType.Directory:
+                continue
+            files = data_files(filesystem, hour_info.path)
+            small = [info for info in files if info.size < SMALL_FILE_BYTES]
+            if len(files) < 2 or len(small) < 2:
+                continue
+            with METRICS.stage('compact') as stage:
+                table = ds.dataset([info.path for info in small], filesystem=filesystem,
+                                   format='parquet', schema=RAW_SCHEMA).to_table().sort_by(SORT_KEYS)
+                for offset in range(0, table.num_rows, TARGET_FILE_ROWS):
+                    write_file(filesystem, hour_info.path, table.slice(offset, TARGET_FILE_ROWS))
+                for info in small:
+                    filesystem.delete_file(info.path)
+                stage.rows = table.num_rows
+                stage.bytes = sum(info.size for info in small)
+            merged += 1
+            removed += len(small)
+
+    print(f"✅ Compacted {merged} hour partitions ({removed} small files merged)")
+    return merged
+
+
+def open_dataset():
+    filesystem, base = dataset_filesystem()
+    return ds.dataset(base, filesystem=filesystem, format='parquet', partitioning=PARTITIONING,
+                      schema=RAW_SCHEMA.append(pa.field('date', pa.string())).append(pa.field('hour', pa.int8())))
+
+
+def time_filter(start, end):
+    """Filter for event_time in [start, end): prunes date=/hour= partitions, then row groups"""
+    last = end - timedelta(microseconds=1)
+    first_day, last_day = start.date().isoformat(), last.date().isoformat()
+    date_field, hour_field = ds.field('date'), ds.field('hour')
+    partitions = (
+        ((date_field > first_day) | ((date_field == first_day) & (hour_field >= start.hour)))
+        & ((date_field < last_day) | ((date_field == last_day) & (hour_field <= last.hour)))
+    )
+    return (partitions
+            & (ds.field('event_time') >= pa.scalar(start, pa.timestamp('us')))
+            & (ds.field('event_time') < pa.scalar(end, pa.timestamp('us'))))
+
+
+def read_track(boat_ids, start, end, columns=('boat_id', 'event_time', 'latitude', 'longitude', 'speed')):
+    """Positions of the given boats in [start, end), ordered by boat and time"""
+    with METRICS.stage('read_raw') as stage:
+        table = open_dataset().to_table(
+            columns=list(columns),
+            filter=time_filter(start, end) & ds.field('boat_id').isin(list(boat_ids))
+        ).sort_by(SORT_KEYS)
+        stage.rows = table.num_rows
+    return table.to_pandas()
+
+
+def speed_summary(start, end, boat_ids=None):
+    """Per-boat records, average and maximum speed in [start, end)"""
+    condition = time_filter(start, end)
+    if boat_ids:
+        condition = condition & ds.field('boat_id').isin(list(boat_ids))
+    with METRICS.stage('read_raw') as stage:
+        table = open_dataset().to_table(columns=['boat_id', 'speed'], filter=condition)
+        stage.rows = table.num_rows
+    summary = table.group_by('boat_id').aggregate([('speed', 'count'), ('speed', 'mean'), ('speed', 'max')])
+    return (summary.to_pandas()
+            .rename(columns={'speed_count': 'records', 'speed_mean': 'avg_speed', 'speed_max': 'max_speed'})
+            .sort_values('avg_speed', ascending=False, ignore_index=True))
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hive-partitioned raw telemetry dataset")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help="write one day of boat_telemetry into the dataset")
+    export.add_argument('--date', type=date.fromisoformat, default=date.today())
+    compaction = subparsers.add_parser('compact', help="merge small files within each hour partition")
+    compaction.add_argument('--from', dest='start', type=date.fromisoformat)
+    compaction.add_argument('--to', dest='end', type=date.fromisoformat)
+    track = subparsers.add_parser('track', help="positions of one or more boats over a time range")
+    track.add_argument('--boat', type=int, action='append', required=True)
+    speeds = subparsers.add_parser('speeds', help="per-boat speed summary over a time range")
+    for command in (track, speeds):
+        command.add_argument('--from', dest='start', type=parse_time, required=True)
+        command.add_argument('--to', dest='end', type=parse_time, required=True)
+    args = parser.parse_args()
+
+    METRICS.configure('raw_dataset')
+    if args.command == 'export':
+        export_day(args.date)
+    elif args.command == 'compact':
+        compact(args.start, args.end)
+    elif args.command == 'track':
+        print(read_track(args.boat, args.start, args.end).to_string(index=False))
+    else:
+        print(speed_summary(args.start, args.end).head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Downsampled serving tables for the Grafana time-series panels
+Maintains per-boat rollups of boat_telemetry (1-minute and 15-minute buckets: records, avg/max
+speed, last position) incrementally from a watermark, plus boat_tracks_downsampled: each boat's
+recent track reduced with LTTB (Largest-Triangle-Three-Buckets), which keeps the turns and drops
+the straight runs. Dashboard refreshes read a bounded number of buckets/points per boat however
+large boat_telemetry grows (see the rollup panels in grafana_dashboard_queries.sql).
+Usage: source database.env && python3 telemetry_rollups.py update
+       python3 telemetry_rollups.py update --every 60     (keep the rollups fresh)
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from pipeline_metrics import METRICS
+from data_access import db_connection
+from fleet_engine import KM_PER_DEGREE_LATITUDE, KM_PER_DEGREE_LONGITUDE
+from local_db import is_sqlite, format_timestamps
+from partial_aggregates import (CHUNK_ROWS, iter_watermark_chunks, read_watermark, watermark_param,
+                                write_watermark, create_partials_table)
+
+# Rollup tables and their bucket widths
+ROLLUPS = {'boat_speed_rollup_1m': '1min', 'boat_speed_rollup_15m': '15min'}
+
+WATERMARK_COLUMN = os.getenv('ROLLUP_WATERMARK_COLUMN', 'created_at')
+WATERMARK_NAME = 'boat_rollups'
+
+# Downsampled tracks: how far back, and how many points per boat
+TRACK_HOURS = int(os.getenv('TRACK_HOURS', '6'))
+TRACK_POINTS = int(os.getenv('TRACK_POINTS', '120'))
+
+SQLSERVER_ROLLUP_TABLE = """
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table}' AND xtype='U')
+CREATE TABLE {table} (
+    bucket_start DATETIME2 NOT NULL,
+    boat_id INT NOT NULL,
+    records INT NOT NULL,
+    sum_speed FLOAT NOT NULL,
+    max_speed FLOAT,
+    last_event_time DATETIME2 NOT NULL,
+    last_lat FLOAT,
+    last_lng FLOAT,
+    PRIMARY KEY (bucket_start, boat_id)
+);
+"""
+
+SQLITE_ROLLUP_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket_start TEXT NOT NULL,
+    boat_id INTEGER NOT NULL,
+    records INTEGER NOT NULL,
+    sum_speed REAL NOT NULL,
+    max_speed REAL,
+    last_event_time TEXT NOT NULL,
+    last_lat REAL,
+    last_lng REAL,
+    PRIMARY KEY (bucket_start, boat_id)
+);
+"""
+
+SQLSERVER_TRACKS_TABLE = """
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='boat_tracks_downsampled' AND xtype='U')
+CREATE TABLE boat_tracks_downsampled (
+    boat_id INT NOT NULL,
+    point INT NOT NULL,
+    event_time DATETIME2 NOT NULL,
+    latitude FLOAT,
+    longitude FLOAT,
+    PRIMARY KEY (boat_id, point)
+);
+"""
+
+SQLITE_TRACKS_TABLE = """
+CREATE TABLE IF NOT EXISTS boat_tracks_downsampled (
+    boat_id INTEGER NOT NULL,
+    point INTEGER NOT NULL,
+    event_time TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    PRIMARY KEY (boat_id, point)
+);
+"""
+
+SQLITE_UPSERT = """
+INSERT INTO {table} (bucket_start, boat_id, records, sum_speed, max_speed, last_event_time, last_lat, last_lng)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (bucket_start, boat_id) DO UPDATE SET
+    records = records + excluded.records,
+    sum_speed = sum_speed + excluded.sum_speed,
+    max_speed = MAX(max_speed, excluded.max_speed),
+    last_lat = CASE WHEN excluded.last_event_time >= last_event_time THEN excluded.last_lat ELSE last_lat END,
+    last_lng = CASE WHEN excluded.last_event_time >= last_event_time THEN excluded.last_lng ELSE last_lng END,
+    last_event_time = MAX(last_event_time, excluded.last_event_time)
+"""
+
+SQLSERVER_UPSERT = """
+MERGE {table} WITH (HOLDLOCK) AS target
+USING (SELECT ? AS bucket_start, ? AS boat_id, ? AS records, ? AS sum_speed, ? AS max_speed,
+              ? AS last_event_time, ? AS last_lat, ? AS last_lng) AS source
+ON target.bucket_start = source.bucket_start AND target.boat_id = source.boat_id
+WHEN MATCHED THEN UPDATE SET
+    records = target.records + source.records,
+    sum_speed = target.sum_speed + source.sum_speed,
+    max_speed = CASE WHEN source.max_speed > target.max_speed THEN source.max_speed ELSE target.max_speed END,
+    last_lat = CASE WHEN source.last_event_time >= target.last_event_time THEN source.last_lat ELSE target.last_lat END,
+    last_lng = CASE WHEN source.last_event_time >= target.last_event_time THEN source.last_lng ELSE target.last_lng END,
+    last_event_time = CASE WHEN source.last_event_time > target.last_event_time
+                           THEN source.last_event_time ELSE target.last_event_time END
+WHEN NOT MATCHED THEN INSERT (bucket_start, boat_id, records, sum_speed, max_speed, last_event_time, last_lat, last_lng)
+    VALUES (source.bucket_start, source.boat_id, source.records, source.sum_speed, source.max_speed,
+            source.last_event_time, source.last_lat, source.last_lng);
+"""
+
+
+def create_rollup_tables(conn):
+    create_partials_table(conn)  # boat_partials_state holds the rollup watermark too
+    if is_sqlite(conn):
+        conn.executescript(''.join(SQLITE_ROLLUP_TABLE.format(table=table) for table in ROLLUPS) + SQLITE_TRACKS_TABLE)
+    else:
+        cursor = conn.cursor()
+        for table in ROLLUPS:
+            cursor.execute(SQLSERVER_ROLLUP_TABLE.format(table=table))
+        cursor.execute(SQLSERVER_TRACKS_TABLE)
+        conn.commit()
+
+
+def bucket_rollup(df, freq):
+    """Per (bucket_start, boat_id) rollup of raw rows with boat_id, speed, latitude, longitude, event_time"""
+    event_time = pd.to_datetime(df['event_time'], format='ISO8601')
+    df = df.assign(event_time=event_time, bucket_start=event_time.dt.floor(freq)).sort_values('event_time')
+    return df.groupby(['bucket_start', 'boat_id']).agg(
+        records=('speed', 'size'),
+        sum_speed=('speed', 'sum'),
+        max_speed=('speed', 'max'),
+        last_event_time=('event_time', 'last'),
+        last_lat=('latitude', 'last'),
+        last_lng=('longitude', 'last'),
+    ).reset_index()
+
+
+def timestamp_params(conn, values):
+    """Timestamps as parameters: sortable text with microseconds on SQLite, datetimes on SQL Server"""
+    if is_sqlite(conn):
+        return format_timestamps(values.to_numpy('datetime64[us]'))
+    return [value.to_pydatetime() for value in values]
+
+
+def upsert_rollup(conn, table, rollup):
+    """Merge a rollup into the stored buckets (counts and sums add up, the newest position wins)"""
+    if rollup.empty:
+        return
+    rows = list(zip(
+        timestamp_params(conn, rollup['bucket_start']),
+        rollup['boat_id'].astype(int).tolist(),
+        rollup['records'].astype(int).tolist(),
+        rollup['sum_speed'].tolist(),
+        rollup['max_speed'].tolist(),
+        timestamp_params(conn, rollup['last_event_time']),
+        rollup['last_lat'].tolist(),
+        rollup['last_lng'].tolist(),
+    ))
+    cursor = conn.cursor()
+    if is_sqlite(conn):
+        cursor.executemany(SQLITE_UPSERT.format(table=table), rows)
+    else:
+        cursor.fast_executemany = True
+        cursor.executemany(SQLSERVER_UPSERT.format(table=table), rows)
+
+
+def lttb(points, threshold):
+    """Indices of the Largest-Triangle-Three-Buckets downsample of an ordered (n, 2) point array"""
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        average = points[end:next_end].mean(axis=0)
+        bucket = points[start:end]
+        # twice the area of the triangle (selected point, candidate, average of the next bucket)
+        area = np.abs((points[a, 0] - average[0]) * (bucket[:, 1] - points[a, 1])
+                      - (points[a, 0] - bucket[:, 0]) * (average[1] - points[a, 1]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def downsample_tracks(positions, points=TRACK_POINTS):
+    """LTTB-downsampled track per boat from rows of boat_id, event_time, latitude, longitude
+    ordered by boat and time (distances measured in km, not degrees)"""
+    boats = positions['boat_id'].to_numpy()
+    xy = np.column_stack([positions['longitude'].to_numpy() * KM_PER_DEGREE_LONGITUDE,
+                          positions['latitude'].to_numpy() * KM_PER_DEGREE_LATITUDE])
+    starts = np.flatnonzero(np.r_[True, boats[1:] != boats[:-1]])
+    ends = np.r_[starts[1:], len(boats)]
+    keep = np.concatenate([start + lttb(xy[start:end], points) for start, end in zip(starts, ends)]) \
+        if len(boats) else np.empty(0, dtype=np.int64)
+    tracks = positions.iloc[keep].reset_index(drop=True)
+    tracks['point'] = tracks.groupby('boat_id').cumcount()
+    return tracks
+
+
+def refresh_tracks(conn, hours=TRACK_HOURS, points=TRACK_POINTS):
+    """Rebuild boat_tracks_downsampled from the last `hours` of 1-minute buckets: the cost depends on
+    boats x buckets in the window, not on the size of boat_telemetry"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(bucket_start) FROM boat_speed_rollup_1m")
+    newest = cursor.fetchone()[0]
+    if newest is None:
+        return 0
+    since = pd.Timestamp(newest) - pd.Timedelta(hours=hours)
+    positions = pd.read_sql("""
+        SELECT boat_id, last_event_time AS event_time, last_lat AS latitude, last_lng AS longitude
+        FROM boat_speed_rollup_1m
+        WHERE bucket_start > ?
+        ORDER BY boat_id, bucket_start
+    """, conn, params=timestamp_params(conn, pd.Series([since])))
+    positions['event_time'] = pd.to_datetime(positions['event_time'], format='ISO8601')
+    tracks = downsample_tracks(positions, points)
+
+    rows = list(zip(
+        tracks['boat_id'].astype(int).tolist(),
+        tracks['point'].astype(int).tolist(),
+        timestamp_params(conn, tracks['event_time']),
+        tracks['latitude'].tolist(),
+        tracks['longitude'].tolist(),
+    ))
+    if not is_sqlite(conn):
+        cursor.fast_executemany = True
+    # replaced in one transaction: the panel sees the old or the new tracks, never a mix
+    cursor.execute("DELETE FROM boat_tracks_downsampled")
+    cursor.executemany("""
+        INSERT INTO boat_tracks_downsampled (boat_id, point, event_time, latitude, longitude)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    return len(rows)
+
+
+def update_rollups(conn=None, reader=None, chunk_rows=CHUNK_ROWS):
+    """Fold boat_telemetry rows above the rollup watermark into every rollup table (each chunk
+    commits together with its watermark), then rebuild the downsampled tracks"""
+    if conn is None:
+        with db_connection() as conn, db_connection() as reader:
+            return update_rollups(conn, reader, chunk_rows)
+    create_rollup_tables(conn)
+
+    watermark = watermark_param(conn, read_watermark(conn, WATERMARK_NAME))
+    columns = ['boat_id', 'speed', 'latitude', 'longitude', 'event_time']
+    total = 0
+    for df in iter_watermark_chunks(reader, columns, WATERMARK_COLUMN, watermark, chunk_rows,
+                                    where='speed IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL'):
+        with METRICS.stage('rollups') as stage:
+            for table, freq in ROLLUPS.items():
+                upsert_rollup(conn, table, bucket_rollup(df, freq))
+            write_watermark(conn, df['watermark'].iloc[-1], WATERMARK_NAME)
+            conn.commit()
+            stage.rows = len(df)
+        total += len(df)
+
+    with METRICS.stage('tracks') as stage:
+        stage.rows = refresh_tracks(conn)
+    print(f"✅ Folded {total} new rows into {', '.join(ROLLUPS)}; {stage.rows} downsampled track points")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally maintained rollups for Grafana panels")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    update = subparsers.add_parser('update', help="fold new boat_telemetry rows into the rollups")
+    update.add_argument('--every', type=int, help="repeat every N seconds")
+    args = parser.parse_args()
+
+    METRICS.configure('rollups')
+    print("📉 Updating telemetry rollups...")
+    while True:
+        update_rollups()
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
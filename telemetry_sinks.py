@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Telemetry sinks for the race simulator
+A sink receives one tick of fleet telemetry as columns (boat, latitude, longitude, heading, speed)
+and delivers it somewhere: the real Event Hub, an in-process fake Event Hub, or rotating local files.
+Usage: python3 telemetry_sinks.py --replay telemetry/boats-00000.jsonl
+"""
+
+import os
+import sys
+import json
+import glob
+from collections import deque
+from datetime import datetime, timezone
+import numpy as np
+from wire_format import (JSON_CONTENT_TYPE, PACKED_CONTENT_TYPE, encode_json, encode_packed,
+                         iter_chunks)
+
+# Columns of one telemetry event, in the order the simulator sends them
+TELEMETRY_FIELDS = ("boat", "latitude", "longitude", "heading", "speed")
+
+# Columns sent only when present: the simulated time of the tick (set by tick_scheduler.py)
+OPTIONAL_FIELDS = ("timestamp",)
+
+# Event Hub standard tier limit for one batch
+DEFAULT_MAX_BATCH_BYTES = 1024 * 1024
+
+
+def as_list(values):
+    """Plain Python list from a list or NumPy array (datetimes as ISO 8601 UTC strings)"""
+    if getattr(values, 'dtype', None) is not None and values.dtype.kind == 'M':
+        return np.char.add(np.datetime_as_string(values, unit='us'), 'Z').tolist()
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+def iter_records(columns):
+    """Yield one dict per boat from a dict of equal-length columns"""
+    names = [name for name in TELEMETRY_FIELDS + OPTIONAL_FIELDS if name in columns]
+    for row in zip(*(as_list(columns[name]) for name in names)):
+        yield dict(zip(names, row))
+
+
+def split_by_partition(columns, partition_count):
+    """Split columns into one group per partition using boat id modulo partition count"""
+    if partition_count <= 1:
+        return [columns]
+
+    boats = columns['boat']
+    if hasattr(boats, 'take'):
+        partition = boats % partition_count
+        indexes = [(partition == p).nonzero()[0] for p in range(partition_count)]
+        return [{name: values.take(idx) for name, values in columns.items()} for idx in indexes]
+
+    indexes = [[] for _ in range(partition_count)]
+    for i, boat in enumerate(boats):
+        indexes[boat % partition_count].append(i)
+    return [{name: [values[i] for i in idx] for name, values in columns.items()} for idx in indexes]
+
+
+def shard_partitions(partition_ids, index, count):
+    """Partitions owned by shard index of count: every count-th one, or a shared one when there
+    are more shards than partitions"""
+    return partition_ids[index::count] or [partition_ids[index % len(partition_ids)]]
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+class TelemetrySink():
+    """Base class for telemetry sinks: counts what it delivers"""
+
+    def __init__(self):
+        self.events_sent = 0
+        self.batches_sent = 0
+        self.bytes_sent = 0
+
+    def send(self, columns):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --------------------------------------------------------------------------------------------
+# Event Hub sinks
+# --------------------------------------------------------------------------------------------
+
+class EventHubSink(TelemetrySink):
+    """Send telemetry through an EventHubProducerClient, splitting overflowing batches.
+    encoding='json' sends one event per boat, encoding='packed' one event per chunk of boats.
+    shard=(index, count) restricts the sink to its share of the partitions (see fleet_shards.py)."""
+
+    def __init__(self, producer, partitioned=True, encoding='json', shard=None):
+        super().__init__()
+        if encoding not in ('json', 'packed'):
+            raise ValueError(f"Unsupported encoding: {encoding}")
+        self.producer = producer
+        self.partitioned = partitioned
+        self.encoding = encoding
+        self.shard = shard
+        self._partition_ids = None
+
+    def partition_ids(self):
+        if self._partition_ids is None:
+            self._partition_ids = list(self.producer.get_partition_ids()) if self.partitioned else [None]
+            if self.partitioned and self.shard is not None:
+                self._partition_ids = shard_partitions(self._partition_ids, *self.shard)
+        return self._partition_ids
+
+    def make_event(self, body, content_type=JSON_CONTENT_TYPE):
+        from azure.eventhub import EventData
+        event = EventData(body)
+        event.content_type = content_type
+        return event
+
+    def send(self, columns):
+        partition_ids = self.partition_ids()
+        groups = split_by_partition(columns, len(partition_ids))
+        for partition_id, group in zip(partition_ids, groups):
+            self._send_group(partition_id, group)
+
+    def _encode(self, columns):
+        """Yield (body, content_type, records) for every event of one partition group"""
+        if self.encoding == 'packed':
+            for chunk in iter_chunks(columns):
+                yield encode_packed(chunk), PACKED_CONTENT_TYPE, len(chunk['boat'])
+        else:
+            for record in iter_records(columns):
+                yield encode_json(record), JSON_CONTENT_TYPE, 1
+
+    def _send_group(self, partition_id, columns):
+        batch = self.producer.create_batch(partition_id=partition_id)
+        records = 0
+        for body, content_type, count in self._encode(columns):
+            event = self.make_event(body, content_type)
+            try:
+                batch.add(event)
+            except ValueError:
+                # batch is full: ship it and start a new one on the same partition
+                if len(batch) == 0:
+                    raise
+                self._send_batch(batch, records)
+                batch = self.producer.create_batch(partition_id=partition_id)
+                records = 0
+                batch.add(event)
+            records += count
+            self.bytes_sent += len(body)
+
+        if len(batch) > 0:
+            self._send_batch(batch, records)
+
+    def _send_batch(self, batch, records):
+        self.producer.send_batch(batch)
+        self.events_sent += records
+        self.batches_sent += 1
+
+    def close(self):
+        self.producer.close()
+
+
+class AsyncEventHubSink(EventHubSink):
+    """EventHubSink over the asyncio EventHubProducerClient (azure.eventhub.aio): send_async awaits
+    the network instead of blocking a thread, and sends the partitions concurrently"""
+
+    async def partition_ids_async(self):
+        if self._partition_ids is None:
+            partition_ids = list(await self.producer.get_partition_ids()) if self.partitioned else [None]
+            if self.partitioned and self.shard is not None:
+                partition_ids = shard_partitions(partition_ids, *self.shard)
+            self._partition_ids = partition_ids
+        return self._partition_ids
+
+    def send(self, columns):
+        raise TypeError("AsyncEventHubSink only sends from an event loop: use send_async")
+
+    async def send_async(self, columns):
+        import asyncio
+        partition_ids = await self.partition_ids_async()
+        groups = split_by_partition(columns, len(partition_ids))
+        await asyncio.gather(*(self._send_group_async(partition_id, group)
+                               for partition_id, group in zip(partition_ids, groups)))
+
+    async def _send_group_async(self, partition_id, columns):
+        batch = await self.producer.create_batch(partition_id=partition_id)
+        records = 0
+        for body, content_type, count in self._encode(columns):
+            event = self.make_event(body, content_type)
+            try:
+                batch.add(event)
+            except ValueError:
+                # batch is full: ship it and start a new one on the same partition
+                if len(batch) == 0:
+                    raise
+                await self._send_batch_async(batch, records)
+                batch = await self.producer.create_batch(partition_id=partition_id)
+                records = 0
+                batch.add(event)
+            records += count
+            self.bytes_sent += len(body)
+
+        if len(batch) > 0:
+            await self._send_batch_async(batch, records)
+
+    async def _send_batch_async(self, batch, records):
+        await self.producer.send_batch(batch)
+        self.events_sent += records
+        self.batches_sent += 1
+
+    def close(self):
+        pass
+
+    async def close_async(self):
+        await self.producer.close()
+
+
+class FakeEventData():
+    """Just enough of azure.eventhub.EventData for the fake hub"""
+
+    def __init__(self, body, content_type=JSON_CONTENT_TYPE):
+        self.body = body
+        self.content_type = content_type
+        self.enqueued_time = None
+
+    def body_as_str(self):
+        return self.body
+
+    def body_as_json(self):
+        return json.loads(self.body)
+
+
+class FakeEventDataBatch():
+    """Size-limited batch that raises ValueError when full, like EventDataBatch"""
+
+    # rough per-event AMQP framing overhead
+    EVENT_OVERHEAD_BYTES = 40
+
+    def __init__(self, partition_id, max_size_in_bytes):
+        self.partition_id = partition_id
+        self.max_size_in_bytes = max_size_in_bytes
+        self.size_in_bytes = 0
+        self.events = []
+
+    def add(self, event):
+        size = len(event.body) + self.EVENT_OVERHEAD_BYTES
+        if self.size_in_bytes + size > self.max_size_in_bytes:
+            raise ValueError(f"EventDataBatch has reached its size limit: {self.max_size_in_bytes}")
+        self.events.append(event)
+        self.size_in_bytes += size
+
+    def __len__(self):
+        return len(self.events)
+
+
+class FakeEventHubProducer():
+    """In-process stand-in for EventHubProducerClient; keeps the latest events per partition"""
+
+    def __init__(self, partitions=4, max_batch_bytes=DEFAULT_MAX_BATCH_BYTES, retain=100_000):
+        self.max_batch_bytes = max_batch_bytes
+        self.partitions = {str(p): deque(maxlen=retain) for p in range(partitions)}
+
+    def get_partition_ids(self):
+        return list(self.partitions)
+
+    def create_batch(self, partition_id=None, max_size_in_bytes=None):
+        return FakeEventDataBatch(partition_id, max_size_in_bytes or self.max_batch_bytes)
+
+    def send_batch(self, batch):
+        partition_id = batch.partition_id if batch.partition_id is not None else '0'
+        enqueued_time = utc_now()
+        for event in batch.events:
+            event.enqueued_time = enqueued_time
+        self.partitions[partition_id].extend(batch.events)
+
+    def close(self):
+        pass
+
+
+class FakeEventHubSink(EventHubSink):
+    """Event Hub sink backed by FakeEventHubProducer, for local soak tests"""
+
+    def __init__(self, partitions=4, max_batch_bytes=DEFAULT_MAX_BATCH_BYTES, retain=100_000, encoding='json',
+                 shard=None):
+        super().__init__(FakeEventHubProducer(partitions, max_batch_bytes, retain), encoding=encoding, shard=shard)
+
+    def make_event(self, body, content_type=JSON_CONTENT_TYPE):
+        return FakeEventData(body, content_type)
+
+    def drain(self):
+        """Remove and return every retained event, partition by partition"""
+        events = []
+        for queue in self.producer.partitions.values():
+            events.extend(queue)
+            queue.clear()
+        return events
+
+
+# --------------------------------------------------------------------------------------------
+# File sinks
+# --------------------------------------------------------------------------------------------
+
+class FileSink(TelemetrySink):
+    """Write telemetry to rotating JSONL or Parquet files (prefix-00000.jsonl, prefix-00001.jsonl, ...)"""
+
+    def __init__(self, prefix, file_format='jsonl', max_events_per_file=1_000_000):
+        super().__init__()
+        if file_format not in ('jsonl', 'parquet'):
+            raise ValueError(f"Unsupported file format: {file_format}")
+        self.prefix = prefix
+        self.file_format = file_format
+        self.max_events_per_file = max_events_per_file
+        self.file_index = 0
+        self.events_in_file = 0
+        self.paths = []
+        self._file = None
+        self._pending = []
+
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _next_path(self):
+        path = f"{self.prefix}-{self.file_index:05d}.{self.file_format}"
+        self.file_index += 1
+        self.events_in_file = 0
+        self.paths.append(path)
+        return path
+
+    def send(self, columns):
+        enqueued_time = utc_now().isoformat()
+        if self.file_format == 'jsonl':
+            self._write_jsonl(columns, enqueued_time)
+        else:
+            self._buffer_parquet(columns, enqueued_time)
+        self.batches_sent += 1
+
+    def _write_jsonl(self, columns, enqueued_time):
+        for record in iter_records(columns):
+            if self._file is None or self.events_in_file >= self.max_events_per_file:
+                self._close_file()
+                self._file = open(self._next_path(), 'w')
+            record['EventEnqueuedUtcTime'] = enqueued_time
+            line = json.dumps(record) + "\n"
+            self._file.write(line)
+            self.events_in_file += 1
+            self.events_sent += 1
+            self.bytes_sent += len(line)
+
+    def _buffer_parquet(self, columns, enqueued_time):
+        count = len(columns['boat'])
+        chunk = {name: as_list(columns[name]) for name in TELEMETRY_FIELDS + OPTIONAL_FIELDS if name in columns}
+        chunk['EventEnqueuedUtcTime'] = [enqueued_time] * count
+        self._pending.append(chunk)
+        self.events_in_file += count
+        if self.events_in_file >= self.max_events_per_file:
+            self._write_parquet()
+
+    def _write_parquet(self):
+        if not self._pending:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # chunks with and without the optional timestamp column can share a file: missing columns become nulls
+        table = pa.concat_tables([pa.table(chunk) for chunk in self._pending], promote_options='default')
+        path = self._next_path()
+        pq.write_table(table, path, compression='snappy')
+        self._pending = []
+        self.events_sent += table.num_rows
+        self.bytes_sent += os.path.getsize(path)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def flush(self):
+        if self.file_format == 'jsonl':
+            if self._file is not None:
+                self._file.flush()
+        else:
+            self._write_parquet()
+
+    def close(self):
+        self.flush()
+        self._close_file()
+
+
+# --------------------------------------------------------------------------------------------
+# HTTP sink
+# --------------------------------------------------------------------------------------------
+
+class HttpSink(TelemetrySink):
+    """POST packed telemetry chunks to an HTTP endpoint such as fleet_state_service.py /ingest"""
+
+    def __init__(self, url, timeout=10):
+        super().__init__()
+        from urllib.parse import urlparse
+        from http.client import HTTPConnection
+        parsed = urlparse(url)
+        self.path = parsed.path or '/ingest'
+        self.connection = HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+
+    def send(self, columns):
+        for chunk in iter_chunks(columns):
+            body = encode_packed(chunk)
+            self.connection.request('POST', self.path, body=body, headers={'Content-Type': PACKED_CONTENT_TYPE})
+            response = self.connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise ConnectionError(f"POST {self.path} returned HTTP {response.status}")
+            self.events_sent += len(chunk['boat'])
+            self.batches_sent += 1
+            self.bytes_sent += len(body)
+
+    def close(self):
+        self.connection.close()
+
+
+# --------------------------------------------------------------------------------------------
+# Factory and replay
+# --------------------------------------------------------------------------------------------
+
+def create_sink(name=None, encoding=None, shard=None, asynchronous=False):
+    """Build the sink selected by TELEMETRY_SINK (eventhub, fake, jsonl, parquet or http).
+    Event Hub sinks use the wire format from TELEMETRY_ENCODING (json or packed).
+    With shard=(index, count) each shard gets its own producer and partitions, or its own files.
+    asynchronous=True gives the Event Hub an asyncio producer (AsyncEventHubSink.send_async);
+    the other sinks stay synchronous."""
+    name = name or os.getenv('TELEMETRY_SINK', 'eventhub')
+    encoding = encoding or os.getenv('TELEMETRY_ENCODING', 'json')
+    if name == 'eventhub' and asynchronous:
+        from azure.eventhub.aio import EventHubProducerClient
+        producer = EventHubProducerClient.from_connection_string(
+            conn_str=os.getenv('AZURE_EVENTHUB_CONNECTION_STRING'),
+            eventhub_name=os.getenv('AZURE_EVENTHUB_NAME', 'project1')
+        )
+        return AsyncEventHubSink(producer, encoding=encoding, shard=shard)
+    if name == 'eventhub':
+        from azure.eventhub import EventHubProducerClient
+        producer = EventHubProducerClient.from_connection_string(
+            conn_str=os.getenv('AZURE_EVENTHUB_CONNECTION_STRING'),
+            eventhub_name=os.getenv('AZURE_EVENTHUB_NAME', 'project1')
+        )
+        return EventHubSink(producer, encoding=encoding, shard=shard)
+    if name == 'fake':
+        return FakeEventHubSink(partitions=int(os.getenv('FAKE_EVENTHUB_PARTITIONS', '4')), encoding=encoding,
+                                shard=shard)
+    if name in ('jsonl', 'parquet'):
+        prefix = os.getenv('TELEMETRY_FILE_PREFIX', 'telemetry/boats')
+        return FileSink(
+            prefix if shard is None else f"{prefix}-shard{shard[0]:02d}",
+            file_format=name,
+            max_events_per_file=int(os.getenv('TELEMETRY_FILE_MAX_EVENTS', '1000000'))
+        )
+    if name == 'http':
+        return HttpSink(os.getenv('TELEMETRY_HTTP_URL', 'http://127.0.0.1:8090/ingest'))
+    raise ValueError(f"Unknown telemetry sink: {name}")
+
+
+def read_captured(path, chunk_size=100_000):
+    """Yield column chunks from a captured JSONL or Parquet telemetry file"""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=list(TELEMETRY_FIELDS)):
+            yield batch.to_pydict()
+        return
+
+    chunk = {name: [] for name in TELEMETRY_FIELDS}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            for name in TELEMETRY_FIELDS:
+                chunk[name].append(record.get(name))
+            if len(chunk['boat']) >= chunk_size:
+                yield chunk
+                chunk = {name: [] for name in TELEMETRY_FIELDS}
+    if chunk['boat']:
+        yield chunk
+
+
+def replay(paths, sink, chunk_size=100_000):
+    """Push captured telemetry files back through a sink; returns the number of events replayed"""
+    replayed = 0
+    for path in paths:
+        for columns in read_captured(path, chunk_size):
+            sink.send(columns)
+            replayed += len(columns['boat'])
+    sink.flush()
+    return replayed
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] != '--replay':
+        print("Usage: TELEMETRY_SINK=fake python3 telemetry_sinks.py --replay <file-or-glob> ...")
+        return
+
+    paths = sorted(path for pattern in sys.argv[2:] for path in glob.glob(pattern))
+    if not paths:
+        print("❌ No captured telemetry files found")
+        return
+
+    with create_sink() as sink:
+        print(f"🔁 Replaying {len(paths)} file(s) into {type(sink).__name__}...")
+        replayed = replay(paths, sink)
+        print(f"✅ Replayed {replayed} events in {sink.batches_sent} batches")
+
+
+if __name__ == "__main__":
+    main()
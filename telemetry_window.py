@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Rolling window of recent telemetry for live analytics
+The last few minutes of every boat's telemetry in fixed-size NumPy rings: one row per boat and
+WINDOW_SLOTS slots per row, overwritten oldest first. Records/sec, speed percentiles, reporting gaps
+and staleness over the window are computed with vectorized operations on the rings, so the live
+views cost no queries and the memory stays fixed (20 bytes per slot) however long the feed runs.
+Fed by monitor_data.py (rows it already polls) and fleet_state_service.py (events it consumes);
+both serve the statistics as JSON under /window.
+Usage: python3 monitor_data.py --window-minutes 5 --port 8091
+       curl "http://127.0.0.1:8091/window?minutes=5"
+       python3 benchmarks.py window
+"""
+
+import os
+import re
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Length of the rolling window, in minutes of event time
+WINDOW_MINUTES = float(os.getenv('TELEMETRY_WINDOW_MINUTES', '10'))
+
+# Events kept per boat (10 minutes of 10-second ticks is 60)
+WINDOW_SLOTS = int(os.getenv('TELEMETRY_WINDOW_SLOTS', '64'))
+
+WINDOW_FIELDS = ('speed', 'latitude', 'longitude')
+
+BOAT_STAT_COLUMNS = ['boat_id', 'records', 'records_per_sec', 'avg_speed', 'p50_speed', 'p90_speed',
+                     'max_speed', 'max_gap_seconds', 'last_seen_seconds']
+
+
+def percentiles(ordered, counts, q):
+    """Per-row q-th percentile (linear interpolation, as np.percentile) of rows sorted ascending
+    with their counts[i] valid values first; NaN for empty rows"""
+    rows = np.arange(len(ordered))
+    position = np.maximum(counts - 1, 0) * (q / 100)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, np.maximum(counts - 1, 0))
+    result = ordered[rows, low] + (ordered[rows, high] - ordered[rows, low]) * (position - low)
+    return np.where(counts > 0, result, np.nan)
+
+
+def max_gaps(times, inside):
+    """Per-row longest interval between two in-window event times (microseconds, 0 for rows with
+    fewer than two events)"""
+    ordered = np.sort(np.where(inside, times, np.iinfo(np.int64).max), axis=1)
+    gaps = np.diff(ordered, axis=1)
+    counts = inside.sum(axis=1)
+    gaps = np.where(np.arange(times.shape[1] - 1) < (counts - 1)[:, None], gaps, 0)
+    return gaps.max(axis=1, initial=0)
+
+
+class TelemetryWindow():
+    """Ring buffer of the last `slots` events of every boat (struct of arrays, thread-safe).
+    Row i belongs to boat i; event_time is in microseconds and -1 for empty slots. Statistics
+    cover the events of the last `minutes` of event time, ending at the newest event seen."""
+
+    def __init__(self, minutes=WINDOW_MINUTES, slots=WINDOW_SLOTS, capacity=1024):
+        self.minutes = minutes
+        self.slots = max(slots, 2)
+        self.appended = 0
+        self.newest_event_time = -1
+        self.oldest_event_time = -1
+        self._lock = threading.Lock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.event_time = np.full((capacity, self.slots), -1, dtype=np.int64)
+        self.head = np.zeros(capacity, dtype=np.int64)
+        for name in WINDOW_FIELDS:
+            setattr(self, name, np.full((capacity, self.slots), np.nan, dtype=np.float32))
+
+    def _grow(self, boat_max):
+        """Make room for boat ids up to boat_max (doubling, so appends stay amortized O(1))"""
+        capacity = len(self.head)
+        if boat_max < capacity:
+            return
+        old = {name: getattr(self, name) for name in ('event_time', 'head') + WINDOW_FIELDS}
+        self._allocate(max(boat_max + 1, 2 * capacity))
+        for name, values in old.items():
+            getattr(self, name)[:capacity] = values
+
+    @property
+    def capacity(self):
+        return len(self.head)
+
+    @property
+    def memory_bytes(self):
+        return sum(getattr(self, name).nbytes for name in ('event_time', 'head') + WINDOW_FIELDS)
+
+    def append(self, boat_id, event_time, speed, latitude, longitude):
+        """Store a batch of events (arrays of equal length, in arrival order). Each boat's events
+        go to its next slots; when a batch holds more than `slots` events of a boat only its newest
+        are written. Returns the number of events stored."""
+        boat = np.asarray(boat_id, dtype=np.int64)
+        times = np.asarray(event_time).astype('datetime64[us]').astype(np.int64)
+        values = {'speed': speed, 'latitude': latitude, 'longitude': longitude}
+        values = {name: np.asarray(column, dtype=np.float32) for name, column in values.items()}
+        valid = (boat >= 0) & (times >= 0)
+        if not valid.all():
+            boat, times = boat[valid], times[valid]
+            values = {name: column[valid] for name, column in values.items()}
+        if len(boat) == 0:
+            return 0
+
+        # group the batch by boat, keeping arrival order within a boat
+        order = np.argsort(boat, kind='stable')
+        boat, times = boat[order], times[order]
+        boats, first, counts = np.unique(boat, return_index=True, return_counts=True)
+        rank = np.arange(len(boat)) - np.repeat(first, counts)
+        keep = rank >= np.repeat(counts - self.slots, counts)
+
+        with self._lock:
+            self._grow(int(boats[-1]))
+            rows = boat[keep]
+            slots = (self.head[rows] + rank[keep]) % self.slots
+            self.event_time[rows, slots] = times[keep]
+            for name, column in values.items():
+                getattr(self, name)[rows, slots] = column[order][keep]
+            self.head[boats] += counts
+            self.appended += len(boat)
+            self.newest_event_time = max(self.newest_event_time, int(times.max()))
+            if self.oldest_event_time < 0:
+                self.oldest_event_time = int(times.min())
+        return len(boat)
+
+    def append_frame(self, df):
+        """Store the rows of a DataFrame with boat_id, event_time, speed, latitude and longitude
+        columns (e.g. stream_validator.validate output)"""
+        if len(df) == 0:
+            return 0
+        return self.append(df['boat_id'].to_numpy(), df['event_time'].to_numpy(), df['speed'].to_numpy(),
+                           df['latitude'].to_numpy(), df['longitude'].to_numpy())
+
+    def _window(self, minutes, now):
+        """(cutoff, now, seconds covered) of a window in microseconds (caller holds the lock)"""
+        now = self.newest_event_time if now is None else int(np.datetime64(now, 'us').astype(np.int64))
+        length = int((self.minutes if minutes is None else minutes) * 60e6)
+        cutoff = now - length
+        # a window that has not filled yet only covers the time since the first event
+        covered = min(length, now - self.oldest_event_time) / 1e6 if self.oldest_event_time >= 0 else 0.0
+        return cutoff, now, covered
+
+    def _in_window(self, minutes, now):
+        """Seen boat ids and their in-window mask (caller holds the lock)"""
+        cutoff, now, covered = self._window(minutes, now)
+        ids = np.flatnonzero(self.head > 0)
+        times = self.event_time[ids]
+        return ids, times, (times > cutoff) & (times <= now), now, covered
+
+    def boat_stats(self, minutes=None, now=None):
+        """Per-boat statistics over the window as a DataFrame ordered by boat id: records and
+        records/sec, average, median, 90th percentile and max speed, the longest gap between two
+        events and the seconds since the boat's newest event (boats without events in the window
+        are left out)"""
+        with self._lock:
+            ids, times, inside, now, covered = self._in_window(minutes, now)
+            counts = inside.sum(axis=1)
+            present = counts > 0
+            ids, times, inside, counts = ids[present], times[present], inside[present], counts[present]
+            speed = np.where(inside, self.speed[ids].astype(np.float64), np.nan)
+
+        # NaN sorts last, so every row starts with its in-window values in ascending order
+        ordered = np.sort(speed, axis=1)
+        rows = np.arange(len(ids))
+        newest = np.where(inside, times, -1).max(axis=1, initial=-1)
+        return pd.DataFrame({
+            'boat_id': ids,
+            'records': counts,
+            'records_per_sec': counts / covered if covered else np.nan,
+            'avg_speed': np.nansum(ordered, axis=1) / np.maximum(counts, 1),
+            'p50_speed': percentiles(ordered, counts, 50),
+            'p90_speed': percentiles(ordered, counts, 90),
+            'max_speed': ordered[rows, counts - 1],
+            'max_gap_seconds': max_gaps(times, inside) / 1e6,
+            'last_seen_seconds': (now - newest) / 1e6,
+        }, columns=BOAT_STAT_COLUMNS).round(4)
+
+    def fleet_stats(self, minutes=None, now=None):
+        """Fleet-wide statistics over the window as a dict. `saturated_boats` counts boats whose
+        ring no longer reaches back to the start of the window (raise TELEMETRY_WINDOW_SLOTS)."""
+        with self._lock:
+            ids, times, inside, now, covered = self._in_window(minutes, now)
+            speed = self.speed[ids][inside].astype(np.float64)
+            records = int(inside.sum())
+            cutoff = now - int((self.minutes if minutes is None else minutes) * 60e6)
+            # every slot holds an in-window event: older in-window events were overwritten
+            full = (times > cutoff).all(axis=1)
+            boats = int(inside.any(axis=1).sum())
+            max_gap = int(max_gaps(times, inside).max(initial=0))
+            return {
+                'window_minutes': self.minutes if minutes is None else minutes,
+                'window_seconds': covered,
+                'boats': boats,
+                'records': records,
+                'records_per_sec': records / covered if covered else None,
+                'avg_speed': round(float(speed.mean()), 4) if records else None,
+                'p50_speed': round(float(np.percentile(speed, 50)), 4) if records else None,
+                'p90_speed': round(float(np.percentile(speed, 90)), 4) if records else None,
+                'max_speed': round(float(speed.max()), 4) if records else None,
+                'max_gap_seconds': max_gap / 1e6,
+                'saturated_boats': int(full.sum()),
+                'newest_event_time': iso_time(self.newest_event_time),
+                'appended': self.appended,
+                'memory_bytes': self.memory_bytes,
+            }
+
+    def track(self, boat_id, minutes=None, now=None):
+        """In-window events of one boat in event-time order, or None when it has not been seen"""
+        with self._lock:
+            if not 0 <= boat_id < self.capacity or self.head[boat_id] == 0:
+                return None
+            cutoff, now, _ = self._window(minutes, now)
+            times = self.event_time[boat_id]
+            inside = np.flatnonzero((times > cutoff) & (times <= now))
+            inside = inside[np.argsort(times[inside], kind='stable')]
+            frame = {'event_time': times[inside].astype('datetime64[us]')}
+            for name in WINDOW_FIELDS:
+                frame[name] = getattr(self, name)[boat_id, inside].astype(np.float64)
+            return pd.DataFrame(frame).round({'speed': 4, 'latitude': 5, 'longitude': 5})
+
+
+def iso_time(micros):
+    if micros is None or micros < 0:
+        return None
+    return str(np.datetime64(int(micros), 'us')) + 'Z'
+
+
+def respond(window, path, query):
+    """(status, body) for GET /window (fleet), /window/boats (per boat, fastest first, ?top=N)
+    and /window/boats/<id> (that boat's events); ?minutes=N sets the window length"""
+    minutes = float(query['minutes'][0]) if 'minutes' in query else None
+    if path == '/window':
+        return 200, json.dumps(window.fleet_stats(minutes)).encode()
+    if path == '/window/boats':
+        stats = window.boat_stats(minutes).sort_values(['avg_speed', 'boat_id'], ascending=[False, True])
+        if 'top' in query:
+            top = int(query['top'][0])
+            if top < 0:
+                raise ValueError("top must not be negative")
+            stats = stats.head(top)
+        return 200, stats.to_json(orient='records').encode()
+    match = re.fullmatch(r'/window/boats/(\d+)', path)
+    if match:
+        track = window.track(int(match.group(1)), minutes)
+        if track is None:
+            return 404, json.dumps({'error': f"boat {match.group(1)} not seen"}).encode()
+        return 200, track.to_json(orient='records', date_format='iso', date_unit='ms').encode()
+    return 404, json.dumps({'error': f"unknown path {path}"}).encode()
+
+
+def serve(window, port, host='127.0.0.1'):
+    """Serve the /window statistics over HTTP from a background thread"""
+    from urllib.parse import urlparse, parse_qs
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            try:
+                status, body = respond(window, url.path.rstrip('/') or '/', parse_qs(url.query))
+            except ValueError as e:
+                status, body = 400, json.dumps({'error': str(e)}).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"🛰️  Telemetry window endpoint: http://{host}:{server.server_port}/window")
+    return server
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# the pipeline scripts are top-level modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import blob_cache
+import data_access
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    """LOCAL_BLOB_ROOT and SQLITE_DATABASE in a temporary folder, with a fresh connection pool and
+    the blob cache turned off; yields (blob root, database path)"""
+    root = tmp_path / 'blob-data'
+    database = tmp_path / 'boats.db'
+    monkeypatch.setenv('LOCAL_BLOB_ROOT', str(root))
+    monkeypatch.setenv('SQLITE_DATABASE', str(database))
+    monkeypatch.setattr(blob_cache, 'BLOB_CACHE_MAX_BYTES', 0)
+    monkeypatch.setattr(data_access, '_pool', None)
+    yield root, database
+    if data_access._pool is not None:
+        data_access._pool.close()
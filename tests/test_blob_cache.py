@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+import pytest
+
+from blob_cache import BlobCache, INDEX_FILE
+from local_blob import LocalBlobServiceClient
+
+
+@pytest.fixture
+def service(tmp_path):
+    return LocalBlobServiceClient(str(tmp_path / 'blob-data'))
+
+
+def upload(service, name, rows=100):
+    blob = service.get_blob_client('parquet-data', f'daily-rankings/{name}.parquet')
+    df = pd.DataFrame({'boat_id': range(rows), 'avg_speed': [float(boat) for boat in range(rows)]})
+    blob.upload_blob(df.to_parquet(index=False), overwrite=True)
+    return blob, df
+
+
+def cached_files(cache):
+    return sorted(name for name in os.listdir(cache.directory) if name != INDEX_FILE)
+
+
+def test_hit_after_miss(service, tmp_path):
+    blob, df = upload(service, 'a')
+    cache = BlobCache(str(tmp_path / 'cache'), max_bytes=10 * 1024 * 1024)
+    pd.testing.assert_frame_equal(cache.read_parquet(blob), df)
+    pd.testing.assert_frame_equal(cache.read_parquet(blob), df)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_hits_only_mark_the_index_dirty(service, tmp_path):
+    blob, _ = upload(service, 'a')
+    cache = BlobCache(str(tmp_path / 'cache'), max_bytes=10 * 1024 * 1024)
+    cache.read_parquet(blob)
+    index_path = os.path.join(cache.directory, INDEX_FILE)
+    os.remove(index_path)
+    cache.read_parquet(blob)
+    assert not os.path.exists(index_path)
+    cache.flush()
+    assert os.path.exists(index_path)
+    assert BlobCache(cache.directory).stats()['files'] == 1
+
+
+def test_files_being_read_are_not_evicted(service, tmp_path):
+    a, _ = upload(service, 'a')
+    b, _ = upload(service, 'b')
+    c, _ = upload(service, 'c')
+    # room for one file only
+    cache = BlobCache(str(tmp_path / 'cache'), max_bytes=1)
+    key, path = cache.fetch(a)
+    cache.read_parquet(b)
+    assert os.path.exists(path)
+    cache.clear()
+    assert os.path.exists(path)
+
+    cache.unpin(key)
+    cache.read_parquet(c)
+    assert not os.path.exists(path)
+    assert len(cached_files(cache)) == 1
+
+
+def test_missing_file_on_hit_is_a_miss(service, tmp_path):
+    blob, df = upload(service, 'a')
+    cache = BlobCache(str(tmp_path / 'cache'), max_bytes=10 * 1024 * 1024)
+    key, path = cache.fetch(blob)
+    cache.unpin(key)
+    os.remove(path)
+    pd.testing.assert_frame_equal(cache.read_parquet(blob), df)
+    assert (cache.hits, cache.misses) == (0, 2)
@@ -0,0 +1,114 @@
+import time
+import base64
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import blob_stream
+from blob_stream import BlockBlobWriter, write_parquet_blob
+from local_blob import LocalBlobServiceClient
+
+
+class RecordingBlob():
+    """Local blob client that records staged and committed blocks; the first blocks are slowest,
+    so uploads finish out of order"""
+
+    def __init__(self, blob, fail_block=None):
+        self.blob = blob
+        self.fail_block = fail_block
+        self.finished = []
+        self.committed = None
+
+    def stage_block(self, block_id, data, **kwargs):
+        number = block_number(block_id)
+        if number == self.fail_block:
+            raise ValueError("upload rejected")
+        time.sleep(max(0, 4 - number) * 0.02)
+        self.blob.stage_block(block_id, data, **kwargs)
+        self.finished.append(number)
+
+    def commit_block_list(self, block_list, **kwargs):
+        self.committed = list(block_list)
+        return self.blob.commit_block_list(block_list, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.blob, name)
+
+
+def block_number(block_id):
+    return int(base64.b64decode(block_id).decode().removeprefix('block-'))
+
+
+@pytest.fixture
+def blob(tmp_path):
+    return LocalBlobServiceClient(str(tmp_path)).get_blob_client('parquet-data', 'daily-rankings/test.parquet')
+
+
+def read(blob):
+    return blob.download_blob().readall()
+
+
+def test_commits_only_on_clean_close(blob):
+    with BlockBlobWriter(blob, block_bytes=4) as sink:
+        sink.write(b'0123456789')
+        assert not blob.exists()
+    assert read(blob) == b'0123456789'
+    assert sink.bytes_written == 10
+
+
+def test_error_mid_write_leaves_no_blob(blob):
+    with pytest.raises(RuntimeError):
+        with BlockBlobWriter(blob, block_bytes=4) as sink:
+            sink.write(b'0123456789')
+            raise RuntimeError("encoder failed")
+    assert not blob.exists()
+
+
+def test_error_mid_write_keeps_previous_blob(blob):
+    blob.upload_blob(b'previous', overwrite=True)
+
+    def failing_batches():
+        yield pa.table({'boat_id': [1, 2, 3]})
+        raise RuntimeError("extract failed")
+
+    with pytest.raises(RuntimeError):
+        write_parquet_blob(failing_batches(), blob)
+    assert read(blob) == b'previous'
+
+
+def test_failed_block_upload_is_not_committed(blob):
+    blob.upload_blob(b'previous', overwrite=True)
+    recording = RecordingBlob(blob, fail_block=1)
+    with pytest.raises(ValueError):
+        with BlockBlobWriter(recording, block_bytes=4, concurrency=2) as sink:
+            sink.write(b'0123456789abcdef')
+    assert recording.committed is None
+    assert read(blob) == b'previous'
+
+
+def test_block_order_across_threads(blob):
+    data = bytes(range(256)) * 40
+    recording = RecordingBlob(blob)
+    with BlockBlobWriter(recording, block_bytes=1000, concurrency=4) as sink:
+        for offset in range(0, len(data), 333):
+            sink.write(data[offset:offset + 333])
+    # later blocks finish uploading first, yet the blob is committed in write order
+    assert recording.finished[:4] != [0, 1, 2, 3]
+    assert [block_number(block_id) for block_id in recording.committed] == list(range(11))
+    assert read(blob) == data
+
+
+def test_multi_block_parquet_round_trip(blob):
+    rng = np.random.default_rng(42)
+    rows = 1_200_000
+    df = pd.DataFrame({'boat_id': rng.integers(0, 10_000, rows), 'speed': rng.uniform(0, 25, rows),
+                       'latitude': rng.uniform(-90, 90, rows)})
+    recording = RecordingBlob(blob)
+    written_rows, written_bytes = write_parquet_blob(df, recording, row_group_rows=250_000)
+    assert written_rows == rows
+    assert written_bytes > blob_stream.BLOCK_BYTES
+    assert len(recording.committed) == -(-written_bytes // blob_stream.BLOCK_BYTES)
+    pd.testing.assert_frame_equal(pd.read_parquet(BytesIO(read(blob))), df)
@@ -0,0 +1,95 @@
+import json
+import threading
+from http.client import HTTPConnection
+
+import pytest
+
+from fleet_state_service import FleetStateService
+from telemetry_window import TelemetryWindow
+
+
+def tick(boats, timestamp, speed=10.0):
+    return {'boat': list(boats), 'latitude': [38.6] * len(boats), 'longitude': [-9.5] * len(boats),
+            'heading': [225.0] * len(boats), 'speed': [speed] * len(boats), 'timestamp': [timestamp] * len(boats)}
+
+
+@pytest.fixture
+def service():
+    return FleetStateService(window=TelemetryWindow(minutes=10, slots=16))
+
+
+def get(service, path, **query):
+    status, body = service.respond(path, {name: [str(value)] for name, value in query.items()})
+    return status, json.loads(body)
+
+
+def test_late_events_refresh_the_window(service):
+    service.ingest(tick(range(3), '2025-01-01T00:01:00Z'))
+    assert get(service, '/window')[1]['records'] == 3
+    version = service.state.version
+
+    # older than the state of every boat: the fleet state ignores it, the window does not
+    service.ingest(tick(range(3), '2025-01-01T00:00:30Z', speed=20.0))
+    assert service.state.version == version
+    assert get(service, '/window')[1]['records'] == 6
+    assert get(service, '/window/boats', top=1)[1][0]['avg_speed'] == 15.0
+
+
+def test_race_is_cached_on_its_own_updates(service):
+    service.ingest(tick(range(3), '2025-01-01T00:01:00Z'))
+    get(service, '/race')
+    service.race.updates += 1  # the race moved while the fleet state did not
+    built = []
+    service.race.leaderboard = lambda top: built.append(top) or service.state.leaderboard(top)
+    get(service, '/race')
+    get(service, '/race')
+    assert built == [10]
+
+
+def test_summary_counts_rejected_events(service):
+    service.ingest(tick(range(3), '2025-01-01T00:01:00Z'))
+    assert get(service, '/summary')[1]['events'] == 3
+    corrupted = dict(tick([1], '2025-01-01T00:01:10Z'), latitude=[-10000.0])
+    service.ingest(corrupted)
+    summary = get(service, '/summary')[1]
+    assert (summary['events'], summary['rejected']) == (4, 1)
+
+
+@pytest.mark.parametrize('path, query', [
+    ('/boats', {'offset': -5}),
+    ('/boats', {'limit': -1}),
+    ('/leaderboard', {'top': -1}),
+    ('/race', {'top': -3}),
+    ('/window/boats', {'top': -2}),
+])
+def test_negative_parameters_are_rejected(service, path, query):
+    with pytest.raises(ValueError):
+        get(service, path, **query)
+
+
+def test_bad_requests_get_400(service):
+    service.ingest(tick(range(10), '2025-01-01T00:01:00Z'))
+    server = service.serve(port=0)
+    try:
+        conn = HTTPConnection('127.0.0.1', server.server_port)
+        for path in ('/boats?offset=-5&limit=5', '/boats?limit=x'):
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            assert response.status == 400
+        conn.request('GET', '/boats?offset=5&limit=5')
+        response = conn.getresponse()
+        assert [boat['boat_id'] for boat in json.loads(response.read())] == [5, 6, 7, 8, 9]
+    finally:
+        service.shutdown()
+
+
+def test_counters_from_concurrent_ingests(service):
+    threads = [threading.Thread(target=lambda: [service.ingest(tick(range(5), '2025-01-01T00:01:00Z'))
+                                                 for _ in range(50)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert service.events == 8 * 50 * 5
+    assert service.rejected == 0
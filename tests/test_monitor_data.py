@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import local_db
+import monitor_data
+
+
+def insert(conn, first, count):
+    start = datetime(2025, 1, 1) + timedelta(seconds=first)
+    times = np.array([start + timedelta(seconds=offset) for offset in range(count)], dtype='datetime64[us]')
+    local_db.insert_telemetry(conn, {'boat_id': np.arange(count) % 3, 'latitude': np.zeros(count),
+                                     'longitude': np.zeros(count), 'heading': np.zeros(count),
+                                     'speed': np.full(count, 10.0), 'event_time': times,
+                                     'enqueued_time': times, 'created_at': times})
+
+
+def test_start_up_snapshot_then_polls(tmp_path):
+    # the backend comes from the cursor, not from SQLITE_DATABASE
+    conn = local_db.connect(str(tmp_path / 'boats.db'))
+    insert(conn, 0, 10)
+    monitor = monitor_data.TelemetryMonitor(conn.cursor())
+    assert monitor.total == 10
+    assert monitor.watermark == '2025-01-01 00:00:09.000000'
+
+    insert(conn, 10, 5)
+    assert monitor.poll() == 5
+    assert monitor.total == 15
+    assert monitor.poll() == 0
+
+
+class RecordingCursor():
+    """SQL Server cursor stand-in that records what it executes"""
+
+    def __init__(self):
+        self.connection = object()
+        self.statements = []
+
+    def execute(self, statement, *params):
+        self.statements.append(statement)
+
+    def fetchone(self):
+        return (42,) if 'sys.partitions' in self.statements[-1] else ('2025-01-01 00:00:09',)
+
+
+def test_sql_server_reads_watermark_before_count():
+    cursor = RecordingCursor()
+    assert monitor_data.count_rows_and_watermark(cursor, 'created_at') == (42, '2025-01-01 00:00:09')
+    assert 'MAX(created_at)' in cursor.statements[0]
+    assert 'sys.partitions' in cursor.statements[1]
@@ -0,0 +1,104 @@
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import parquet_to_sql
+
+DAYS = [date(2025, 1, 30) + timedelta(days=offset) for offset in range(5)]
+
+
+def rankings(day, boats=20):
+    rng = np.random.default_rng(day.toordinal())
+    df = pd.DataFrame({'boat_id': np.arange(1, boats + 1), 'avg_speed': rng.uniform(5, 20, boats).round(2),
+                       'max_speed': 25.0, 'records': 8640, 'avg_lat': rng.uniform(-60, 60, boats),
+                       'avg_lng': rng.uniform(-180, 180, boats), 'distance_km': 0.0})
+    df['rank'] = df['avg_speed'].rank(ascending=False, method='dense').astype('int64')
+    return df
+
+
+def write_rankings(root, day, df):
+    folder = root / 'parquet-data' / 'daily-rankings'
+    folder.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(folder / f"boat_rankings_{day:%Y%m%d}.parquet", index=False)
+
+
+@pytest.fixture
+def rankings_files(local_storage):
+    root, database = local_storage
+    frames = {day: rankings(day) for day in DAYS}
+    for day, df in frames.items():
+        write_rankings(root, day, df)
+    # neither is a daily rankings file
+    (root / 'parquet-data' / 'daily-rankings' / 'notes.txt').write_text('not rankings')
+    (root / 'parquet-data' / 'daily-rankings' / 'boat_rankings_2025.parquet').write_bytes(b'')
+    return frames, database
+
+
+def loaded(database):
+    with sqlite3.connect(database) as conn:
+        return pd.read_sql("SELECT date, boat_id, avg_speed, max_speed, records, rank, avg_lat, avg_lng "
+                           "FROM boat_historical_rankings ORDER BY date, boat_id", conn)
+
+
+def expected(frames, days):
+    parts = [frames[day].assign(date=day.isoformat()) for day in days]
+    columns = ['date'] + parquet_to_sql.RANKING_COLUMNS
+    return pd.concat(parts)[columns].sort_values(['date', 'boat_id']).reset_index(drop=True)
+
+
+def assert_loaded(database, frames, days):
+    columns = ['date'] + parquet_to_sql.RANKING_COLUMNS
+    pd.testing.assert_frame_equal(loaded(database)[columns], expected(frames, days), check_dtype=False)
+
+
+def test_discovers_only_rankings_files(rankings_files):
+    assert parquet_to_sql.discover_ranking_dates() == DAYS
+    assert parquet_to_sql.discover_ranking_dates(DAYS[1], DAYS[3]) == DAYS[1:4]
+    assert parquet_to_sql.discover_ranking_dates(start=DAYS[3]) == DAYS[3:]
+    assert parquet_to_sql.discover_ranking_dates(end=DAYS[0]) == DAYS[:1]
+    assert parquet_to_sql.discover_ranking_dates(DAYS[-1] + timedelta(days=1)) == []
+
+
+def test_backfill_loads_every_file(rankings_files):
+    frames, database = rankings_files
+    assert parquet_to_sql.backfill_parquet_files(workers=3, batch_days=2) == len(DAYS)
+    assert_loaded(database, frames, DAYS)
+
+
+def test_backfill_date_range(rankings_files, capsys):
+    frames, database = rankings_files
+    parquet_to_sql.main(['--from', DAYS[1].isoformat(), '--to', DAYS[2].isoformat()])
+    assert "Backfilled 2 Parquet files" in capsys.readouterr().out
+    assert_loaded(database, frames, DAYS[1:3])
+
+
+def test_backfill_one_transaction_per_batch(rankings_files, monkeypatch):
+    frames, database = rankings_files
+    batches = []
+    upsert = parquet_to_sql.upsert_rankings
+
+    def record(conn, batch):
+        batches.append([day for day, _ in batch])
+        return upsert(conn, batch)
+
+    monkeypatch.setattr(parquet_to_sql, 'upsert_rankings', record)
+    parquet_to_sql.backfill_parquet_files(workers=2, batch_days=2)
+    assert batches == [DAYS[0:2], DAYS[2:4], DAYS[4:5]]
+    assert_loaded(database, frames, DAYS)
+
+
+def test_backfill_rerun_is_idempotent(rankings_files, local_storage):
+    frames, database = rankings_files
+    root, _ = local_storage
+    parquet_to_sql.backfill_parquet_files(workers=2, batch_days=2)
+    parquet_to_sql.backfill_parquet_files(workers=2, batch_days=2)
+    assert_loaded(database, frames, DAYS)
+
+    # a republished day replaces its rankings, including boats that are no longer in the file
+    frames[DAYS[2]] = rankings(DAYS[2], boats=15)
+    write_rankings(root, DAYS[2], frames[DAYS[2]])
+    parquet_to_sql.backfill_parquet_files(workers=2, batch_days=2)
+    assert_loaded(database, frames, DAYS)
@@ -0,0 +1,20 @@
+import json
+import atexit
+
+from pipeline_metrics import Metrics
+
+
+def test_report_registered_once_at_exit(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, 'register', lambda function, *args: registered.append((function, args)))
+    metrics = Metrics()
+    monkeypatch.setenv('METRICS_REPORT', str(tmp_path / 'first.json'))
+    metrics.configure('batch')
+    monkeypatch.setenv('METRICS_REPORT', str(tmp_path / 'second.json'))
+    metrics.configure('sync')
+    assert len(registered) == 1
+
+    function, args = registered[0]
+    function(*args)
+    assert not (tmp_path / 'first.json').exists()
+    assert json.loads((tmp_path / 'second.json').read_text())['job'] == 'sync'
@@ -0,0 +1,14 @@
+import pytest
+
+import race_simulator
+
+
+@pytest.mark.parametrize('days', ['0', '-1', 'nan'])
+def test_fast_forward_rejects_non_positive_days(days):
+    with pytest.raises(SystemExit):
+        race_simulator.parse_args(['--fast-forward', days])
+
+
+def test_fast_forward_days():
+    assert race_simulator.parse_args(['--fast-forward', '0.5']).fast_forward == 0.5
+    assert race_simulator.parse_args([]).fast_forward is None
@@ -0,0 +1,125 @@
+import json
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+import stream_validator
+from stream_validator import (parity_records, passes_sql_filter, read_capture, read_jsonl, simulate_events,
+                              sql_where_clause, validate)
+from telemetry_sinks import FileSink
+
+ENQUEUED = datetime.now(timezone.utc).isoformat()
+FIELDS = ('boat', 'latitude', 'longitude', 'heading', 'speed', 'EventEnqueuedUtcTime')
+
+
+def event(**changes):
+    record = {'boat': 1, 'latitude': 0.0, 'longitude': 0.0, 'speed': 1.0, 'EventEnqueuedUtcTime': ENQUEUED}
+    record.update(changes)
+    return record
+
+
+def reasons_for(records):
+    columns = {name: [record.get(name) for record in records] for name in FIELDS}
+    return list(validate(columns)[1])
+
+
+@pytest.mark.parametrize('record, reason', [
+    (event(), None),
+    (event(boat=None), 'missing_boat'),
+    (event(boat='x'), 'missing_boat'),
+    (event(latitude=None), 'missing_position'),
+    (event(longitude=None), 'missing_position'),
+    (event(latitude=-10000, longitude=-10000), 'corrupted_gps'),
+    (event(longitude=-10000.0), 'corrupted_gps'),
+    (event(latitude=90.0, longitude=-180.0, speed=0.0), None),
+    (event(latitude=90.0001), 'latitude_out_of_range'),
+    (event(latitude=-90.5), 'latitude_out_of_range'),
+    (event(longitude=180.5), 'longitude_out_of_range'),
+    (event(speed=50.0), None),
+    (event(speed=50.01), 'invalid_speed'),
+    (event(speed=-0.1), 'invalid_speed'),
+    (event(speed=None), 'invalid_speed'),
+    (event(speed='12.5'), None),
+    (event(EventEnqueuedUtcTime=None), 'missing_timestamp'),
+    (event(EventEnqueuedUtcTime='not a date'), 'missing_timestamp'),
+])
+def test_reason_codes(record, reason):
+    assert reasons_for([record]) == [reason]
+    assert passes_sql_filter([record]).tolist() == [reason is None]
+
+
+def test_parity_with_sql_filter():
+    records = parity_records(count=5_000)
+    clean = np.array(reasons_for(records)) == None  # noqa: E711 - element-wise comparison
+    expected = passes_sql_filter(records)
+    assert np.flatnonzero(clean != expected).tolist() == []
+    assert 0 < clean.sum() < len(records)
+
+
+def test_where_clause_comes_from_the_query():
+    clause = sql_where_clause()
+    assert clause.startswith('latitude != -10000.0 and longitude != -10000.0')
+    assert clause.endswith('EventEnqueuedUtcTime is not null')
+    assert '--' not in clause
+
+
+def test_parity_detects_query_drift(tmp_path):
+    # the same query with a stricter speed limit no longer matches validate()
+    query = tmp_path / 'stricter.sql'
+    query.write_text(open(stream_validator.STREAM_ANALYTICS_QUERY).read().replace('speed <= 50.0', 'speed <= 40.0'))
+    records = parity_records(count=1_000)
+    clean = np.array(reasons_for(records)) == None  # noqa: E711 - element-wise comparison
+    assert (passes_sql_filter(records, path=str(query)) != clean).any()
+
+
+def capture(tmp_path, file_format, boats=50, ticks=3):
+    from fleet_engine import FleetArrays, telemetry_columns
+    fleet = FleetArrays(boats, seed=1)
+    with FileSink(str(tmp_path / 'boats'), file_format=file_format) as sink:
+        for _ in range(ticks):
+            sink.send(telemetry_columns(fleet))
+            fleet.update(60)
+    return sink.paths, boats * ticks
+
+
+@pytest.mark.parametrize('file_format', ['jsonl', 'parquet'])
+def test_reads_file_sink_captures(tmp_path, file_format):
+    paths, events = capture(tmp_path, file_format)
+    chunks = [columns for path in paths for columns in read_capture(path)]
+    assert sum(len(columns['boat']) for columns in chunks) == events
+    assert all(reason in (None, 'corrupted_gps') for columns in chunks for reason in validate(columns)[1])
+
+
+def test_read_jsonl_chunk_size(tmp_path):
+    paths, _ = capture(tmp_path, 'jsonl')
+    assert [len(columns['boat']) for columns in read_jsonl(paths[0], chunk_size=40)] == [40, 40, 40, 30]
+
+
+def test_read_jsonl_without_pyarrow(tmp_path, monkeypatch):
+    paths, _ = capture(tmp_path, 'jsonl')
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    monkeypatch.setitem(sys.modules, 'pyarrow.json', None)
+    assert [len(columns['boat']) for columns in read_jsonl(paths[0], chunk_size=40)] == [40, 40, 40, 30]
+
+
+def test_read_jsonl_mixed_types(tmp_path):
+    path = tmp_path / 'mixed.jsonl'
+    path.write_text(json.dumps(event()) + "\n" + json.dumps(event(speed='12.5')) + "\n")
+    columns, = read_jsonl(str(path))
+    assert list(validate(columns)[1]) == [None, None]
+
+
+@pytest.mark.parametrize('encoding', ['json', 'packed'])
+def test_fake_hub_events(encoding):
+    chunks = list(simulate_events(boats=200, ticks=3, encoding=encoding, seed=1))
+    assert [len(columns['boat']) for columns in chunks] == [200, 200, 200]
+    clean, _ = validate(chunks[0])
+    assert 150 < len(clean) <= 200
+
+
+def test_main_with_fake_hub(tmp_path, capsys):
+    stream_validator.main(['--fake-hub', '2', '--boats', '100', '--database', str(tmp_path / 'boats.db'),
+                           '--dead-letter', str(tmp_path / 'dead_letter.jsonl')])
+    assert "Processed 200 events" in capsys.readouterr().out
@@ -0,0 +1,21 @@
+import numpy as np
+import pyarrow.parquet as pq
+
+from fleet_engine import FleetArrays, telemetry_columns
+from telemetry_sinks import FileSink
+
+
+def test_parquet_file_mixes_chunks_with_and_without_timestamp(tmp_path):
+    fleet = FleetArrays(10, seed=1)
+    plain = telemetry_columns(fleet)
+    stamped = dict(telemetry_columns(fleet), timestamp=np.full(10, np.datetime64('2025-01-01T00:00:10', 'us')))
+    with FileSink(str(tmp_path / 'boats'), file_format='parquet') as sink:
+        sink.send(plain)
+        sink.send(stamped)
+        sink.send(plain)
+
+    table = pq.read_table(sink.paths[0])
+    assert table.num_rows == 30
+    timestamps = table.column('timestamp').to_pylist()
+    assert timestamps[:10] == [None] * 10 and timestamps[20:] == [None] * 10
+    assert set(timestamps[10:20]) == {'2025-01-01T00:00:10.000000Z'}
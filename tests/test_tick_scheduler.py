@@ -0,0 +1,48 @@
+import time
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fleet_engine import FleetArrays
+from stream_validator import read_events, validate
+from telemetry_sinks import FakeEventHubSink
+from tick_scheduler import TickScheduler
+
+TICK_SECONDS = 0.02
+
+
+class SlowFakeEventHubSink(FakeEventHubSink):
+    """Takes longer to send a tick than the tick interval, so every tick goes out late"""
+
+    def send(self, columns):
+        time.sleep(3 * TICK_SECONDS)
+        super().send(columns)
+
+
+@pytest.mark.parametrize('encoding', ['json', 'packed'])
+def test_event_time_follows_tick_time_when_sends_lag(encoding):
+    sink = SlowFakeEventHubSink(partitions=1, retain=None, encoding=encoding)
+    scheduler = TickScheduler(FleetArrays(20, seed=1), sink, TICK_SECONDS, 60, policy='block', verbose=False)
+    assert asyncio.run(scheduler.run(ticks=6))['sent'] == 6
+
+    columns, = read_events(sink)
+    clean, _ = validate(columns)
+    ticks = np.sort(clean['event_time'].unique())
+    enqueued = np.sort(clean['enqueued_time'].unique())
+
+    # event times sit exactly on the tick grid ...
+    assert len(ticks) == 6
+    assert set(np.diff(ticks)) == {pd.Timedelta(seconds=TICK_SECONDS).to_timedelta64()}
+    # ... while the sends drift further behind it every tick
+    assert enqueued[-1] - enqueued[0] > ticks[-1] - ticks[0] + np.timedelta64(int(5 * TICK_SECONDS * 1e6), 'us')
+
+
+def test_event_time_falls_back_to_processing_time():
+    columns = {'boat': [1, 2], 'latitude': [0.0, 0.0], 'longitude': [0.0, 0.0], 'speed': [1.0, 1.0],
+               'EventEnqueuedUtcTime': ['2025-01-01T00:00:05Z'] * 2,
+               'EventProcessedUtcTime': ['2025-01-01T00:00:06Z'] * 2,
+               'timestamp': ['2025-01-01T00:00:00Z', None]}
+    clean, _ = validate(columns)
+    assert clean['event_time'].tolist() == [pd.Timestamp('2025-01-01 00:00:00'), pd.Timestamp('2025-01-01 00:00:06')]
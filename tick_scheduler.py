@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Fixed-rate asyncio tick scheduler for the race simulator
+Tick N is due at start + N x tick seconds, whatever sending the previous ticks costs: the fleet is
+stepped to tick N+1 while tick N is still in flight, and a bounded queue between simulation and
+sink decides what happens when the sink falls behind:
+  block        the simulation waits for room (no tick is lost, ticks run late)
+  coalesce     queued ticks are replaced by the newest one (the sink always gets the latest state)
+  drop_oldest  the oldest queued tick is dropped to make room
+Every event carries the simulated time of its tick (timestamp), so event times stay on the tick grid
+under load. Tick lag, queue depth and dropped ticks go to METRICS.
+Usage: python3 race_simulator.py --scheduler async --backpressure coalesce
+"""
+
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
+
+import numpy as np
+
+from fleet_engine import telemetry_columns
+from pipeline_metrics import METRICS
+
+# What to do with a new tick when the send queue is full: block, coalesce or drop_oldest
+TICK_BACKPRESSURE = os.getenv('TICK_BACKPRESSURE', 'block')
+
+# Ticks that may wait for the sink (on top of the one being sent)
+TICK_QUEUE_SIZE = int(os.getenv('TICK_QUEUE_SIZE', '2'))
+
+BACKPRESSURE_POLICIES = ('block', 'coalesce', 'drop_oldest')
+
+
+class TickScheduler():
+    """Run a fleet at a fixed tick rate, sending each tick through a sink from a bounded queue"""
+
+    def __init__(self, fleet, sink, tick_seconds, simulation_speed, policy=TICK_BACKPRESSURE,
+                 queue_size=TICK_QUEUE_SIZE, verbose=True):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy} (use one of {', '.join(BACKPRESSURE_POLICIES)})")
+        self.fleet = fleet
+        self.sink = sink
+        self.tick_seconds = tick_seconds
+        self.simulation_speed = simulation_speed
+        self.policy = policy
+        self.queue_size = max(queue_size, 1)
+        self.verbose = verbose
+        self.ticks = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_lag = 0.0
+        self.max_delay = 0.0
+
+    def snapshot(self, tick_time):
+        """Telemetry columns of the current tick, copied so the next step cannot change them"""
+        columns = {name: np.array(values) for name, values in telemetry_columns(self.fleet).items()}
+        columns['timestamp'] = np.full(self.fleet.size, tick_time, dtype='datetime64[us]')
+        return columns
+
+    async def run(self, ticks=None):
+        """Produce ticks until `ticks` have been produced (or the task is cancelled), then wait for
+        the queue to drain. Returns the run statistics."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.queue_size)
+        sender = asyncio.create_task(self._send_loop(queue))
+        start = loop.time()
+        # simulated (event) time of tick 0; tick N is always exactly N x tick seconds later
+        first_tick_time = np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), 'us')
+        tick_step = np.timedelta64(int(self.tick_seconds * 1e6), 'us')
+        try:
+            while ticks is None or self.ticks < ticks:
+                due = start + self.ticks * self.tick_seconds
+                await asyncio.sleep(max(due - loop.time(), 0))
+                lag = loop.time() - due
+                self.max_lag = max(self.max_lag, lag)
+                METRICS.set_gauge('tick_lag_seconds', round(lag, 3))
+
+                columns = await asyncio.to_thread(self.snapshot, first_tick_time + self.ticks * tick_step)
+                await self._enqueue(queue, (self.ticks, due, columns))
+                self.ticks += 1
+
+                # step to the next tick while this one is being sent
+                with METRICS.stage('update') as stage:
+                    await asyncio.to_thread(self.fleet.update, self.simulation_speed)
+                    stage.rows = self.fleet.size
+            await queue.join()
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+            if hasattr(self.sink, 'close_async'):
+                await self.sink.close_async()
+            else:
+                await asyncio.to_thread(self.sink.close)
+        return self.stats()
+
+    async def _enqueue(self, queue, item):
+        """Queue a tick, applying the backpressure policy when the sink is behind"""
+        if self.policy == 'block':
+            await queue.put(item)
+        else:
+            if queue.full():
+                # coalesce keeps only the newest tick, drop_oldest makes room for one
+                drop = queue.qsize() if self.policy == 'coalesce' else 1
+                for _ in range(drop):
+                    queue.get_nowait()
+                    queue.task_done()
+                self.dropped += drop
+                METRICS.set_gauge('dropped_ticks', self.dropped)
+            queue.put_nowait(item)
+        METRICS.set_gauge('tick_queue_depth', queue.qsize())
+
+    async def _send_loop(self, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            tick, due, columns = await queue.get()
+            try:
+                bytes_before = self.sink.bytes_sent
+                with METRICS.stage('send') as stage:
+                    if hasattr(self.sink, 'send_async'):
+                        await self.sink.send_async(columns)
+                    else:
+                        await asyncio.to_thread(self.sink.send, columns)
+                    stage.rows = len(columns['boat'])
+                    stage.bytes = self.sink.bytes_sent - bytes_before
+                self.sent += 1
+                # how long after its due time the tick was delivered
+                delay = loop.time() - due
+                self.max_delay = max(self.max_delay, delay)
+                METRICS.set_gauge('tick_delivery_seconds', round(delay, 3))
+                if self.verbose:
+                    print(f"⏱️  Tick {tick} sent: {stage.rows} events, {delay:.2f}s after its due time "
+                          f"(queue {queue.qsize()}, dropped {self.dropped})")
+            except Exception as exc:
+                # a failed send loses that tick only; the clock and the queue keep going
+                self.failed += 1
+                METRICS.set_gauge('failed_ticks', self.failed)
+                print(f"❌ Tick {tick} could not be sent: {type(exc).__name__}: {exc}")
+            finally:
+                queue.task_done()
+
+    def stats(self):
+        return {'ticks': self.ticks, 'sent': self.sent, 'dropped': self.dropped, 'failed': self.failed,
+                'policy': self.policy,
+                'max_lag_seconds': self.max_lag, 'max_delivery_seconds': self.max_delay}
+
+
+def run_scheduled(fleet, sink, tick_seconds, simulation_speed, policy=TICK_BACKPRESSURE, ticks=None,
+                  queue_size=TICK_QUEUE_SIZE, verbose=True):
+    """Run a TickScheduler on a fresh event loop until `ticks` ticks or Ctrl+C; prints a summary"""
+    scheduler = TickScheduler(fleet, sink, tick_seconds, simulation_speed, policy, queue_size, verbose)
+    started = time.perf_counter()
+    print(f"⏲️  Fixed-rate ticks every {tick_seconds}s for {fleet.size} boats (backpressure: {policy}, queue: {scheduler.queue_size})")
+    try:
+        asyncio.run(scheduler.run(ticks))
+    except KeyboardInterrupt:
+        pass
+    stats = scheduler.stats()
+    print(f"✅ {stats['ticks']} ticks in {time.perf_counter() - started:.1f}s: {stats['sent']} sent, "
+          f"{stats['dropped']} dropped, {stats['failed']} failed, max tick lag {stats['max_lag_seconds']:.2f}s, "
+          f"max delivery delay {stats['max_delivery_seconds']:.2f}s")
+    return stats
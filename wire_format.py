@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Wire formats for simulator events
+json   - one JSON object per boat (default, what Stream Analytics reads)
+packed - one binary payload per chunk of boats: a small schema header followed by
+         little-endian column arrays, so a whole tick is encoded with a few memory copies
+Usage: from wire_format import encode_packed, decode_event
+"""
+
+import json
+import struct
+import numpy as np
+
+JSON_CONTENT_TYPE = "application/json"
+PACKED_CONTENT_TYPE = "application/x-boat-telemetry-packed"
+
+PACKED_MAGIC = b'BOAT'
+PACKED_VERSION = 1
+
+# Column types on the wire; heading and speed do not need double precision
+PACKED_SCHEMA = (
+    ("boat", "<u4"),
+    ("latitude", "<f8"),
+    ("longitude", "<f8"),
+    ("heading", "<f4"),
+    ("speed", "<f4"),
+)
+
+# Columns sent only when present: the simulated time of the tick (set by tick_scheduler.py)
+PACKED_OPTIONAL_SCHEMA = (
+    ("timestamp", "<M8[us]"),
+)
+
+# Boats per packed payload: ~28 bytes per boat keeps a chunk well under the 1 MB batch limit
+PACKED_CHUNK_BOATS = 10_000
+
+_HEADER = struct.Struct('<4sBBI')  # magic, version, column count, row count
+
+
+def encode_json(record):
+    """One telemetry record as a JSON string"""
+    return json.dumps(record)
+
+
+def encode_packed(columns):
+    """Encode a chunk of telemetry columns as one packed binary payload"""
+    count = len(columns[PACKED_SCHEMA[0][0]])
+    schema = PACKED_SCHEMA + tuple(field for field in PACKED_OPTIONAL_SCHEMA if field[0] in columns)
+    parts = [_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, len(schema), count)]
+    for name, dtype in schema:
+        encoded_name = name.encode()
+        encoded_dtype = dtype.encode()
+        parts.append(struct.pack('<B', len(encoded_name)) + encoded_name)
+        parts.append(struct.pack('<B', len(encoded_dtype)) + encoded_dtype)
+    for name, dtype in schema:
+        parts.append(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+    return b''.join(parts)
+
+
+def decode_packed(body):
+    """Decode a packed payload back into a dict of NumPy columns"""
+    body = memoryview(body)
+    magic, version, column_count, count = _HEADER.unpack_from(body, 0)
+    if magic != PACKED_MAGIC or version != PACKED_VERSION:
+        raise ValueError(f"Not a packed boat telemetry payload (magic={bytes(magic)!r}, version={version})")
+
+    offset = _HEADER.size
+    schema = []
+    for _ in range(column_count):
+        name_length = body[offset]
+        name = bytes(body[offset + 1:offset + 1 + name_length]).decode()
+        offset += 1 + name_length
+        dtype_length = body[offset]
+        dtype = bytes(body[offset + 1:offset + 1 + dtype_length]).decode()
+        offset += 1 + dtype_length
+        schema.append((name, np.dtype(dtype)))
+
+    columns = {}
+    for name, dtype in schema:
+        size = dtype.itemsize * count
+        columns[name] = np.frombuffer(body[offset:offset + size], dtype=dtype)
+        offset += size
+    return columns
+
+
+def iter_chunks(columns, chunk_size=PACKED_CHUNK_BOATS):
+    """Slice telemetry columns into chunks of at most chunk_size boats"""
+    count = len(columns['boat'])
+    for start in range(0, count, chunk_size):
+        yield {name: values[start:start + chunk_size] for name, values in columns.items()}
+
+
+def decode_event(body, content_type=JSON_CONTENT_TYPE):
+    """Decode one event body of either wire format into columns"""
+    if content_type == PACKED_CONTENT_TYPE:
+        return decode_packed(body)
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        body = bytes(body).decode()
+    record = json.loads(body)
+    return {name: [value] for name, value in record.items()}
+
+
+def decode_events(events):
+    """Decode fake/real EventData objects of either wire format into one dict of columns.
+    Adds an EventEnqueuedUtcTime column when the events carry their enqueued time."""
+    chunks = []
+    records = []
+    record_times = []
+    for event in events:
+        body = event.body
+        if not isinstance(body, (str, bytes, bytearray, memoryview)):
+            body = b''.join(body)  # azure EventData.body is an iterator of byte sections
+        enqueued_time = getattr(event, 'enqueued_time', None)
+
+        if event.content_type == PACKED_CONTENT_TYPE:
+            chunk = decode_packed(body)
+            if enqueued_time is not None:
+                chunk['EventEnqueuedUtcTime'] = np.full(len(chunk['boat']), enqueued_time, dtype=object)
+            chunks.append(chunk)
+        else:
+            records.append(json.loads(body))
+            record_times.append(enqueued_time)
+
+    if records:
+        names = dict.fromkeys(name for record in records for name in record)
+        chunk = {name: np.array([record.get(name) for record in records]) for name in names}
+        if any(value is not None for value in record_times):
+            chunk['EventEnqueuedUtcTime'] = np.array(record_times, dtype=object)
+        chunks.append(chunk)
+
+    if not chunks:
+        return {}
+    names = [name for name in chunks[0] if all(name in chunk for chunk in chunks)]
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in names}